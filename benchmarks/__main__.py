@@ -0,0 +1,106 @@
+"""
+Бенчмарки API и ORM.
+
+    python -m benchmarks run --products 100000 --concurrency 32 --requests 2000 --output before.json
+    python -m benchmarks compare before.json after.json
+
+Кроме зависимостей проекта нужны httpx и aiosqlite.
+По умолчанию база - локальный SQLite; сценарии, завязанные на MySQL
+(upsert, FOR UPDATE, bulk insert), запускаются только с --database-url mysql+asyncmy://...
+"""
+import argparse
+import asyncio
+import platform
+from datetime import datetime
+
+from benchmarks.common import configure_env, is_mysql, write_report, compare_reports
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run")
+    run.add_argument("--database-url", default="sqlite+aiosqlite:///bench.db")
+    run.add_argument("--products", type=int, default=10_000)
+    run.add_argument("--categories", type=int, default=200)
+    run.add_argument("--users", type=int, default=1_000)
+    run.add_argument("--orders", type=int, default=20_000)
+    run.add_argument("--reviews", type=int, default=50_000)
+    run.add_argument("--requests", type=int, default=1_000, help="запросов на сценарий")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--no-seed", action="store_true", help="использовать уже засеянную базу")
+    run.add_argument("--no-cache", action="store_true", help="отключить кэш продуктов")
+    run.add_argument("--only", nargs="*", help="имена сценариев API")
+    run.add_argument("--skip-micro", action="store_true")
+    run.add_argument("--output")
+
+    compare = commands.add_parser("compare")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    return parser.parse_args()
+
+
+async def run(args) -> dict:
+    # Импорты из src только после configure_env: настройки читаются при импорте
+    from benchmarks import micro
+    from benchmarks.api import run_endpoints
+    from benchmarks.seed import seed_database
+    from src.database.database import async_engine
+    from src.main import create_fastapi_app
+
+    report = {
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "database": async_engine.dialect.name,
+        "params": {key: value for key, value in vars(args).items() if key != "command"},
+    }
+    if not args.no_seed:
+        report["seed"] = await seed_database(
+            async_engine, args.products, args.categories, args.users, args.orders, args.reviews
+        )
+
+    app = create_fastapi_app()
+    report["endpoints"] = await run_endpoints(
+        app, args.products, args.categories, args.requests, args.concurrency, only=args.only
+    )
+
+    if not args.skip_micro:
+        rows = min(args.products, 10_000)
+        report["micro"] = {
+            "projection_vs_orm": await micro.projection_vs_orm(rows),
+            "serialization": await micro.serialization(rows),
+            "search_latency": await micro.search_latency(args.requests, documents=max(args.products, 100_000)),
+            "pool_saturation": await micro.pool_saturation(args.concurrency * 4, hold=0.05),
+            "job_queue_throughput": await micro.job_queue_throughput(args.requests * 10),
+            "catalog_snapshot": await micro.catalog_snapshot(args.products),
+            "hot_client": await micro.hot_client(app, args.products),
+        }
+        try:
+            report["micro"]["bcrypt_loop_latency"] = await micro.bcrypt_loop_latency(args.concurrency)
+        except ImportError as e:
+            report["micro"]["bcrypt_loop_latency"] = {"skipped": str(e)}
+        if is_mysql(args.database_url):
+            report["micro"]["bulk_vs_single_insert"] = await micro.bulk_vs_single_insert(min(args.products, 2_000))
+            report["micro"]["checkout_stress"] = await micro.checkout_stress(min(args.users, 200), 3)
+            report["micro"]["cart_coalescing"] = await micro.cart_coalescing(min(args.users, 50), 20)
+            report["micro"]["sales_rollups"] = await micro.sales_rollups()
+            report["micro"]["payment_webhook_flood"] = await micro.payment_webhook_flood(app, min(args.orders, 5_000))
+        # Последним: сбрасывает пул и кэши, а на выходе из lifespan останавливает фоновые сервисы
+        report["micro"]["cold_start"] = await micro.cold_start()
+
+    await async_engine.dispose()
+    return report
+
+
+def main():
+    args = parse_args()
+    if args.command == "compare":
+        compare_reports(args.old, args.new)
+        return
+    configure_env(args.database_url, cache=not args.no_cache)
+    write_report(asyncio.run(run(args)), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import asyncio
+import random
+import time
+from typing import Callable
+
+import httpx
+
+from benchmarks.common import latency_summary, peak_rss_mb
+from benchmarks.seed import WORDS
+
+
+def endpoint_scenarios(products: int, categories: int) -> dict[str, Callable[[random.Random], str]]:
+    """Имя сценария -> генератор URL; параметры случайные, чтобы не бить в один ключ кэша"""
+    return {
+        "products_first_page": lambda rnd: "/products?limit=100",
+        "products_keyset_page": lambda rnd: f"/products?limit=100&after={rnd.randint(0, products)}",
+        "product_by_id": lambda rnd: f"/products/{rnd.randint(1, products)}",
+        "products_top_rated": lambda rnd: "/products/top-rated?limit=20",
+        "products_search": lambda rnd: f"/products/search?q={rnd.choice(WORDS)}+{rnd.choice(WORDS)[:3]}",
+        "categories": lambda rnd: "/categories",
+        "category_subtree": lambda rnd: f"/categories/{rnd.randint(1, max(1, categories // 20))}/products?limit=100",
+        "breadcrumbs": lambda rnd: f"/categories/{rnd.randint(1, categories)}/breadcrumbs",
+    }
+
+
+async def _drive(client: httpx.AsyncClient, make_url, requests: int, concurrency: int, seed: int):
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker(worker_id: int):
+        nonlocal remaining, errors
+        rnd = random.Random(seed + worker_id)
+        while remaining > 0:
+            remaining -= 1
+            url = make_url(rnd)
+            start = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(idx) for idx in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_endpoints(app, products: int, categories: int, requests: int, concurrency: int,
+                        only: list[str] | None = None, seed: int = 42) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, make_url in endpoint_scenarios(products, categories).items():
+            if only and name not in only:
+                continue
+            # Прогрев: ленивые индексы (дерево категорий, поиск) и кэши строятся до замера
+            await client.get(make_url(random.Random(seed)))
+            latencies, errors, elapsed = await _drive(client, make_url, requests, concurrency, seed)
+            results[name] = {**latency_summary(latencies, elapsed), "errors": errors, "rss_peak_mb": peak_rss_mb()}
+
+        # Полный каталог потоком: одна длинная выгрузка, меряем время и объем
+        start = time.perf_counter()
+        size = 0
+        async with client.stream("GET", "/products/stream?format=ndjson") as response:
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+        elapsed = time.perf_counter() - start
+        results["products_stream_full"] = {
+            "seconds": round(elapsed, 3),
+            "mb": round(size / 1024 / 1024, 2),
+            "rows_per_sec": round(products / elapsed, 1) if elapsed else 0.0,
+            "rss_peak_mb": peak_rss_mb(),
+        }
+    return results
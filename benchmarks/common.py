@@ -0,0 +1,80 @@
+import json
+import math
+import os
+import resource
+import sys
+import time
+
+
+def configure_env(database_url: str, cache: bool):
+    """Настройки читаются при импорте src.config, поэтому вызывать до любых импортов из src"""
+    os.environ["DATABASE_URL_OVERRIDE"] = database_url
+    os.environ["CACHE_ENABLED"] = "true" if cache else "false"
+    # Все запросы бенчмарка идут от одного клиента; лимиты проверяет отдельный сценарий hot_client
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["SHED_ENABLED"] = "false"
+    for name, value in (("DB_HOST", "localhost"), ("DB_PORT", "3306"), ("DB_NAME", "bench"),
+                        ("DB_USER", "bench"), ("DB_PASS", "bench")):
+        os.environ.setdefault(name, value)
+
+
+def is_mysql(database_url: str) -> bool:
+    return database_url.startswith("mysql")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(latencies: list[float], elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def write_report(report: dict, path: str | None):
+    text = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    if path:
+        with open(path, "w") as file:
+            file.write(text)
+    print(text)
+
+
+def compare_reports(old_path: str, new_path: str):
+    """Разница p95 и rps между двумя JSON-отчетами по одинаковым сценариям"""
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    for section in ("endpoints", "micro"):
+        for name, after in new.get(section, {}).items():
+            before = old.get(section, {}).get(name)
+            if not isinstance(before, dict) or not isinstance(after, dict):
+                continue
+            for metric in ("p95_ms", "rps", "rows_per_sec", "us_per_row"):
+                if metric in before and metric in after and before[metric]:
+                    change = (after[metric] - before[metric]) / before[metric] * 100
+                    print(f"{section}.{name}.{metric}: {before[metric]} -> {after[metric]} ({change:+.1f}%)")
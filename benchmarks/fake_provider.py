@@ -0,0 +1,75 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+import httpx
+
+from src.database.enums import PaymentStatus
+from src.queries.payments import STATUS_RANK, sign
+
+
+class FakePaymentProvider:
+    """
+    Провайдер в час пик: каждый колбэк доставляется несколько раз, порядок перемешан,
+    часть платежей сначала падает, а потом проходит. Колбэк с ответом 5xx повторяется
+    не больше max_redeliveries раз, как у настоящих провайдеров; неподтвержденные возвращаются из deliver.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, secret: str | None = None, duplicates: int = 3,
+                 fail_ratio: float = 0.1, retry_ratio: float = 0.3, max_redeliveries: int = 5, seed: int = 42):
+        self.client = client
+        self.max_redeliveries = max_redeliveries
+        self.secret = secret
+        self.duplicates = duplicates
+        self.fail_ratio = fail_ratio
+        self.retry_ratio = retry_ratio
+        self.rnd = random.Random(seed)
+
+    def plan(self, payments: list[tuple[int, float]]) -> tuple[list[dict], dict[int, PaymentStatus]]:
+        """Колбэки в порядке доставки и статус, который должен остаться у каждого платежа"""
+        deliveries = []
+        expected = {}
+        for payment_id, amount in payments:
+            if self.rnd.random() < self.fail_ratio:
+                statuses = [PaymentStatus.PENDING, PaymentStatus.FAILED]
+                if self.rnd.random() < self.retry_ratio:
+                    statuses.append(PaymentStatus.SUCCESS)
+            else:
+                statuses = [PaymentStatus.PENDING, PaymentStatus.SUCCESS]
+            expected[payment_id] = max(statuses, key=STATUS_RANK.__getitem__)
+            for status in statuses:
+                event = {"transaction_id": f"tx-{payment_id}", "payment_id": payment_id,
+                         "status": status.value, "amount": amount}
+                deliveries.extend([event] * self.rnd.randint(1, self.duplicates))
+        self.rnd.shuffle(deliveries)
+        return deliveries, expected
+
+    async def deliver(self, deliveries: list[dict], concurrency: int) -> tuple[Counter, list[float], list[dict]]:
+        """Коды ответов, задержки и колбэки, которые так и не были подтверждены"""
+        codes = Counter()
+        latencies = []
+        undelivered = []
+        queue = [(event, 0) for event in reversed(deliveries)]
+
+        async def worker():
+            while queue:
+                event, redeliveries = queue.pop()
+                body = json.dumps(event).encode()
+                headers = {"content-type": "application/json"}
+                if self.secret is not None:
+                    headers["x-signature"] = sign(body, self.secret)
+                start = time.perf_counter()
+                response = await self.client.post("/webhooks/payments", content=body, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                codes[response.status_code] += 1
+                if response.status_code >= 500:
+                    # Неподтвержденный колбэк провайдер присылает снова, но не бесконечно
+                    if redeliveries < self.max_redeliveries:
+                        queue.insert(0, (event, redeliveries + 1))
+                    else:
+                        undelivered.append(event)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return codes, latencies, undelivered
@@ -0,0 +1,618 @@
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import select, text, func
+from sqlalchemy.orm import selectinload
+
+from benchmarks.common import Timer, latency_summary
+from benchmarks.seed import WORDS
+from src.api.responses import DTOResponse
+from src.database.database import async_engine, async_session_factory
+from src.database.dtos import ProductGetDTO, ProductPostDTO, CheckoutPostDTO
+from src.database.enums import PaymentMethod
+from src.database.models import CartItemTable, ProductTable, ProductRatingTable, product_categories
+from src.database.pool import pool_metrics
+from src.queries.orm import ProductORM
+from src.queries.projection import select_product_rows, product_rows_to_dtos
+from src.queries.search import SearchIndex
+from src.queries.snapshot import CatalogSnapshotStore
+
+
+async def _measure(coro_factory, rows: int) -> dict:
+    tracemalloc.start()
+    with Timer() as timer:
+        await coro_factory()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(timer.elapsed, 4),
+        "us_per_row": round(timer.elapsed / rows * 1e6, 3) if rows else 0.0,
+        "alloc_peak_bytes_per_row": round(peak / rows, 1) if rows else 0.0,
+    }
+
+
+async def projection_vs_orm(rows: int) -> dict:
+    """Гидратация ProductTable + ручное копирование в DTO против проекции колонок в DTO"""
+    async def orm_path():
+        async with async_session_factory() as session:
+            result = await session.execute(
+                select(ProductTable).options(selectinload(ProductTable.categories)).limit(rows)
+            )
+            return [ProductORM._to_dto(product) for product in result.scalars().all()]
+
+    async def projection_path():
+        async with async_session_factory() as session:
+            result = await session.execute(select_product_rows().order_by(ProductTable.id).limit(rows))
+            return product_rows_to_dtos(result)
+
+    return {"orm": await _measure(orm_path, rows), "projection": await _measure(projection_path, rows)}
+
+
+async def serialization(rows: int) -> dict:
+    """Путь FastAPI по умолчанию (валидация + jsonable_encoder + json.dumps) против DTOResponse"""
+    async with async_session_factory() as session:
+        result = await session.execute(select_product_rows().order_by(ProductTable.id).limit(rows))
+        products = product_rows_to_dtos(result)
+    adapter = TypeAdapter(list[ProductGetDTO])
+
+    with Timer() as default_timer:
+        body = json.dumps(jsonable_encoder(adapter.validate_python(products))).encode()
+    with Timer() as fast_timer:
+        fast_body = DTOResponse(products, list[ProductGetDTO]).body
+    return {
+        "default": {"rows_per_sec": round(rows / default_timer.elapsed, 1), "mb": round(len(body) / 2 ** 20, 2)},
+        "dto_response": {"rows_per_sec": round(rows / fast_timer.elapsed, 1), "mb": round(len(fast_body) / 2 ** 20, 2)},
+    }
+
+
+async def search_latency(queries: int, documents: int = 100_000, seed: int = 42) -> dict:
+    """
+    Индекс строится по каталогу из БД; если в нем меньше documents продуктов,
+    недостающие синтезируются в памяти тем же генератором текста, что и в seed
+    """
+    index = SearchIndex()
+    rnd = random.Random(seed)
+    with Timer() as build:
+        async for chunk in ProductORM.stream_products(2000):
+            for product in chunk:
+                index.add(product.id, product)
+        next_id = max(index.doc_length, default=0) + 1
+        for product_id in range(next_id, next_id + documents - len(index)):
+            index.add(product_id, ProductPostDTO(
+                title=f"{' '.join(rnd.sample(WORDS, 3))} {product_id}",
+                description=" ".join(rnd.choices(WORDS, k=12)),
+                price=1.0,
+                sku=f"SKU-{product_id:08d}",
+            ))
+        # Словарь терминов сортируется лениво при первом поиске по префиксу, это часть построения
+        index.sorted_terms()
+    latencies = []
+    for _ in range(queries):
+        query = f"{rnd.choice(WORDS)} {rnd.choice(WORDS)[:3]}"
+        start = time.perf_counter()
+        index.search(query, limit=20)
+        latencies.append(time.perf_counter() - start)
+    return {"documents": len(index), "build_seconds": round(build.elapsed, 2), **latency_summary(latencies, sum(latencies))}
+
+
+async def pool_saturation(concurrency: int, hold: float) -> dict:
+    """Каждая задача держит соединение hold секунд; при concurrency > pool_size+overflow видны ожидания и таймауты"""
+    metrics = pool_metrics["async"]
+    before_timeouts = metrics.timeouts
+    errors = 0
+
+    async def hold_connection():
+        nonlocal errors
+        try:
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await asyncio.sleep(hold)
+        except Exception:
+            errors += 1
+
+    with Timer() as timer:
+        await asyncio.gather(*(hold_connection() for _ in range(concurrency)))
+    snapshot = metrics.snapshot()
+    return {
+        "concurrency": concurrency,
+        "seconds": round(timer.elapsed, 3),
+        "errors": errors,
+        "timeouts": metrics.timeouts - before_timeouts,
+        "wait_max_ms": round(snapshot.wait_max_ms, 2),
+        "wait_avg_ms": round(snapshot.wait_avg_ms, 2),
+    }
+
+
+async def bcrypt_loop_latency(logins: int, tick: float = 0.005) -> dict:
+    """Задержка event loop во время параллельных bcrypt: синхронный вызов против пула потоков"""
+    from src.users.auth import get_password_hash, password_hasher, pwd_context
+
+    hashed = get_password_hash("benchmark")
+
+    async def measure(work):
+        lags = []
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(tick)
+                lags.append(time.perf_counter() - start - tick)
+
+        task = asyncio.create_task(ticker())
+        with Timer() as timer:
+            await work()
+        stop.set()
+        await task
+        return {"seconds": round(timer.elapsed, 3), **latency_summary(lags, timer.elapsed)}
+
+    async def sync_logins():
+        async def one():
+            pwd_context.verify("benchmark", hashed)
+        await asyncio.gather(*(one() for _ in range(logins)))
+
+    async def async_logins():
+        await asyncio.gather(*(password_hasher.verify("benchmark", hashed) for _ in range(logins)))
+
+    return {"sync_loop_lag": await measure(sync_logins), "async_loop_lag": await measure(async_logins)}
+
+
+async def bulk_vs_single_insert(rows: int) -> dict:
+    """Только MySQL: insert_product по одному против bulk_upsert_products"""
+    def make(prefix: str):
+        return [
+            ProductPostDTO(title=f"bench {idx}", description="bench", price=1.0, sku=f"{prefix}-{idx}", categories=[1])
+            for idx in range(rows)
+        ]
+
+    with Timer() as single:
+        for product in make("BENCH-SINGLE"):
+            await ProductORM.insert_product(product)
+    with Timer() as bulk:
+        await ProductORM.bulk_upsert_products(make("BENCH-BULK"))
+    return {
+        "single": {"rows_per_sec": round(rows / single.elapsed, 1)},
+        "bulk": {"rows_per_sec": round(rows / bulk.elapsed, 1)},
+    }
+
+
+async def checkout_stress(users: int, per_user: int) -> dict:
+    """Только MySQL: много параллельных checkout, включая повторные для одного пользователя"""
+    from src.queries.orders import OrderORM, CheckoutError
+
+    async with async_session_factory() as session:
+        await session.execute(CartItemTable.__table__.insert(), [
+            {"user_id": user_id, "product_id": product_id, "quantity": 1}
+            for user_id in range(1, users + 1) for product_id in range(1, 4)
+        ])
+        await session.commit()
+
+    outcomes = {"ok": 0, "empty": 0, "errors": 0}
+    latencies = []
+
+    async def one(user_id: int):
+        start = time.perf_counter()
+        try:
+            await OrderORM.checkout(CheckoutPostDTO(user_id=user_id, payment_method=PaymentMethod.CARD))
+            outcomes["ok"] += 1
+        except CheckoutError:
+            outcomes["empty"] += 1
+        except Exception:
+            outcomes["errors"] += 1
+        latencies.append(time.perf_counter() - start)
+
+    with Timer() as timer:
+        await asyncio.gather(*(one(user_id) for user_id in range(1, users + 1) for _ in range(per_user)))
+    # Корректно: ровно один успешный checkout на пользователя, остальные видят пустую корзину
+    return {**outcomes, **latency_summary(latencies, timer.elapsed)}
+
+
+async def sales_rollups(repeats: int = 20, status_changes: int = 200) -> dict:
+    """
+    Только MySQL: перестройка дневных агрегатов и запросы дашборда по агрегатам против GROUP BY по истории.
+    Для миллионов строк заказов: python -m benchmarks run --orders 1000000 ... (в среднем 3 строки на заказ).
+    """
+    from datetime import date, timedelta
+    from sqlalchemy import func
+    from src.database.enums import OrderStatus
+    from src.database.models import OrderTable, OrderItemTable
+    from src.queries.analytics import SalesORM, COUNTED_STATUSES
+    from src.queries.orders import OrderORM
+
+    with Timer() as rebuild:
+        await SalesORM.rebuild()
+    async with async_session_factory() as session:
+        orders = await session.scalar(select(func.count(OrderTable.id)))
+        last_day = (await session.scalar(select(func.max(OrderTable.order_date)))).date()
+
+    async def raw_top_products(date_from: date, date_to: date):
+        async with async_session_factory() as session:
+            revenue = func.sum(OrderItemTable.quantity * OrderItemTable.price_at_purchase)
+            result = await session.execute(
+                select(OrderItemTable.product_id, func.sum(OrderItemTable.quantity), revenue)
+                .join(OrderTable, OrderTable.id == OrderItemTable.order_id)
+                .where(
+                    OrderTable.status.in_(COUNTED_STATUSES),
+                    OrderTable.order_date >= date_from,
+                    OrderTable.order_date < date_to + timedelta(days=1),
+                )
+                .group_by(OrderItemTable.product_id)
+                .order_by(revenue.desc())
+                .limit(20)
+            )
+            return result.all()
+
+    async def timed(coro_factory) -> float:
+        with Timer() as timer:
+            for _ in range(repeats):
+                await coro_factory()
+        return round(timer.elapsed / repeats * 1000, 3)
+
+    ranges = {}
+    for days in (7, 30, 365):
+        date_from = last_day - timedelta(days=days - 1)
+        ranges[f"{days}d"] = {
+            "raw_top_products_ms": await timed(lambda: raw_top_products(date_from, last_day)),
+            "rollup_top_products_ms": await timed(lambda: SalesORM._top_products(date_from, last_day, 20, "revenue")),
+            "rollup_sales_by_day_ms": await timed(lambda: SalesORM._sales_by_day(date_from, last_day, None, None)),
+            "rollup_categories_ms": await timed(lambda: SalesORM._sales_by_category(date_from, last_day, 50)),
+        }
+
+    # Стоимость инкрементального обновления: оплаченный заказ отменяется и снова оплачивается
+    latencies = []
+    with Timer() as timer:
+        for order_id in range(1, min(status_changes, orders) + 1):
+            for status in (OrderStatus.CANCELLED, OrderStatus.PAID):
+                start = time.perf_counter()
+                await OrderORM.set_status(order_id, status)
+                latencies.append(time.perf_counter() - start)
+
+    return {
+        "orders": orders,
+        "rebuild": {"seconds": round(rebuild.elapsed, 3), "orders_per_sec": round(orders / rebuild.elapsed, 1)},
+        "ranges": ranges,
+        "status_change": latency_summary(latencies, timer.elapsed),
+    }
+
+
+async def cart_coalescing(users: int, clicks: int) -> dict:
+    """Только MySQL: клики через CartService с одним сбросом против upsert на каждый клик"""
+    from sqlalchemy.dialects.mysql import insert as mysql_insert
+    from src.queries.cart import cart_service
+
+    with Timer() as direct:
+        for user_id in range(1, users + 1):
+            for click in range(clicks):
+                async with async_session_factory() as session:
+                    stmt = mysql_insert(CartItemTable.__table__).values(
+                        user_id=user_id, product_id=1 + click % 5, quantity=1
+                    )
+                    await session.execute(stmt.on_duplicate_key_update(quantity=CartItemTable.quantity + 1))
+                    await session.commit()
+
+    with Timer() as coalesced:
+        for user_id in range(1, users + 1):
+            for click in range(clicks):
+                await cart_service.add_item(user_id, 1 + click % 5, 1)
+        await cart_service.flush()
+
+    total = users * clicks
+    return {
+        "direct": {"rows_per_sec": round(total / direct.elapsed, 1)},
+        "coalesced": {"rows_per_sec": round(total / coalesced.elapsed, 1)},
+    }
+
+
+async def payment_webhook_flood(app, payments: int, duplicates: int = 3, concurrency: int = 64) -> dict:
+    """
+    Только MySQL: фейковый провайдер заваливает /webhooks/payments повторами и колбэками не по порядку.
+    Кроме скорости проверяет итог: у каждого платежа старший из присланных статусов,
+    оплачены ровно заказы с успешными платежами, в журнале по строке на (transaction_id, статус).
+    Если все колбэки подтверждены, а итог не сошелся, сценарий падает.
+    """
+    import httpx
+    from sqlalchemy import func
+    from benchmarks.fake_provider import FakePaymentProvider
+    from src.config import settings
+    from src.database.enums import OrderStatus, PaymentStatus
+    from src.database.models import OrderTable, PaymentTable, PaymentEventTable
+    from src.queries.payments import payment_ingestor
+
+    async with async_session_factory() as session:
+        first_id = (await session.scalar(select(func.max(OrderTable.id))) or 0) + 1
+        ids = range(first_id, first_id + payments)
+        await session.execute(OrderTable.__table__.insert(), [
+            {"id": idx, "user_id": 1, "status": OrderStatus.PENDING, "total_amount": 100.0} for idx in ids
+        ])
+        await session.execute(PaymentTable.__table__.insert(), [
+            {"id": idx, "order_id": idx, "amount": 100.0, "status": PaymentStatus.PENDING,
+             "payment_method": PaymentMethod.CARD} for idx in ids
+        ])
+        await session.commit()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        provider = FakePaymentProvider(client, settings.PAYMENT_WEBHOOK_SECRET, duplicates=duplicates)
+        deliveries, expected = provider.plan([(idx, 100.0) for idx in ids])
+        with Timer() as timer:
+            codes, latencies, undelivered = await provider.deliver(deliveries, concurrency)
+
+    async with async_session_factory() as session:
+        statuses = dict((await session.execute(
+            select(PaymentTable.id, PaymentTable.status).where(PaymentTable.id.in_(list(ids)))
+        )).tuples().all())
+        paid = set(await session.scalars(
+            select(OrderTable.id).where(OrderTable.id.in_(list(ids)), OrderTable.status == OrderStatus.PAID)
+        ))
+        events = await session.scalar(
+            select(func.count()).select_from(PaymentEventTable).where(PaymentEventTable.payment_id.in_(list(ids)))
+        )
+
+    mismatched = sum(statuses[idx] != status for idx, status in expected.items())
+    # Заказ и платеж у бенчмарка с одним id: оплачены должны быть ровно заказы с успешным итогом
+    expected_paid = {idx for idx, status in expected.items() if status == PaymentStatus.SUCCESS}
+    expected_events = len({(d["transaction_id"], d["status"]) for d in deliveries})
+    consistent = not undelivered and mismatched == 0 and paid == expected_paid and events == expected_events
+    assert consistent or undelivered, "Итог колбэков не совпал с ожидаемым при полной доставке"
+    return {
+        **latency_summary(latencies, timer.elapsed),
+        "deliveries": len(deliveries),
+        "http_codes": {str(code): count for code, count in codes.items()},
+        "undelivered": len(undelivered),
+        "ingest": payment_ingestor.stats().model_dump(),
+        "consistent": consistent,
+        "mismatched_payments": mismatched,
+        "paid_orders": {
+            "expected": len(expected_paid),
+            "actual": len(paid),
+            "unexpected": len(paid - expected_paid),
+            "missing": len(expected_paid - paid),
+        },
+        "events": {"expected": expected_events, "actual": events},
+    }
+
+
+async def job_queue_throughput(jobs: int, workers: int = 4, flaky_every: int = 10) -> dict:
+    """Очередь в памяти: цена enqueue на пути запроса и скорость разбора, каждая flaky_every-я задача падает один раз"""
+    from src.queries.jobs import JobQueue, InMemoryJobStore
+
+    queue = JobQueue(
+        InMemoryJobStore(), workers=workers, max_attempts=3,
+        retry_base=0.001, retry_max=0.01, poll_interval=0.005, lease=60.0,
+    )
+    failed_once: set[int] = set()
+
+    @queue.register("bench.work")
+    async def work(payload: dict):
+        await asyncio.sleep(0)
+        if payload["n"] % flaky_every == 0 and payload["n"] not in failed_once:
+            failed_once.add(payload["n"])
+            raise RuntimeError("flaky")
+
+    latencies = []
+    with Timer() as timer:
+        for n in range(jobs):
+            start = time.perf_counter()
+            await queue.enqueue("bench.work", {"n": n}, key=str(n))
+            latencies.append(time.perf_counter() - start)
+        # Повторная постановка с теми же ключами не создает задач
+        for n in range(0, jobs, 10):
+            await queue.enqueue("bench.work", {"n": n}, key=str(n))
+        while queue.done + queue.failed < jobs:
+            await asyncio.sleep(0.001)
+    await queue.drain(timeout=1.0)
+    return {
+        "enqueue": latency_summary(latencies, sum(latencies)),
+        "jobs_per_sec": round(jobs / timer.elapsed, 1),
+        **queue.stats().model_dump(include={"done", "retried", "failed"}),
+    }
+
+
+async def catalog_snapshot(rows: int, queries: int = 200, seed: int = 7) -> dict:
+    """
+    Память снимка каталога против списка ProductGetDTO (в пересчете на 100k продуктов)
+    и задержка типовых выборок каталога: снимок против SQL
+    """
+    async def load_dtos():
+        async with async_session_factory() as session:
+            result = await session.execute(select_product_rows().order_by(ProductTable.id).limit(rows))
+            return product_rows_to_dtos(result)
+
+    async def retained(coro_factory):
+        # Сколько памяти остается занято результатом после загрузки, без временных объектов
+        tracemalloc.start()
+        value = await coro_factory()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return value, current
+
+    dtos, dto_bytes = await retained(load_dtos)
+    store = CatalogSnapshotStore(max_age=float("inf"))
+    snapshot, snapshot_bytes = await retained(store.build)
+    count = len(dtos)
+    del dtos
+    if not count or not len(snapshot):
+        return {"skipped": "нет продуктов"}
+
+    rng = random.Random(seed)
+    prices = sorted(snapshot.prices)
+    categories = list(snapshot.members)
+
+    def price_range():
+        lo = rng.randrange(len(prices))
+        return prices[lo], prices[min(len(prices) - 1, lo + len(prices) // 20)]
+
+    cases = {
+        "price_range_by_price": lambda: dict(zip(("min_price", "max_price"), price_range()), sort="price"),
+        "two_categories_newest": lambda: dict(
+            category_sets=[[category] for category in rng.sample(categories, min(2, len(categories)))],
+            sort="newest",
+        ),
+        "price_range_by_rating": lambda: dict(zip(("min_price", "max_price"), price_range()), sort="rating"),
+    }
+    order = {
+        "price": (ProductTable.price,),
+        "newest": (ProductTable.created_at.desc(),),
+        "rating": (func.max(ProductRatingTable.rating_avg).desc(),),
+    }
+
+    async def sql_select(min_price=None, max_price=None, category_sets=(), sort="id", limit=100):
+        query = select_product_rows()
+        if min_price is not None:
+            query = query.where(ProductTable.price >= min_price, ProductTable.price <= max_price)
+        for group in category_sets:
+            query = query.where(ProductTable.id.in_(
+                select(product_categories.c.product_id).where(product_categories.c.category_id.in_(list(group)))
+            ))
+        query = query.order_by(*order[sort], ProductTable.id).limit(limit)
+        async with async_session_factory() as session:
+            return product_rows_to_dtos(await session.execute(query))
+
+    latency = {}
+    for name, make_params in cases.items():
+        params = [make_params() for _ in range(queries)]
+        sql_latencies, snapshot_latencies = [], []
+        with Timer() as sql_timer:
+            for kwargs in params:
+                start = time.perf_counter()
+                await sql_select(**kwargs)
+                sql_latencies.append(time.perf_counter() - start)
+        with Timer() as snapshot_timer:
+            for kwargs in params:
+                start = time.perf_counter()
+                snapshot.to_dtos(snapshot.select(**kwargs))
+                snapshot_latencies.append(time.perf_counter() - start)
+        latency[name] = {
+            "sql": latency_summary(sql_latencies, sql_timer.elapsed),
+            "snapshot": latency_summary(snapshot_latencies, snapshot_timer.elapsed),
+        }
+
+    per_100k = 100_000 / count
+    return {
+        "products": count,
+        "build_ms": round(snapshot.build_time * 1000, 3),
+        "memory_mb_per_100k": {
+            "dto_list": round(dto_bytes * per_100k / 2 ** 20, 2),
+            "snapshot": round(snapshot_bytes * per_100k / 2 ** 20, 2),
+            "snapshot_footprint": round(snapshot.footprint() * per_100k / 2 ** 20, 2),
+        },
+        "latency": latency,
+    }
+
+
+async def hot_client(app, products: int, duration: float = 3.0, scraper_concurrency: int = 64, users: int = 8) -> dict:
+    """
+    Один скрейпер без пауз тянет страницы /products по 1000 строк, рядом обычные пользователи
+    и администратор открывают карточки продуктов. Без защиты и с RateLimitMiddleware:
+    задержка обычных пользователей и ответы, которые получил каждый тип клиента.
+    """
+    import httpx
+    from collections import Counter
+    from src.api.limits import RateLimitMiddleware, RateLimiter, LoadShedder, InMemoryRateLimitBackend, parse_route_limits
+    from src.config import settings
+
+    admin_key = "bench-admin"
+
+    def guarded():
+        return RateLimitMiddleware(
+            app,
+            limiter=RateLimiter(
+                InMemoryRateLimitBackend(),
+                rate=settings.RATE_LIMIT_RATE,
+                burst=settings.RATE_LIMIT_BURST,
+                routes=parse_route_limits(settings.RATE_LIMIT_ROUTES),
+            ),
+            shedder=LoadShedder(
+                max_in_flight=settings.SHED_MAX_IN_FLIGHT,
+                pool_wait=settings.SHED_POOL_WAIT_MS / 1000,
+                pool_waiting=settings.SHED_POOL_WAITING,
+                admin_factor=settings.SHED_ADMIN_FACTOR,
+            ),
+            exempt=[],
+            admin_key=admin_key,
+            proxy_hops=0,
+            retry_after=settings.SHED_RETRY_AFTER,
+        )
+
+    async def run(asgi_app) -> dict:
+        deadline = time.perf_counter() + duration
+        statuses = {"scraper": Counter(), "user": Counter(), "admin": Counter()}
+        latencies = {"user": [], "admin": []}
+
+        async def scraper(client):
+            while time.perf_counter() < deadline:
+                response = await client.get("/products?limit=1000")
+                statuses["scraper"][response.status_code] += 1
+                # Отказ 429 приходит из middleware без единого ожидания: без уступки циклу
+                # скрейперы крутились бы без переключений, и остальные клиенты не сделали бы ни запроса
+                await asyncio.sleep(0)
+
+        async def visitor(client, kind: str, seed: int, headers=None):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get(f"/products/{rng.randint(1, products)}", headers=headers)
+                latencies[kind].append(time.perf_counter() - start)
+                statuses[kind][response.status_code] += 1
+                await asyncio.sleep(0.05)
+
+        def client_for(ip: str):
+            transport = httpx.ASGITransport(app=asgi_app, client=(ip, 1234))
+            return httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+        clients = [client_for("10.0.0.1")] + [client_for(f"10.0.1.{idx}") for idx in range(users + 1)]
+        try:
+            with Timer() as timer:
+                await asyncio.gather(
+                    *(scraper(clients[0]) for _ in range(scraper_concurrency)),
+                    *(visitor(clients[idx + 1], "user", idx) for idx in range(users)),
+                    visitor(clients[-1], "admin", users, headers={"X-Admin-Key": admin_key}),
+                )
+        finally:
+            for client in clients:
+                await client.aclose()
+        # Иначе сценарий не показывает ни защиту пользователей, ни приоритет администратора
+        assert latencies["user"] and latencies["admin"], "Пользователи или администратор не сделали ни одного запроса"
+        return {
+            "user": latency_summary(latencies["user"], timer.elapsed),
+            "admin": latency_summary(latencies["admin"], timer.elapsed),
+            "statuses": {kind: dict(counter) for kind, counter in statuses.items()},
+        }
+
+    return {"unguarded": await run(app), "guarded": await run(guarded())}
+
+
+async def cold_start(paths: tuple[str, ...] = ("/products?limit=100", "/categories", "/products/1")) -> dict:
+    """Старт приложения и первые запросы с пустыми пулом и кэшами: без прогрева в lifespan и с ним"""
+    import httpx
+    from contextlib import AsyncExitStack
+    from src.main import create_fastapi_app
+    from src.queries.cache import product_cache
+    from src.queries.category_tree import category_tree
+
+    results = {}
+    for name, warmup in (("cold", False), ("warm", True)):
+        await async_engine.dispose()
+        product_cache.clear_local()
+        category_tree.loaded_at = None
+        app = create_fastapi_app(warmup=warmup)
+        async with AsyncExitStack() as stack:
+            with Timer() as startup:
+                await stack.enter_async_context(app.router.lifespan_context(app))
+            first = {}
+            transport = httpx.ASGITransport(app=app)
+            client = await stack.enter_async_context(httpx.AsyncClient(transport=transport, base_url="http://bench"))
+            for path in paths:
+                start = time.perf_counter()
+                await client.get(path)
+                first[path] = round((time.perf_counter() - start) * 1000, 3)
+        results[name] = {
+            "startup_ms": round(startup.elapsed * 1000, 3),
+            "first_request_ms": first,
+            "warmup": app.state.warmup.model_dump(),
+        }
+    return results
@@ -0,0 +1,118 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.database.database import metadata_for
+from src.database.enums import OrderStatus
+from src.database.models import (
+    UserTable, CategoryTable, ProductTable, OrderTable, OrderItemTable, ReviewOrm, ProductRatingTable,
+    product_categories,
+)
+
+WORDS = (
+    "red blue green black white smart mini pro ultra compact wireless steel wooden cotton leather "
+    "phone laptop chair table lamp shoes jacket watch camera kettle backpack speaker monitor keyboard"
+).split()
+
+
+async def _insert_chunks(conn, table, rows: list[dict], chunk_size: int = 5000):
+    for start in range(0, len(rows), chunk_size):
+        await conn.execute(insert(table), rows[start:start + chunk_size])
+
+
+async def seed_database(
+        engine: AsyncEngine,
+        products: int,
+        categories: int,
+        users: int,
+        orders: int,
+        reviews: int,
+        seed: int = 42,
+):
+    rnd = random.Random(seed)
+    now = datetime(2026, 1, 1)
+    metadata = metadata_for(engine.dialect.name)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.drop_all)
+        await conn.run_sync(metadata.create_all)
+
+        # Дерево категорий: первые 5% - корни, остальные цепляются к случайной более ранней категории
+        roots = max(1, categories // 20)
+        await _insert_chunks(conn, CategoryTable.__table__, [
+            {"id": idx, "name": f"category-{idx}", "parent_category_id": None if idx <= roots else rnd.randint(1, idx - 1)}
+            for idx in range(1, categories + 1)
+        ])
+
+        await _insert_chunks(conn, UserTable.__table__, [
+            {"id": idx, "email": f"user{idx}@example.com", "password_hash": "x", "role": "user",
+             "created_at": now, "updated_at": now}
+            for idx in range(1, users + 1)
+        ])
+
+        product_rows = []
+        links = []
+        for idx in range(1, products + 1):
+            title = " ".join(rnd.sample(WORDS, 3))
+            created = now - timedelta(minutes=products - idx)
+            product_rows.append({
+                "id": idx,
+                "title": f"{title} {idx}",
+                "description": " ".join(rnd.choices(WORDS, k=12)),
+                "price": round(rnd.uniform(1, 1000), 2),
+                "sku": f"SKU-{idx:08d}",
+                "created_at": created,
+                "updated_at": created,
+            })
+            links.extend(
+                {"product_id": idx, "category_id": category_id}
+                for category_id in rnd.sample(range(1, categories + 1), k=min(2, categories))
+            )
+        await _insert_chunks(conn, ProductTable.__table__, product_rows)
+        await _insert_chunks(conn, product_categories, links)
+
+        order_rows = []
+        item_rows = []
+        for idx in range(1, orders + 1):
+            items = []
+            for _ in range(rnd.randint(1, 5)):
+                product_id = rnd.randint(1, products)
+                items.append({
+                    "order_id": idx, "product_id": product_id, "quantity": rnd.randint(1, 3),
+                    "price_at_purchase": product_rows[product_id - 1]["price"],
+                })
+            item_rows.extend(items)
+            order_rows.append({
+                "id": idx,
+                "user_id": rnd.randint(1, users),
+                "status": rnd.choice([OrderStatus.PAID, OrderStatus.DELIVERED, OrderStatus.CANCELLED]),
+                "total_amount": round(sum(i["price_at_purchase"] * i["quantity"] for i in items), 2),
+                "order_date": now - timedelta(minutes=rnd.randint(0, 60 * 24 * 365)),
+            })
+        await _insert_chunks(conn, OrderTable.__table__, order_rows)
+        await _insert_chunks(conn, OrderItemTable.__table__, item_rows)
+
+        review_rows = []
+        totals: dict[int, list[int]] = {}
+        for idx in range(1, reviews + 1):
+            product_id = rnd.randint(1, products)
+            rating = rnd.randint(1, 5)
+            review_rows.append({
+                "id": idx, "user_id": rnd.randint(1, users), "product_id": product_id,
+                "rating": rating, "comment": None, "created_at": now,
+            })
+            total = totals.setdefault(product_id, [0, 0])
+            total[0] += rating
+            total[1] += 1
+        await _insert_chunks(conn, ReviewOrm.__table__, review_rows)
+        await _insert_chunks(conn, ProductRatingTable.__table__, [
+            {"product_id": product_id, "rating_sum": total, "rating_count": count, "rating_avg": round(total / count, 2)}
+            for product_id, (total, count) in totals.items()
+        ])
+
+    return {
+        "products": products, "categories": categories, "users": users,
+        "orders": orders, "order_items": len(item_rows), "reviews": reviews,
+    }
@@ -0,0 +1,200 @@
+import gzip
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.queries.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard не обязателен
+    zstandard = None
+
+
+class GzipCodec:
+    name = "gzip"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stream(self):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31 = gzip-заголовок
+        return (
+            lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+
+
+class BrotliCodec:
+    name = "br"
+
+    def __init__(self, quality: int = 5):
+        self.quality = quality
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.quality)
+
+    def stream(self):
+        compressor = brotli.Compressor(quality=self.quality)
+        return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int = 3):
+        self.compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def stream(self):
+        compressor = self.compressor.compressobj()
+        return (
+            lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush,
+        )
+
+
+def available_codecs() -> dict:
+    # Порядок - предпочтение сервера при равных q у клиента
+    codecs = {}
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCodec()
+    if brotli is not None:
+        codecs["br"] = BrotliCodec()
+    codecs["gzip"] = GzipCodec()
+    return codecs
+
+
+def negotiate(accept_encoding: str, codecs: dict) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for name in codecs:
+        quality = accepted.get(name, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов gzip/br/zstd по Accept-Encoding (br и zstd - если установлены пакеты).
+    Ответы с ETag сжимаются один раз: готовые тела лежат в LRU по (метод, путь, query, ETag, кодировка) -
+    слабый ETag уникален только в пределах ресурса.
+    """
+
+    def __init__(self, app, min_size: int, cache_size: int, cache_ttl: float):
+        self.app = app
+        self.min_size = min_size
+        self.codecs = available_codecs()
+        self.cache = LRUCache(cache_size, cache_ttl)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.codecs)
+        # Без подходящей кодировки ответ все равно проходит через sender: ему нужен Vary
+        codec = self.codecs[encoding] if encoding is not None else None
+        resource = f"{scope['method']} {scope['path']}?{scope.get('query_string', b'').decode('latin-1')}"
+        await self.app(scope, receive, _CompressingSender(self, codec, send, resource))
+
+
+class _CompressingSender:
+    def __init__(self, middleware: CompressionMiddleware, codec, send, resource: str):
+        self.middleware = middleware
+        self.codec = codec
+        self.send = send
+        self.resource = resource
+        self.start_message = None
+        self.mode = None  # passthrough / stream
+        self.stream = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.mode == "passthrough":
+            await self.send(message)
+            return
+        if self.mode == "stream":
+            await self._send_stream_chunk(message)
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        status = self.start_message["status"]
+        # 304 приходит без Content-Type, но заменяет в кэше ответ, который мог быть сжат
+        eligible = "content-encoding" not in headers and (
+            status == 304 or headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+        )
+        if eligible:
+            # Vary и на несжатом ответе: иначе общий кэш отдаст его (или сжатый) клиенту с другим Accept-Encoding
+            headers.add_vary_header("Accept-Encoding")
+        if (
+            not eligible
+            or self.codec is None
+            or status in (204, 304)
+            or (not more_body and len(body) < self.middleware.min_size)
+        ):
+            self.mode = "passthrough"
+            await self.send(self.start_message)
+            await self.send(message)
+            return
+
+        headers["Content-Encoding"] = self.codec.name
+
+        if more_body:
+            self.mode = "stream"
+            del headers["Content-Length"]
+            self.stream = self.codec.stream()
+            await self.send(self.start_message)
+            await self._send_stream_chunk(message)
+            return
+
+        etag = headers.get("etag")
+        cache_key = f"{self.resource}:{etag}:{self.codec.name}" if etag else None
+        compressed = self.middleware.cache.get(cache_key) if cache_key else None
+        if compressed is None:
+            compressed = self.codec.compress(body)
+            if cache_key:
+                self.middleware.cache.set(cache_key, compressed)
+        headers["Content-Length"] = str(len(compressed))
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": compressed})
+
+    async def _send_stream_chunk(self, message):
+        compress, finish = self.stream
+        body = compress(message.get("body", b""))
+        more_body = message.get("more_body", False)
+        if not more_body:
+            body += finish()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+from zoneinfo import ZoneInfo
+
+from fastapi import Request, Response
+
+from src.queries.cache import product_cache
+from src.queries.orm import ProductORM
+
+
+class CatalogValidator:
+    """
+    Состояние products (MAX(updated_at), COUNT(*)) перечитывается не чаще раза в ttl секунд.
+    Если оно поменялось (запись в другом процессе), локальный кэш сбрасывается, чтобы тело ответа
+    и валидатор не разъезжались. Записи меняют ETag сразу через поколения кэша: с общим backend
+    это счетчики gen:* в нем, то есть и записи других процессов.
+    updated_at в БД хранится без зоны (DATETIME), его зона - db_timezone (время сервера БД).
+    """
+
+    def __init__(self, ttl: float, db_timezone: str = "UTC"):
+        self.ttl = ttl
+        self.db_timezone = ZoneInfo(db_timezone)
+        self.state: Optional[tuple] = None
+        self.changed_at = datetime.now(timezone.utc)
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self) -> tuple:
+        if self.state is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self.state
+        async with self._lock:
+            if self.state is None or time.monotonic() - self._checked_at >= self.ttl:
+                state = await ProductORM.select_catalog_state()
+                if self.state is not None and state != self.state:
+                    product_cache.clear_local()
+                    self.changed_at = datetime.now(timezone.utc)
+                self.state = state
+                self._checked_at = time.monotonic()
+        return self.state
+
+    async def validators(self, namespace: str, key: str) -> tuple[str, datetime]:
+        max_updated_at, count = await self.refresh()
+        # Любая запись продукта сбрасывает "products", поэтому его поколение входит в ETag всех ответов каталога
+        generations = [await product_cache.generation(name) for name in dict.fromkeys(("products", namespace))]
+        digest = hashlib.sha1(f"{max_updated_at}:{count}:{namespace}:{generations}:{key}".encode()).hexdigest()
+        # Удаление не двигает MAX(updated_at), поэтому учитываем и время последних инвалидаций
+        last_modified = max(self.changed_at, product_cache.last_invalidated_at)
+        if max_updated_at is not None:
+            if max_updated_at.tzinfo is None:
+                max_updated_at = max_updated_at.replace(tzinfo=self.db_timezone)
+            last_modified = max(last_modified, max_updated_at.astimezone(timezone.utc))
+        return f'W/"{digest[:24]}"', last_modified.replace(microsecond=0)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def conditional_response(
+        request: Request,
+        validator: CatalogValidator,
+        namespace: str,
+        build: Callable[[], Awaitable[Response]],
+) -> Response:
+    """304 без загрузки продуктов, если клиентский ETag/If-Modified-Since еще актуален"""
+    etag, last_modified = await validator.validators(namespace, f"{request.url.path}?{request.url.query}")
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "public, max-age=0, must-revalidate",
+    }
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response = await build()
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from src.database.pool import pool_stats
+from src.instrumentation import RequestStats, current_stats
+from src.queries.cache import product_cache
+
+
+class RouteMetrics:
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.count = 0
+        self.duration_sum = 0.0
+        self.bucket_counts = [0] * len(self.buckets)
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.statuses: Counter = Counter()
+
+    def observe(self, status: int, total: float, stats: RequestStats):
+        self.count += 1
+        self.duration_sum += total
+        for idx, bound in enumerate(self.buckets):
+            if total <= bound:
+                self.bucket_counts[idx] += 1
+        self.sql_count += stats.sql_count
+        self.sql_time += stats.sql_time
+        self.rows += stats.rows
+        self.statuses[status] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+
+    def observe(self, method: str, route: str, status: int, total: float, stats: RequestStats):
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics()
+        metrics.observe(status, total, stats)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = [
+            "# TYPE http_requests_total counter",
+            "# TYPE http_request_duration_seconds histogram",
+            "# TYPE db_queries_total counter",
+            "# TYPE db_query_seconds_total counter",
+            "# TYPE db_rows_total counter",
+        ]
+        for (method, route), metrics in self.routes.items():
+            labels = f'method="{method}",route="{route}"'
+            for status, count in metrics.statuses.items():
+                lines.append(f'http_requests_total{{{labels},status="{status}"}} {count}')
+            for bound, count in zip(metrics.buckets, metrics.bucket_counts):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {metrics.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {metrics.duration_sum}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {metrics.count}")
+            lines.append(f"db_queries_total{{{labels}}} {metrics.sql_count}")
+            lines.append(f"db_query_seconds_total{{{labels}}} {metrics.sql_time}")
+            lines.append(f"db_rows_total{{{labels}}} {metrics.rows}")
+
+        lines.append("# TYPE db_pool_checked_out gauge")
+        lines.append("# TYPE db_pool_wait_ewma_ms gauge")
+        for stats in pool_stats():
+            lines.append(f'db_pool_checked_out{{pool="{stats.name}"}} {stats.checked_out}')
+            lines.append(f'db_pool_wait_ewma_ms{{pool="{stats.name}"}} {stats.wait_ewma_ms}')
+
+        cache = product_cache.stats()
+        lines.append("# TYPE cache_events_total counter")
+        for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            lines.append(f'cache_events_total{{event="{name}"}} {getattr(cache, name)}')
+        return "\n".join(lines) + "\n"
+
+
+class StackSampler:
+    """
+    Сэмплирующий профилировщик потока event loop: раз в interval снимает стек в кольцевой буфер.
+    Для медленного запроса сэмплы из его интервала сохраняются в формате collapsed stacks (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, interval: float, output_dir: str, max_samples: int = 100_000):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.samples: deque[tuple[float, str]] = deque(maxlen=max_samples)
+        self._target_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._target_thread = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.samples.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples.append((time.perf_counter(), ";".join(reversed(stack))))
+
+    def dump(self, start: float, end: float, name: str) -> Optional[str]:
+        """Пишет файл на диск - вызывать вне event loop (asyncio.to_thread)"""
+        folded = Counter(stack for ts, stack in list(self.samples) if start <= ts <= end)
+        if not folded:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_name = "".join(ch if ch.isalnum() else "_" for ch in name).strip("_")
+        path = os.path.join(self.output_dir, f"{int(time.time() * 1000)}_{safe_name}.folded")
+        with open(path, "w") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in folded.items())
+        return path
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware: SQL/фазы/общее время на запрос, заголовок Server-Timing, профиль медленных запросов"""
+
+    def __init__(self, app, registry: MetricsRegistry, sampler: StackSampler, slow_request: float):
+        self.app = app
+        self.registry = registry
+        self.sampler = sampler
+        self.slow_request = slow_request
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(token)
+            end = time.perf_counter()
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            self.registry.observe(scope["method"], route_path, status, end - start, stats)
+            if self.sampler.enabled and end - start >= self.slow_request:
+                await asyncio.to_thread(self.sampler.dump, start, end, f"{scope['method']}_{route_path}")
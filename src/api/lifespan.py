@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.api.conditional import CatalogValidator
+from src.config import settings
+from src.database.database import async_engine
+from src.database.routing import router
+from src.queries.cart import cart_service
+from src.queries.jobs import job_queue
+from src.queries.payments import payment_ingestor
+from src.queries.snapshot import catalog_snapshot
+from src.queries.orm import ProductORM, CategoryORM
+from src.users.auth import password_hasher
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupReport(BaseModel):
+    enabled: bool
+    connections: int = 0
+    phases_ms: dict[str, float] = {}
+    total_ms: float = 0.0
+    error: str | None = None
+
+
+async def warm_pool(engine: AsyncEngine, connections: int) -> int:
+    """
+    Открывает `connections` соединений одновременно и возвращает их в пул.
+    Держим все сразу, иначе пул отдаст одно и то же соединение каждому SELECT 1.
+    """
+    if connections <= 0:
+        return 0
+    opened = []
+    try:
+        for conn in await asyncio.gather(*(engine.connect() for _ in range(connections)), return_exceptions=True):
+            if isinstance(conn, BaseException):
+                logger.warning("Не удалось открыть соединение при прогреве: %s", conn)
+                continue
+            opened.append(conn)
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in opened))
+    finally:
+        for conn in opened:
+            await conn.close()
+    return len(opened)
+
+
+async def warm_up(catalog_validator: CatalogValidator) -> WarmupReport:
+    report = WarmupReport(enabled=True)
+    started = time.perf_counter()
+
+    async def phase(name: str, coro):
+        phase_started = time.perf_counter()
+        result = await coro
+        report.phases_ms[name] = round((time.perf_counter() - phase_started) * 1000, 3)
+        return result
+
+    try:
+        # Пул не больше pool_size: overflow-соединения все равно закроются при возврате
+        connections = min(settings.DB_POOL_WARM_CONNECTIONS, settings.DB_POOL_SIZE)
+        report.connections = await phase("pool", warm_pool(async_engine, connections))
+        for idx, engine in enumerate(router.replicas):
+            await phase(f"replica{idx}", warm_pool(engine, connections))
+        await phase("category_tree", CategoryORM.ensure_tree())
+        await phase("products_page", ProductORM.select_products_page())
+        await phase("catalog_validator", catalog_validator.refresh())
+        if settings.CATALOG_SNAPSHOT_ENABLED:
+            await phase("catalog_snapshot", catalog_snapshot.refresh())
+    except Exception as e:
+        # Недоступная БД не должна мешать старту: первые запросы прогреют все сами
+        logger.exception("Прогрев не завершен")
+        report.error = repr(e)
+    report.total_ms = round((time.perf_counter() - started) * 1000, 3)
+    logger.info("Прогрев: %s", report.model_dump_json())
+    return report
+
+
+async def shutdown():
+    # Фоновые задачи еще пишут в БД и в кэши, поэтому останавливаются первыми
+    await job_queue.drain(settings.JOBS_DRAIN_TIMEOUT)
+    await payment_ingestor.stop()
+    try:
+        # Корзины сбрасываются в БД до закрытия пулов
+        await cart_service.stop()
+    except Exception:
+        logger.exception("Не удалось сбросить корзины при остановке")
+    password_hasher.shutdown()
+    await router.dispose()
+    await async_engine.dispose()
+
+
+def create_lifespan(catalog_validator: CatalogValidator, warmup: bool = True):
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        job_queue.start()
+        if warmup:
+            app.state.warmup = await warm_up(catalog_validator)
+        else:
+            app.state.warmup = WarmupReport(enabled=False)
+        try:
+            yield
+        finally:
+            await shutdown()
+
+    return lifespan
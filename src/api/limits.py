@@ -0,0 +1,320 @@
+import hmac
+import json
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import NamedTuple, Optional, Sequence
+
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+
+from src.config import settings
+from src.database.enums import UserRole
+from src.database.pool import pool_metrics
+from src.queries.cache import CacheBackend, product_cache
+
+
+class Bucket(NamedTuple):
+    key: str
+    rate: float
+    burst: int
+
+
+class RateLimitBackend(ABC):
+    """Где лежат корзины токенов (память процесса, Redis и т.п.)"""
+
+    @abstractmethod
+    async def take(self, buckets: Sequence[Bucket], cost: float = 1.0) -> list[float]:
+        """
+        Списывает cost из всех корзин сразу или ни из одной.
+        Все нули - токены списаны, иначе для каждой корзины через сколько секунд в ней хватит токенов.
+        """
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Token bucket в памяти процесса: лимит действует на каждый воркер отдельно.
+    Хранится не больше max_keys корзин, давно не использованные вытесняются (они и так полные).
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()  # ключ -> [токены, время обновления]
+
+    def __len__(self):
+        return len(self._buckets)
+
+    async def take(self, buckets, cost=1.0):
+        now = time.monotonic()
+        states = [self._refill(bucket, now) for bucket in buckets]
+        waits = [
+            0.0 if state[0] >= cost else (cost - state[0]) / bucket.rate
+            for bucket, state in zip(buckets, states)
+        ]
+        if not any(waits):
+            for state in states:
+                state[0] -= cost
+        return waits
+
+    def _refill(self, bucket: Bucket, now: float) -> list[float]:
+        state = self._buckets.get(bucket.key)
+        if state is None:
+            state = self._buckets[bucket.key] = [float(bucket.burst), now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(bucket.key)
+            state[0] = min(float(bucket.burst), state[0] + (now - state[1]) * bucket.rate)
+            state[1] = now
+        return state
+
+
+class CacheRateLimitBackend(RateLimitBackend):
+    """
+    Общий лимит для всех процессов поверх CacheBackend. GCRA - тот же token bucket,
+    но на ключ хранится одно число: время, когда корзина снова станет полной.
+    get и set не атомарны, поэтому при гонке процессов лимит может пропустить лишний запрос;
+    для точного лимита take нужно реализовать скриптом на стороне хранилища.
+    """
+
+    def __init__(self, backend: CacheBackend, prefix: str = "ratelimit:"):
+        self.backend = backend
+        self.prefix = prefix
+
+    async def take(self, buckets, cost=1.0):
+        now = time.time()
+        updates = []
+        waits = []
+        for bucket in buckets:
+            key = self.prefix + bucket.key
+            raw = await self.backend.get(key)
+            full_at = max(float(raw), now) if raw else now
+            new_full_at = full_at + cost / bucket.rate
+            allowed_at = new_full_at - bucket.burst / bucket.rate
+            waits.append(max(allowed_at - now, 0.0))
+            updates.append((key, new_full_at))
+        if not any(waits):
+            for key, new_full_at in updates:
+                await self.backend.set(key, repr(new_full_at).encode(), new_full_at - now)
+        return waits
+
+
+class RouteLimit(NamedTuple):
+    name: str
+    method: str
+    path: str
+    prefix: bool
+    rate: float
+    burst: int
+
+
+def parse_route_limits(routes: dict[str, tuple[float, int]]) -> list[RouteLimit]:
+    """
+    Ключи вида "GET /products/stream" (точный путь) или "GET /categories/*" (префикс).
+    Точные пути проверяются раньше префиксов, длинные префиксы раньше коротких.
+    """
+    limits = []
+    for name, (rate, burst) in routes.items():
+        method, _, path = name.partition(" ")
+        prefix = path.endswith("*")
+        limits.append(RouteLimit(name, method.upper(), path.rstrip("*"), prefix, rate, burst))
+    return sorted(limits, key=lambda limit: (limit.prefix, -len(limit.path)))
+
+
+class Client(NamedTuple):
+    key: str
+    role: UserRole
+
+
+class LimitStats(BaseModel):
+    in_flight: int
+    in_flight_max: int
+    pressure: float
+    limited: dict[str, int]
+    shed: int
+    shed_admin: int
+
+
+class RateLimiter:
+    """Общая корзина на клиента и отдельные корзины на клиента и тяжелый маршрут"""
+
+    def __init__(self, backend: RateLimitBackend, rate: float, burst: int, routes: list[RouteLimit]):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.routes = routes
+        self.limited: Counter = Counter()
+
+    def match(self, method: str, path: str) -> Optional[RouteLimit]:
+        for limit in self.routes:
+            if limit.method == method and (path.startswith(limit.path) if limit.prefix else path == limit.path):
+                return limit
+        return None
+
+    async def check(self, client: Client, method: str, path: str) -> float:
+        """0 - запрос пропускается, иначе секунды до Retry-After"""
+        route = self.match(method, path)
+        buckets = [Bucket(client.key, self.rate, self.burst)]
+        if route is not None:
+            buckets.append(Bucket(f"{client.key}:{route.name}", route.rate, route.burst))
+        # Токены списываются из обеих корзин или ни из одной: отказ по маршруту не тратит общий лимит и наоборот
+        waits = await self.backend.take(buckets)
+        if not any(waits):
+            return 0.0
+        self.limited[route.name if route is not None and waits[1] else "*"] += 1
+        return max(waits)
+
+
+class LoadShedder:
+    """
+    Отказывает в новых запросах раньше, чем они встанут в очередь к пулу соединений.
+    Давление - максимум из долей порогов: запросов в работе, ожидающих соединение
+    и среднего ожидания соединения (оно учитывается, только пока очередь к пулу не пуста,
+    иначе после пика EWMA, которую никто не обновляет, отказывала бы вечно).
+    Обычные запросы отбрасываются при давлении от 1, администраторские - от admin_factor.
+    """
+
+    def __init__(self, max_in_flight: int, pool_wait: float, pool_waiting: int, admin_factor: float):
+        self.max_in_flight = max_in_flight
+        self.pool_wait = pool_wait
+        self.pool_waiting = pool_waiting
+        self.admin_factor = admin_factor
+        self.in_flight = 0
+        self.in_flight_max = 0
+        self.shed = 0
+        self.shed_admin = 0
+
+    def pressure(self) -> float:
+        signals = [self.in_flight / self.max_in_flight]
+        for metrics in pool_metrics.values():
+            if metrics.waiting:
+                signals.append(metrics.waiting / self.pool_waiting)
+                signals.append(metrics.wait_ewma / self.pool_wait)
+        return max(signals)
+
+    def admit(self, role: UserRole) -> Optional[float]:
+        """None - запрос принят, иначе текущее давление"""
+        pressure = self.pressure()
+        limit = self.admin_factor if role == UserRole.ADMIN else 1.0
+        if pressure >= limit:
+            if role == UserRole.ADMIN:
+                self.shed_admin += 1
+            else:
+                self.shed += 1
+            return pressure
+        return None
+
+
+class RateLimitMiddleware:
+    """
+    Чистый ASGI: отказ уходит до роутинга и до первого обращения к БД.
+    429 - клиент превысил свой лимит, 503 - перегружен сам сервис; в обоих случаях с Retry-After.
+    Клиент - администратор по X-Admin-Key, пользователь из scope["user"] (если перед этим middleware
+    стоит аутентификация) или IP. Администраторы не ограничиваются по частоте и отбрасываются последними.
+    IP из X-Forwarded-For берется, только если задано число своих прокси proxy_hops: каждый прокси
+    дописывает адрес справа, поэтому клиент - proxy_hops-я запись с конца, а все левее мог подделать сам клиент.
+    """
+
+    def __init__(
+            self,
+            app,
+            limiter: Optional[RateLimiter],
+            shedder: Optional[LoadShedder],
+            exempt: list[str],
+            admin_key: Optional[str],
+            proxy_hops: int,
+            retry_after: float,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.shedder = shedder
+        self.exempt = tuple(exempt)
+        self.admin_key = admin_key
+        self.proxy_hops = proxy_hops
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+        client = self.identify(scope)
+
+        shedder = self.shedder
+        if shedder is not None:
+            pressure = shedder.admit(client.role)
+            if pressure is not None:
+                # Чем сильнее перегрузка, тем дольше просим подождать
+                await self._reject(send, 503, self.retry_after * pressure, "Сервис перегружен")
+                return
+
+        if self.limiter is not None and client.role != UserRole.ADMIN:
+            wait = await self.limiter.check(client, scope["method"], scope["path"])
+            if wait:
+                await self._reject(send, 429, wait, "Слишком много запросов")
+                return
+
+        if shedder is None:
+            await self.app(scope, receive, send)
+            return
+        shedder.in_flight += 1
+        shedder.in_flight_max = max(shedder.in_flight_max, shedder.in_flight)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            shedder.in_flight -= 1
+
+    def identify(self, scope) -> Client:
+        headers = Headers(scope=scope)
+        if self.admin_key is not None:
+            key = headers.get("x-admin-key")
+            if key is not None and hmac.compare_digest(key, self.admin_key):
+                return Client("admin", UserRole.ADMIN)
+        user = scope.get("user")
+        user_id = getattr(user, "id", None)
+        if user_id is not None:
+            return Client(f"user:{user_id}", getattr(user, "role", UserRole.USER))
+        forwarded = headers.get("x-forwarded-for") if self.proxy_hops > 0 else None
+        entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()] if forwarded else []
+        if entries:
+            ip = entries[-min(self.proxy_hops, len(entries))]
+        else:
+            ip = scope["client"][0] if scope.get("client") else "unknown"
+        return Client(f"ip:{ip}", UserRole.USER)
+
+    @staticmethod
+    async def _reject(send, status: int, retry_after: float, detail: str):
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def limit_stats(limiter: Optional[RateLimiter], shedder: Optional[LoadShedder]) -> LimitStats:
+    return LimitStats(
+        in_flight=shedder.in_flight if shedder else 0,
+        in_flight_max=shedder.in_flight_max if shedder else 0,
+        pressure=round(shedder.pressure(), 3) if shedder else 0.0,
+        limited=dict(limiter.limited) if limiter else {},
+        shed=shedder.shed if shedder else 0,
+        shed_admin=shedder.shed_admin if shedder else 0,
+    )
+
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return InMemoryRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS)
+    if settings.RATE_LIMIT_BACKEND == "cache":
+        # Общий лимит возможен, только если у кэша продуктов настроен общий backend;
+        # молча перейти на лимит в памяти значило бы поднять реальный лимит в число воркеров раз
+        if product_cache.backend is None:
+            raise ValueError("RATE_LIMIT_BACKEND=cache требует общего backend у кэша продуктов")
+        return CacheRateLimitBackend(product_cache.backend)
+    raise ValueError(f"Неизвестный RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
@@ -0,0 +1,35 @@
+from functools import lru_cache
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from src.instrumentation import timed
+
+
+@lru_cache(maxsize=None)
+def adapter_for(dto_type: Any) -> TypeAdapter:
+    # TypeAdapter строит сериализатор pydantic-core, поэтому создаем его один раз на тип
+    return TypeAdapter(dto_type)
+
+
+def _infer_type(content: Any) -> Any:
+    if isinstance(content, list):
+        return list[type(content[0])] if content else list[Any]
+    return type(content)
+
+
+class DTOResponse(JSONResponse):
+    """
+    Сериализует DTO из src.database.dtos сразу в bytes через pydantic-core.
+    Если вернуть его из обработчика, FastAPI не валидирует ответ повторно и не гоняет его через jsonable_encoder;
+    response_model в декораторе остается только для схемы OpenAPI.
+    """
+
+    def __init__(self, content: Any, dto_type: Any = None, **kwargs):
+        self.dto_type = dto_type
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialize"):
+            return adapter_for(self.dto_type or _infer_type(content)).dump_json(content)
@@ -6,6 +6,123 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_PASS: str
     DB_USER: str
+    # Полный async DSN вместо DB_* (например sqlite+aiosqlite:///bench.db для бенчмарков)
+    DATABASE_URL_OVERRIDE: str | None = None
+
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # секунды ожидания свободного соединения
+    DB_POOL_RECYCLE: int = 1800  # пересоздаем соединения раньше, чем MySQL закроет их по wait_timeout
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARM_CONNECTIONS: int = 2  # сколько соединений открыть при старте приложения
+
+    WARMUP_ENABLED: bool = True  # прогрев пула и кэшей в lifespan
+    APP_RELOAD: bool = False  # автоперезагрузка uvicorn, только для разработки
+
+    # DSN реплик для чтения, например ["mysql+asyncmy://...", "sqlite+aiosqlite:///replica.db"]
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_STRATEGY: str = "round_robin"  # или least_connections
+    # Верхняя оценка отставания реплик: столько секунд после записи промахи кэша по ее неймспейсу читаются с primary
+    DB_REPLICA_LAG_WINDOW: float = 2.0
+
+    CACHE_ENABLED: bool = True
+    CACHE_TTL: float = 60.0  # секунды
+    CACHE_MAX_SIZE: int = 10_000
+    # Как часто сверять MAX(updated_at)/COUNT(*) products для ETag и согласованности кэша между процессами
+    CATALOG_VALIDATOR_TTL: float = 5.0
+    # Зона времени сервера БД: в ней CURRENT_TIMESTAMP пишет updated_at (DATETIME без зоны), нужна для Last-Modified
+    DB_TIMEZONE: str = "UTC"
+
+    BULK_CHUNK_SIZE: int = 1000
+
+    # Колоночный снимок каталога для /catalog: перестраивается после записей и не реже раза в столько секунд
+    CATALOG_SNAPSHOT_ENABLED: bool = True
+    CATALOG_SNAPSHOT_MAX_AGE: float = 60.0
+
+    ANALYTICS_BACKFILL_DAYS: int = 7  # дней заказов на одну транзакцию при перестройке агрегатов продаж
+
+    # Как часто перечитывать дерево категорий, чтобы подхватить изменения из других процессов
+    CATEGORY_TREE_MAX_AGE: float = 300.0
+
+    # Секунды между сбросами корзин в cart_items; столько изменений корзин теряется при падении воркера.
+    # Корзины до сброса живут в памяти процесса и не общие между воркерами uvicorn
+    CART_FLUSH_INTERVAL: float = 2.0
+    CART_IDLE_TTL: float = 1800.0
+
+    BCRYPT_ROUNDS: int = 12
+    HASH_WORKERS: int = 4  # потоки для bcrypt
+    HASH_MAX_PENDING: int = 64  # вызовов одновременно в очереди и в работе
+
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # байт; мелкие ответы дешевле отдать как есть
+    COMPRESSION_CACHE_SIZE: int = 512  # сжатых тел в кэше по ETag
+    COMPRESSION_CACHE_TTL: float = 300.0
+
+    # Инструментация запросов: Server-Timing, /metrics, профиль медленных запросов
+    INSTRUMENTATION_ENABLED: bool = False
+    PROFILER_ENABLED: bool = False
+    PROFILER_INTERVAL_MS: float = 5.0
+    SLOW_REQUEST_MS: float = 500.0
+    PROFILE_DIR: str = "profiles"
+
+    # Поиск N+1 для dev/test
+    QUERY_GUARD_ENABLED: bool = False
+    QUERY_GUARD_STRICT: bool = False  # True - падать с NPlusOneError вместо предупреждения в лог
+    QUERY_GUARD_THRESHOLD: int = 5
+    QUERY_GUARD_RAISE_ON_SQL: bool = False
+
+    # Фоновые задачи: memory - очередь в памяти процесса, database - таблица jobs
+    JOBS_BACKEND: str = "memory"
+    JOBS_WORKERS: int = 4
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_RETRY_BASE: float = 1.0  # секунды до первого повтора, дальше удваивается
+    JOBS_RETRY_MAX: float = 300.0
+    JOBS_POLL_INTERVAL: float = 1.0  # как часто проверять таблицу jobs и отложенные повторы
+    JOBS_LEASE: float = 300.0  # через сколько секунд задачу упавшего воркера заберет другой; пока задача идет, аренда продлевается
+    JOBS_RETENTION: float = 7 * 24 * 3600.0  # секунды хранения выполненных и упавших задач в jobs, 0 - хранить всегда
+    JOBS_PURGE_INTERVAL: float = 3600.0  # как часто каждый процесс удаляет устаревшие задачи
+    JOBS_DRAIN_TIMEOUT: float = 10.0
+
+    # Колбэки платежного провайдера применяются пачками: до PAYMENT_BATCH_SIZE штук или раз в PAYMENT_BATCH_DELAY секунд
+    PAYMENT_BATCH_SIZE: int = 200
+    PAYMENT_BATCH_DELAY: float = 0.01
+    PAYMENT_WEBHOOK_SECRET: str | None = None  # HMAC-SHA256 тела в заголовке X-Signature; None - без проверки
+
+    # Token bucket на клиента (администратор по ключу, пользователь или IP) и отдельно на тяжелые маршруты.
+    # Пользователь берется из scope["user"], но middleware аутентификации в приложении нет и scope["user"]
+    # никто не заполняет: пока клиенты различаются только по X-Admin-Key и IP
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory - лимит на процесс, cache - общий через backend кэша продуктов
+    RATE_LIMIT_RATE: float = 20.0  # запросов в секунду на клиента
+    RATE_LIMIT_BURST: int = 40
+    # "МЕТОД /путь" или "МЕТОД /префикс*" -> (запросов в секунду, burst)
+    RATE_LIMIT_ROUTES: dict[str, tuple[float, int]] = {
+        "GET /products/stream": (0.2, 2),
+        "GET /products": (5.0, 20),
+        "GET /products/search": (5.0, 10),
+        "POST /products/bulk": (1.0, 2),
+        "POST /orders/checkout": (2.0, 5),
+    }
+    RATE_LIMIT_EXEMPT: list[str] = ["/metrics", "/webhooks/", "/docs", "/openapi.json"]  # префиксы путей
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # Сколько своих прокси перед приложением дописывают X-Forwarded-For; IP клиента - столько-я запись с конца.
+    # 0 - заголовок не учитывается (его может подделать клиент)
+    RATE_LIMIT_PROXY_HOPS: int = 0
+    ADMIN_API_KEY: str | None = None  # X-Admin-Key: без лимита частоты, отбрасывается при перегрузке последним
+
+    # Ранний отказ 503 при перегрузке: запросов в работе, ожидающих соединение, среднее ожидание пула
+    SHED_ENABLED: bool = True
+    SHED_MAX_IN_FLIGHT: int = 256
+    SHED_POOL_WAITING: int = 20
+    SHED_POOL_WAIT_MS: float = 200.0
+    SHED_ADMIN_FACTOR: float = 2.0  # запас по давлению для администраторов
+    SHED_RETRY_AFTER: float = 1.0  # секунды, умножаются на давление
+
+    # memory - инвертированный индекс в процессе, mysql - FULLTEXT-индекс products
+    SEARCH_BACKEND: str = "memory"
+    # Индекс memory перестраивается не реже раза в столько секунд: столько другие воркеры не видят чужих правок
+    SEARCH_INDEX_MAX_AGE: float | None = 300.0
 
     @property
     def DATABASE_URL_asyncmy(self):
@@ -1,25 +1,31 @@
 import asyncio
 
-from sqlalchemy import create_engine, URL, text
-from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy import DefaultClause, MetaData, URL, text
+from sqlalchemy.orm import Session, DeclarativeBase
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from src.config import settings
+from src.database.pool import measured_pool, attach_pool_events
+
+
+def pool_options() -> dict:
+    return dict(
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
 
 
-engine = create_engine(
-    url=settings.DATABASE_URL_pymysql,
-    echo=True,
-    pool_size=10,
-    max_overflow=10,
-)
 async_engine = create_async_engine(
-    url=settings.DATABASE_URL_asyncmy,
-    echo=False,
-    pool_size=10,
-    max_overflow=10,
+    url=settings.DATABASE_URL_OVERRIDE or settings.DATABASE_URL_asyncmy,
+    poolclass=measured_pool(AsyncAdaptedQueuePool, "async"),
+    **pool_options(),
 )
+attach_pool_events(async_engine.sync_engine, "async")
 
-session_factory = sessionmaker(engine)
 async_session_factory = async_sessionmaker(async_engine)
 
 
@@ -37,6 +43,20 @@ class Base(DeclarativeBase):
         return f"<{self.__class__.__name__} {', '.join(cols)}>"
 
 
+def metadata_for(dialect: str) -> MetaData:
+    """Схема для create_all. ON UPDATE CURRENT_TIMESTAMP есть только в MySQL; для SQLite (тесты, бенчмарки) остается CURRENT_TIMESTAMP"""
+    if dialect == "mysql":
+        return Base.metadata
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        for column in copy.columns:
+            default = column.server_default
+            if default is not None and "ON UPDATE" in str(getattr(default, "arg", "")):
+                column.server_default = DefaultClause(text("CURRENT_TIMESTAMP"))
+    return metadata
+
+
 # async def create_table():
 #     async with engine.connect() as conn:
 #         res = await conn.execute(text("SELECT VERSION()"))
@@ -1,8 +1,11 @@
 from typing import Optional
 
-from pydantic import BaseModel, ConfigDict
-from datetime import datetime
-from src.database.enums import UserRole, OrderStatus, PaymentStatus, PaymentMethod
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime, date
+from decimal import Decimal
+from src.database.enums import (
+    UserRole, OrderStatus, PaymentStatus, PaymentMethod, BulkItemStatus, JobStatus, WebhookOutcome,
+)
 
 class UserPostDTO(BaseModel):
     email: str
@@ -21,6 +24,17 @@ class UserRelDTO(UserGetDTO):
     cart_items: list["CartItemGetDTO"]
     reviews: list["ReviewGetDTO"]
 
+class LoginPostDTO(BaseModel):
+    email: str
+    password: str
+
+class LoginGetDTO(BaseModel):
+    id: int
+    email: str
+    role: UserRole
+    model_config = ConfigDict(from_attributes=True)
+
+
 class UserProfilePostDTO(BaseModel):
     user_id: int
     username: str
@@ -43,8 +57,16 @@ class ProductGetDTO(ProductPostDTO):
     id: int
     created_at: datetime
     updated_at: datetime
+    rating_avg: float = 0.0
+    rating_count: int = 0
     model_config = ConfigDict(from_attributes=True)
 
+class ProductBulkResultDTO(BaseModel):
+    sku: str
+    status: BulkItemStatus
+    id: Optional[int] = None
+    error: Optional[str] = None
+
 class ProductRelDTO(ProductGetDTO):
     categories: list["CategoryGetDTO"]
     images: list["ProductImageGetDTO"]
@@ -55,6 +77,10 @@ class CategoryPostDTO(BaseModel):
     id: int
     parent_category_id: Optional[int]
 
+class CategoryCreateDTO(BaseModel):
+    name: str
+    parent_category_id: Optional[int] = None
+
 class CategoryGetDTO(CategoryPostDTO):
     name: str
     model_config = ConfigDict(from_attributes=True)
@@ -75,7 +101,7 @@ class ProductImageRelDTO(ProductImageGetDTO):
     product: "ProductGetDTO"
 
 class OrderPostDTO(BaseModel):
-    user_id: int
+    user_id: Optional[int]
     status: OrderStatus
     total_amount: float
 
@@ -84,6 +110,44 @@ class OrderGetDTO(OrderPostDTO):
     order_date: datetime
     model_config = ConfigDict(from_attributes=True)
 
+class CheckoutPostDTO(BaseModel):
+    user_id: int
+    payment_method: PaymentMethod
+
+class CheckoutItemDTO(BaseModel):
+    product_id: int
+    quantity: int
+    price_at_purchase: float
+
+class CheckoutGetDTO(BaseModel):
+    order_id: int
+    payment_id: int
+    status: OrderStatus
+    total_amount: float
+    items: list[CheckoutItemDTO]
+
+class OrderStatusPutDTO(BaseModel):
+    status: OrderStatus
+
+class SalesDayDTO(BaseModel):
+    day: date
+    units: int
+    revenue: Decimal
+
+class SalesProductDTO(BaseModel):
+    product_id: int
+    title: Optional[str]
+    units: int
+    revenue: Decimal
+    orders: int
+
+class SalesCategoryDTO(BaseModel):
+    category_id: int
+    name: Optional[str]
+    units: int
+    revenue: Decimal
+    orders: int
+
 class OrderRelDTO(OrderGetDTO):
     user: "UserGetDTO"
     items: list["OrderItemGetDTO"]
@@ -129,14 +193,25 @@ class PaymentGetDTO(PaymentPostDTO):
     created_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
+class PaymentWebhookDTO(BaseModel):
+    # Длина как у payments.transaction_id и payment_events.transaction_id
+    transaction_id: str = Field(min_length=1, max_length=255)
+    payment_id: int
+    status: PaymentStatus
+    amount: float
+
+class PaymentWebhookAckDTO(BaseModel):
+    transaction_id: str
+    outcome: WebhookOutcome
+
 class PaymentRelDTO(PaymentGetDTO):
     order: "OrderGetDTO"
 
 class ReviewGetDTO(BaseModel):
     user_id: int
     product_id: int
-    rating: int
-    comment: Optional[str]
+    rating: int = Field(ge=1, le=5)
+    comment: Optional[str] = Field(default=None, max_length=512)
     model_config = ConfigDict(from_attributes=True)
 
 class ReviewPostDTO(ReviewGetDTO):
@@ -147,9 +222,21 @@ class ReviewRelDTO(ReviewPostDTO):
     user: "UserGetDTO"
     product: "ProductGetDTO"
 
+class JobDTO(BaseModel):
+    id: str
+    name: str
+    payload: dict
+    idempotency_key: Optional[str] = None
+    status: JobStatus
+    attempts: int = 0
+    max_attempts: int
+    run_at: datetime
+    last_error: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
+
 UserRelDTO.model_rebuild()
 ProductRelDTO.model_rebuild()
 CategoryRelDTO.model_rebuild()
 OrderRelDTO.model_rebuild()
 PaymentRelDTO.model_rebuild()
-ReviewRelDTO.model_rebuild()
\ No newline at end of file
+ReviewRelDTO.model_rebuild()
@@ -19,3 +19,22 @@ class PaymentStatus(str, Enum):
 class PaymentMethod(str, Enum):
     CARD = 'card'
     PAYPAL = 'paypal'
+
+class BulkItemStatus(str, Enum):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DUPLICATE = 'duplicate'
+    ERROR = 'error'
+
+class JobStatus(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+class WebhookOutcome(str, Enum):
+    APPLIED = 'applied'
+    DUPLICATE = 'duplicate'
+    STALE = 'stale'
+    UNKNOWN_PAYMENT = 'unknown_payment'
+    REJECTED = 'rejected'
@@ -1,9 +1,10 @@
 from src.database.database import Base
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Table, Column, Integer, String, ForeignKey, text, Float
+from sqlalchemy import Table, Column, Integer, String, ForeignKey, text, Float, Index, UniqueConstraint, Date, JSON, Numeric
 
-from datetime import datetime
-from src.database.enums import UserRole, OrderStatus, PaymentStatus, PaymentMethod
+from datetime import datetime, date
+from decimal import Decimal
+from src.database.enums import UserRole, OrderStatus, PaymentStatus, PaymentMethod, JobStatus
 from typing import Annotated
 
 idpk = Annotated[int, mapped_column(primary_key=True, autoincrement=True)]
@@ -45,6 +46,10 @@ class UserProfileTable(Base):
 
 class ProductTable(Base):
     __tablename__ = 'products'
+    __table_args__ = (
+        Index('ix_products_title_description_fulltext', 'title', 'description', mysql_prefix='FULLTEXT'),
+        Index('ix_products_created_at', 'created_at'),
+    )
 
     id: Mapped[idpk]
     title: Mapped[str] = mapped_column(String(255))
@@ -78,6 +83,9 @@ class CategoryTable(Base):
 
 class ProductImageTable(Base):
     __tablename__ = 'product_images'
+    __table_args__ = (
+        Index('ix_product_images_product_main', 'product_id', 'is_main'),
+    )
 
     id: Mapped[idpk]
     product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='CASCADE'))
@@ -89,6 +97,10 @@ class ProductImageTable(Base):
 
 class OrderTable(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_user_date', 'user_id', 'order_date'),
+        Index('ix_orders_order_date', 'order_date'),
+    )
 
     id: Mapped[idpk]
     user_id: Mapped[int | None] = mapped_column(  # Разрешаем NULL
@@ -120,6 +132,9 @@ class OrderItemTable(Base):
 
 class CartItemTable(Base):
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'product_id', name='uq_cart_items_user_product'),
+    )
 
     id: Mapped[idpk]
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
@@ -144,8 +159,26 @@ class PaymentTable(Base):
     order: Mapped['OrderTable'] = relationship(back_populates='payment')
 
 
+class PaymentEventTable(Base):
+    """Журнал колбэков провайдера; повторная доставка того же статуса отбрасывается по первичному ключу"""
+    __tablename__ = 'payment_events'
+    __table_args__ = (
+        Index('ix_payment_events_payment', 'payment_id'),
+    )
+
+    transaction_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    status: Mapped[PaymentStatus] = mapped_column(primary_key=True)
+    # Без внешнего ключа: колбэк с неизвестным платежом тоже остается в журнале
+    payment_id: Mapped[int]
+    amount: Mapped[float] = mapped_column(Float)
+    received_at: Mapped[created_at]
+
+
 class ReviewOrm(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        Index('ix_reviews_product_created', 'product_id', 'created_at'),
+    )
 
     id: Mapped[idpk]
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
@@ -157,9 +190,90 @@ class ReviewOrm(Base):
     user: Mapped['UserTable'] = relationship(back_populates='reviews')
     product: Mapped['ProductTable'] = relationship()
 
+
+class ProductRatingTable(Base):
+    """Агрегат по reviews, поддерживается при вставке/удалении отзыва"""
+    __tablename__ = 'product_ratings'
+    __table_args__ = (
+        Index('ix_product_ratings_avg_product', 'rating_avg', 'product_id'),
+    )
+
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    rating_sum: Mapped[int] = mapped_column(Integer, server_default=text('0'))
+    rating_count: Mapped[int] = mapped_column(Integer, server_default=text('0'))
+    # Точное значение с двумя знаками: по (rating_avg, product_id) идет keyset-пагинация, FLOAT терял бы строки на равенствах
+    rating_avg: Mapped[Decimal] = mapped_column(Numeric(3, 2), server_default=text('0'))
+
+
+class SalesDailyProductTable(Base):
+    """Продажи по дням и продуктам: оплаченные и не отмененные заказы, поддерживается при смене статуса заказа"""
+    __tablename__ = 'sales_daily_products'
+    __table_args__ = (
+        Index('ix_sales_daily_products_product_day', 'product_id', 'day'),
+    )
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    # Без внешнего ключа: история продаж остается и после удаления продукта
+    product_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    units: Mapped[int] = mapped_column(Integer, server_default=text('0'))
+    revenue: Mapped[Decimal] = mapped_column(Numeric(12, 2), server_default=text('0'))
+    orders: Mapped[int] = mapped_column(Integer, server_default=text('0'))
+
+
+class SalesDailyCategoryTable(Base):
+    """То же по категориям; продукт в нескольких категориях учитывается в каждой из них"""
+    __tablename__ = 'sales_daily_categories'
+    __table_args__ = (
+        Index('ix_sales_daily_categories_category_day', 'category_id', 'day'),
+    )
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    category_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    units: Mapped[int] = mapped_column(Integer, server_default=text('0'))
+    revenue: Mapped[Decimal] = mapped_column(Numeric(12, 2), server_default=text('0'))
+    orders: Mapped[int] = mapped_column(Integer, server_default=text('0'))
+
+
+class SalesOrderCategoryTable(Base):
+    """
+    Что оплаченный заказ внес в sales_daily_categories. Отмена вычитает ровно это: категории продукта
+    могли смениться между оплатой и отменой, и пересчет по текущим увел бы агрегаты в минус
+    """
+    __tablename__ = 'sales_order_categories'
+
+    order_id: Mapped[int] = mapped_column(ForeignKey('orders.id', ondelete='CASCADE'), primary_key=True)
+    category_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    units: Mapped[int] = mapped_column(Integer)
+    revenue: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+
+
+class JobTable(Base):
+    """Постоянная очередь фоновых задач (src.queries.jobs.DatabaseJobStore)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Выборка следующей задачи: статус + время запуска
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    name: Mapped[str] = mapped_column(String(100))
+    payload: Mapped[dict] = mapped_column(JSON)
+    idempotency_key: Mapped[str | None] = mapped_column(String(255), unique=True)
+    status: Mapped[JobStatus]
+    attempts: Mapped[int] = mapped_column(Integer, server_default=text('0'))
+    max_attempts: Mapped[int] = mapped_column(Integer)
+    run_at: Mapped[datetime]
+    locked_until: Mapped[datetime | None]
+    last_error: Mapped[str | None] = mapped_column(String(1024))
+    created_at: Mapped[created_at]
+    updated_at: Mapped[updated_at]
+
+
 product_categories = Table(
     'product_categories',
     Base.metadata,
     Column('product_id', ForeignKey('products.id', ondelete='CASCADE'), primary_key=True),
     Column('category_id', ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True),
+    # PK начинается с product_id, для выборок по категории нужен обратный индекс
+    Index('ix_product_categories_category_product', 'category_id', 'product_id'),
 )
@@ -0,0 +1,119 @@
+import time
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool
+
+
+class PoolStats(BaseModel):
+    name: str
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    waiting: int
+    checkouts: int
+    checkins: int
+    connects: int
+    invalidations: int
+    timeouts: int
+    wait_avg_ms: float
+    wait_max_ms: float
+    wait_ewma_ms: float
+
+
+class PoolMetrics:
+    """Счетчики одного пула: сколько соединений выдано, сколько ждали и сколько раз не дождались"""
+
+    ewma_alpha = 0.2
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Pool | None = None
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_ewma = 0.0
+
+    def observe_wait(self, seconds: float):
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self.wait_ewma += self.ewma_alpha * (seconds - self.wait_ewma)
+
+    def snapshot(self) -> PoolStats:
+        pool = self.pool
+        return PoolStats(
+            name=self.name,
+            size=pool.size() if pool is not None else 0,
+            checked_in=pool.checkedin() if pool is not None else 0,
+            checked_out=pool.checkedout() if pool is not None else 0,
+            overflow=max(pool.overflow(), 0) if pool is not None else 0,
+            waiting=self.waiting,
+            checkouts=self.checkouts,
+            checkins=self.checkins,
+            connects=self.connects,
+            invalidations=self.invalidations,
+            timeouts=self.timeouts,
+            wait_avg_ms=self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+            wait_max_ms=self.wait_max * 1000,
+            wait_ewma_ms=self.wait_ewma * 1000,
+        )
+
+
+class _MeasuredPoolMixin:
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        metrics = self.metrics
+        metrics.pool = self
+        metrics.waiting += 1
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.waiting -= 1
+            metrics.observe_wait(time.perf_counter() - start)
+        metrics.checkouts += 1
+        return connection
+
+    def _do_return_conn(self, record):
+        self.metrics.checkins += 1
+        return super()._do_return_conn(record)
+
+
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+def measured_pool(base: type[Pool], name: str) -> type[Pool]:
+    """
+    Подкласс пула, который пишет метрики в pool_metrics[name].
+    Метрики лежат на классе, поэтому переживают pool.recreate() после dispose().
+    """
+    metrics = pool_metrics.setdefault(name, PoolMetrics(name))
+    return type(f"Measured{base.__name__}", (_MeasuredPoolMixin, base), {"metrics": metrics})
+
+
+def attach_pool_events(engine, name: str):
+    metrics = pool_metrics[name]
+    metrics.pool = engine.pool
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+
+def pool_stats() -> list[PoolStats]:
+    return [metrics.snapshot() for metrics in pool_metrics.values()]
@@ -0,0 +1,24 @@
+"""
+Фикстуры для проверки количества запросов в тестах.
+Подключение: `pytest_plugins = ["src.database.pytest_plugin"]` в conftest.py.
+"""
+import pytest
+
+from src.database.database import async_engine
+from src.database.query_guard import install_query_guard, count_queries, expect_queries
+
+
+@pytest.fixture
+def query_counter():
+    """Считает запросы теста и валит его, если одна форма запроса повторилась threshold раз"""
+    install_query_guard(async_engine.sync_engine)
+    with count_queries() as counter:
+        yield counter
+    counter.check(strict=True)
+
+
+@pytest.fixture
+def query_budget():
+    """`with query_budget(2): await ProductORM.select_products_page()`"""
+    install_query_guard(async_engine.sync_engine)
+    return expect_queries
@@ -0,0 +1,160 @@
+import json
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, raiseload
+
+logger = logging.getLogger(__name__)
+
+# IN (%s, %s, %s) с разным числом параметров - это одна и та же форма запроса
+_in_list_re = re.compile(r"\((?:\s*(?:%s|\?|%\(\w+\)s)\s*,)*\s*(?:%s|\?|%\(\w+\)s)\s*\)")
+_number_re = re.compile(r"\b\d+\b")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _in_list_re.sub("(?...)", statement)
+    return _number_re.sub("?", " ".join(shape.split()))
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class QueryCounter:
+    """Считает запросы в пределах запроса/сессии/теста и находит одинаковые формы, повторенные много раз"""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.count = 0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str):
+        self.count += 1
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self) -> dict[str, int]:
+        return {shape: count for shape, count in self.shapes.items() if count >= self.threshold}
+
+    def check(self, strict: bool = False):
+        repeated = self.repeated()
+        if not repeated:
+            return
+        message = "Похоже на N+1: " + "; ".join(f"{count}x {shape}" for shape, count in repeated.items())
+        if strict:
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+current_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = current_counter.get()
+    if counter is not None:
+        counter.record(statement)
+
+
+def _add_raiseload(orm_execute_state):
+    if orm_execute_state.is_select and not orm_execute_state.is_relationship_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*", sql_only=True))
+
+
+# Слушатели вешаются на глобальные engine и Session, а приложений за процесс может быть создано много
+# (в тестах - по одному на тест), поэтому установка идемпотентна: иначе каждый запрос считался бы N раз
+
+def install_query_guard(engine: Engine):
+    if not event.contains(engine, "before_cursor_execute", _count_statement):
+        event.listen(engine, "before_cursor_execute", _count_statement)
+
+
+def enable_raise_on_sql():
+    """Ленивая загрузка связей, не указанных явно через selectinload/joinedload, падает вместо SQL"""
+    if not event.contains(Session, "do_orm_execute", _add_raiseload):
+        event.listen(Session, "do_orm_execute", _add_raiseload)
+
+
+@contextmanager
+def count_queries(threshold: int = 5):
+    counter = QueryCounter(threshold)
+    token = current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        current_counter.reset(token)
+
+
+@contextmanager
+def expect_queries(max_count: int, threshold: int = 5):
+    """Бюджет запросов для ORM-метода: `with expect_queries(2): await ProductORM.select_products_page()`"""
+    with count_queries(threshold) as counter:
+        yield counter
+    assert counter.count <= max_count, f"Ожидалось не больше {max_count} запросов, выполнено {counter.count}"
+    counter.check(strict=True)
+
+
+class QueryGuardMiddleware:
+    """
+    ASGI middleware для dev/test: проверяет запросы каждого HTTP-запроса на N+1.
+    Без strict нарушение только пишется в лог. В strict проверка идет до последней части тела:
+    ответ целиком (обычный случай) заменяется на 500, а у потокового ответа, чей статус уже ушел,
+    обрывается соединение - так тест или клиент видит ошибку, а не только лог сервера.
+    """
+
+    def __init__(self, app, threshold: int, strict: bool):
+        self.app = app
+        self.threshold = threshold
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self.strict:
+            with count_queries(self.threshold) as counter:
+                await self.app(scope, receive, send)
+            counter.check()
+            return
+
+        start = None
+        rejected = False
+
+        async def guarded_send(message):
+            nonlocal start, rejected
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                # Статус придерживаем до конца тела, пока его еще можно заменить
+                start = message
+                return
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                try:
+                    counter.check(strict=True)
+                except NPlusOneError as e:
+                    if start is None:
+                        raise
+                    rejected = True
+                    await self._reject(send, str(e))
+                    return
+            if start is not None:
+                await send(start)
+                start = None
+            await send(message)
+
+        with count_queries(self.threshold) as counter:
+            await self.app(scope, receive, guarded_send)
+
+    @staticmethod
+    async def _reject(send, detail: str):
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 500,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,118 @@
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.config import settings
+from src.database.database import async_engine, async_session_factory, pool_options
+from src.database.pool import measured_pool, attach_pool_events
+
+# Запрос, который уже писал в primary, читает оттуда же (read-your-writes).
+# Флаг живет до конца области routing_scope: ее открывают middleware на каждый HTTP-запрос и фоновые
+# циклы на каждую итерацию. Иначе задачи, унаследовавшие контекст запроса после записи
+# (сброс корзин, воркеры очереди, перестройка снимка), читали бы с primary всю свою жизнь
+_use_primary: ContextVar[bool] = ContextVar("use_primary", default=False)
+
+
+def stick_to_primary() -> Token:
+    return _use_primary.set(True)
+
+
+@contextmanager
+def routing_scope():
+    """Чтения внутри идут на реплики, пока в этой же области не было записи"""
+    token = _use_primary.set(False)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+@contextmanager
+def primary_only():
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def create_replica_engine(url: str, name: str) -> AsyncEngine:
+    if url.startswith("sqlite"):
+        # Локальные aiosqlite-реплики для тестов: у SQLite свой пул, параметры MySQL к нему не подходят
+        return create_async_engine(url, echo=settings.DB_ECHO)
+    engine = create_async_engine(
+        url,
+        poolclass=measured_pool(AsyncAdaptedQueuePool, name),
+        **pool_options(),
+    )
+    attach_pool_events(engine.sync_engine, name)
+    return engine
+
+
+class ReplicaRouter:
+    """Отправляет read-only сессии на реплики (round_robin / least_connections), остальное на primary"""
+
+    def __init__(self, primary: AsyncEngine, replicas: list[AsyncEngine], strategy: str = "round_robin"):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Неизвестная стратегия балансировки: {strategy}")
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self._cycle = itertools.cycle(replicas)
+        self._factories = {
+            engine: async_sessionmaker(engine) for engine in replicas
+        }
+
+    @property
+    def engines(self) -> list[AsyncEngine]:
+        return [self.primary, *self.replicas]
+
+    def pick(self) -> AsyncEngine:
+        if not self.replicas or _use_primary.get():
+            return self.primary
+        if self.strategy == "least_connections":
+            # checkedout() есть не у всех пулов (нет у NullPool и StaticPool): тогда по кругу
+            counters = [getattr(engine.pool, "checkedout", None) for engine in self.replicas]
+            if all(counters):
+                return min(zip(self.replicas, counters), key=lambda pair: pair[1]())[0]
+        return next(self._cycle)
+
+    def read_session(self) -> AsyncSession:
+        engine = self.pick()
+        if engine is self.primary:
+            return async_session_factory()
+        return self._factories[engine]()
+
+    def write_session(self) -> AsyncSession:
+        stick_to_primary()
+        return async_session_factory()
+
+    async def dispose(self):
+        for engine in self.replicas:
+            await engine.dispose()
+
+
+class RoutingScopeMiddleware:
+    """ASGI: своя область read-your-writes на каждый HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with routing_scope():
+            await self.app(scope, receive, send)
+
+
+router = ReplicaRouter(
+    async_engine,
+    [create_replica_engine(url, f"replica{idx}") for idx, url in enumerate(settings.DB_REPLICA_URLS)],
+    strategy=settings.DB_REPLICA_STRATEGY,
+)
+read_session_factory = router.read_session
+write_session_factory = router.write_session
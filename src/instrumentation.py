@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestStats:
+    """Что потратил один запрос: SQL (количество, время, строки) и именованные фазы (dto, serialize...)"""
+
+    __slots__ = ("sql_count", "sql_time", "rows", "phases")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.phases: dict[str, float] = {}
+
+    def server_timing(self, total: float) -> str:
+        parts = [f'db;dur={self.sql_time * 1000:.2f};desc="{self.sql_count} queries"']
+        parts.extend(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items())
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def timed(phase: str):
+    """Замер фазы запроса; вне инструментированного запроса ничего не делает"""
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.phases[phase] = stats.phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+def _fetched_rows(cursor) -> int:
+    if cursor.description is None:
+        return 0
+    # rowcount у SELECT определен не везде (у SQLite он -1). Async-адаптеры (aiosqlite, asyncmy)
+    # выбирают весь результат еще в execute и держат его в буфере: его длина и есть число строк
+    buffered = getattr(cursor, "_rows", None)
+    if buffered is not None:
+        return len(buffered)
+    return max(cursor.rowcount, 0)
+
+
+# SQLAlchemy переносит contextvars в greenlet, поэтому хуки видят статистику текущего запроса.
+# Время старта хранится в контексте выполнения, а не в стеке на соединении: упавший запрос
+# не вызывает after_cursor_execute, и его запись в стеке сдвинула бы замеры всех следующих
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    stats = current_stats.get()
+    if stats is None or start is None:
+        return
+    stats.sql_count += 1
+    stats.sql_time += time.perf_counter() - start
+    stats.rows += _fetched_rows(cursor)
+
+
+def instrument_engine(engine: Engine):
+    """Идемпотентно: приложение может создаваться в процессе много раз, а engine у них общие"""
+    for name, listener in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+    ):
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
@@ -1,21 +1,96 @@
-import asyncio
-
-
-from database.dtos import ProductPostDTO
-from fastapi import FastAPI
+from src.config import settings
+from src.api.instrumentation import InstrumentationMiddleware, MetricsRegistry, StackSampler
+from src.api.compression import CompressionMiddleware
+from src.api.limits import (
+    RateLimitMiddleware, RateLimiter, LoadShedder, LimitStats, create_rate_limit_backend, limit_stats,
+    parse_route_limits,
+)
+from src.api.conditional import CatalogValidator, conditional_response
+from src.api.lifespan import create_lifespan, WarmupReport
+from src.api.responses import DTOResponse
+from src.database.database import async_engine
+from src.database.routing import router, RoutingScopeMiddleware
+from src.instrumentation import instrument_engine
+from src.database.pool import pool_stats, PoolStats
+from src.database.query_guard import QueryGuardMiddleware, install_query_guard, enable_raise_on_sql
+from src.database.dtos import (
+    ProductPostDTO, ProductGetDTO, ProductBulkResultDTO, CategoryGetDTO, CategoryCreateDTO,
+    CheckoutPostDTO, CheckoutGetDTO, CartItemPostDTO, ReviewGetDTO, ReviewPostDTO,
+    OrderGetDTO, OrderStatusPutDTO, SalesDayDTO, SalesProductDTO, SalesCategoryDTO, JobDTO,
+    PaymentWebhookDTO, PaymentWebhookAckDTO, LoginPostDTO, LoginGetDTO,
+)
+from src.database.enums import WebhookOutcome
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+import hmac
 import uvicorn
-from queries.orm import AsyncORM, ProductORM
+from src.queries.cache import product_cache, CacheStats
+from src.queries.orm import AsyncORM, ProductORM, CategoryORM, CategoryNotFoundError, CategoryConflictError
+from src.queries.cart import cart_service, CartUserNotFoundError
+from src.queries.orders import OrderORM, CheckoutError
+from src.queries.reviews import ReviewORM, ReviewTargetNotFoundError
+from src.queries.analytics import SalesORM
+from src.queries.jobs import job_queue, JobStats
+from src.queries.payments import payment_ingestor, verify_signature, IngestStats
+from src.queries.snapshot import catalog_snapshot, SnapshotStats, SortOrder
+from src.users.auth import password_hasher, HasherStats, authenticate_user
 from decimal import Decimal
+from datetime import date, timedelta
+from typing import Literal
 
 
-async def main():
-    # await AsyncORM.create_tables()
-    pass
+async def stream_products_body(fmt: str, chunk_size: int):
+    # NDJSON: по одному продукту на строку, JSON: один массив, собираемый по мере чтения
+    first = True
+    if fmt == "json":
+        yield b"["
+    async for chunk in ProductORM.stream_products(chunk_size):
+        if not chunk:
+            continue
+        if fmt == "json":
+            body = ",".join(product.model_dump_json() for product in chunk)
+            yield (body if first else "," + body).encode()
+        else:
+            yield "".join(product.model_dump_json() + "\n" for product in chunk).encode()
+        first = False
+    if fmt == "json":
+        yield b"]"
 
 #
-def create_fastapi_app():
-    app = FastAPI(title="FastAPI")
+def create_fastapi_app(warmup: bool | None = None):
+    catalog_validator = CatalogValidator(settings.CATALOG_VALIDATOR_TTL, settings.DB_TIMEZONE)
+    lifespan = create_lifespan(catalog_validator, settings.WARMUP_ENABLED if warmup is None else warmup)
+    app = FastAPI(title="FastAPI", lifespan=lifespan)
+    # Ближе всех к эндпоинтам: запись прилипает к primary только до конца своего запроса
+    app.add_middleware(RoutingScopeMiddleware)
+
+    limiter = RateLimiter(
+        create_rate_limit_backend(),
+        rate=settings.RATE_LIMIT_RATE,
+        burst=settings.RATE_LIMIT_BURST,
+        routes=parse_route_limits(settings.RATE_LIMIT_ROUTES),
+    ) if settings.RATE_LIMIT_ENABLED else None
+    shedder = LoadShedder(
+        max_in_flight=settings.SHED_MAX_IN_FLIGHT,
+        pool_wait=settings.SHED_POOL_WAIT_MS / 1000,
+        pool_waiting=settings.SHED_POOL_WAITING,
+        admin_factor=settings.SHED_ADMIN_FACTOR,
+    ) if settings.SHED_ENABLED else None
+    if limiter is not None or shedder is not None:
+        # Добавляется раньше CORS, чтобы 429/503 тоже получали CORS-заголовки
+        app.add_middleware(
+            RateLimitMiddleware,
+            limiter=limiter,
+            shedder=shedder,
+            exempt=settings.RATE_LIMIT_EXEMPT,
+            admin_key=settings.ADMIN_API_KEY,
+            proxy_hops=settings.RATE_LIMIT_PROXY_HOPS,
+            retry_after=settings.SHED_RETRY_AFTER,
+        )
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=[
@@ -24,33 +99,409 @@ def create_fastapi_app():
         ],
         allow_credentials=True,  # Разрешаем куки и авторизацию
         allow_methods=["*"],  # Разрешаем все HTTP-методы
-        allow_headers=["*"]  # Разрешаем все заголовки
+        allow_headers=["*"],  # Разрешаем все заголовки
+        expose_headers=["X-Next-After", "X-Next-After-Rating", "Server-Timing", "ETag", "Last-Modified", "Retry-After"],  # Курсор, тайминги, валидаторы, лимиты
     )
 
-    @app.get("/products", tags=["Продукты"])
-    async def get_resumes():
-        resumes = await ProductORM.select_all_products()
-        return resumes
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(
+            CompressionMiddleware,
+            min_size=settings.COMPRESSION_MIN_SIZE,
+            cache_size=settings.COMPRESSION_CACHE_SIZE,
+            cache_ttl=settings.COMPRESSION_CACHE_TTL,
+        )
+
+    if settings.QUERY_GUARD_ENABLED:
+        install_query_guard(async_engine.sync_engine)
+        if settings.QUERY_GUARD_RAISE_ON_SQL:
+            enable_raise_on_sql()
+        app.add_middleware(
+            QueryGuardMiddleware,
+            threshold=settings.QUERY_GUARD_THRESHOLD,
+            strict=settings.QUERY_GUARD_STRICT,
+        )
+
+    if settings.INSTRUMENTATION_ENABLED:
+        registry = MetricsRegistry()
+        sampler = StackSampler(settings.PROFILER_INTERVAL_MS / 1000, settings.PROFILE_DIR)
+        if settings.PROFILER_ENABLED:
+            sampler.start()
+        # Все engine роутера: иначе запросы, ушедшие на реплики, не попадут в метрики
+        for engine in router.engines:
+            instrument_engine(engine.sync_engine)
+        app.add_middleware(
+            InstrumentationMiddleware,
+            registry=registry,
+            sampler=sampler,
+            slow_request=settings.SLOW_REQUEST_MS / 1000,
+        )
+
+        @app.get("/metrics", tags=["Метрики"], response_class=PlainTextResponse)
+        async def prometheus_metrics():
+            return registry.render()
+
+        # Профилировщик пишет файлы на диск сервера: включать его на лету может только администратор.
+        # Без ADMIN_API_KEY ручки нет, профилировщиком управляет только PROFILER_ENABLED
+        if settings.ADMIN_API_KEY is not None:
+            admin_key = settings.ADMIN_API_KEY
+
+            @app.post("/debug/profiler", tags=["Метрики"], response_model=dict[str, bool])
+            async def toggle_profiler(enabled: bool, x_admin_key: str | None = Header(None)):
+                if x_admin_key is None or not hmac.compare_digest(x_admin_key, admin_key):
+                    raise HTTPException(status_code=403, detail="Нужен X-Admin-Key")
+                if enabled:
+                    sampler.start()
+                else:
+                    sampler.stop()
+                return DTOResponse({"enabled": sampler.enabled}, dict[str, bool])
+
+    @app.get("/products", tags=["Продукты"], response_model=list[ProductGetDTO])
+    async def get_resumes(
+            request: Request,
+            limit: int = Query(100, ge=1, le=1000),
+            after: int | None = Query(None, description="id последнего продукта предыдущей страницы"),
+    ):
+        async def build():
+            resumes = await ProductORM.select_products_page(limit=limit, after=after)
+            response = DTOResponse(resumes, list[ProductGetDTO])
+            if len(resumes) == limit:
+                response.headers["X-Next-After"] = str(resumes[-1].id)
+            return response
+
+        return await conditional_response(request, catalog_validator, "products", build)
+
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        @app.get("/catalog", tags=["Продукты"], response_model=list[ProductGetDTO])
+        async def get_catalog(
+                min_price: float | None = Query(None, ge=0),
+                max_price: float | None = Query(None, ge=0),
+                category: list[int] = Query([], description="продукт должен быть в поддереве каждой категории"),
+                sort: SortOrder = "id",
+                limit: int = Query(100, ge=1, le=1000),
+                offset: int = Query(0, ge=0, le=10_000),
+        ):
+            # Отвечает из снимка каталога в памяти, без запросов к БД
+            snapshot = await catalog_snapshot.get()
+            tree = await CategoryORM.ensure_tree() if category else None
+            rows = snapshot.select(
+                min_price, max_price, [tree.descendants(category_id) for category_id in category], sort, limit, offset
+            )
+            return DTOResponse(snapshot.to_dtos(rows), list[ProductGetDTO])
+
+        @app.get("/metrics/catalog", tags=["Метрики"], response_model=SnapshotStats)
+        async def catalog_metrics():
+            return DTOResponse((await catalog_snapshot.get()).stats(), SnapshotStats)
+
+    @app.get("/products/stream", tags=["Продукты"])
+    async def stream_products(
+            format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+            chunk_size: int = Query(500, ge=1, le=5000),
+    ):
+        media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+        return StreamingResponse(stream_products_body(format, chunk_size), media_type=media_type)
+
+    @app.get("/products/search", tags=["Продукты"], response_model=list[ProductGetDTO])
+    async def search_products(
+            q: str = Query(..., min_length=1, max_length=200),
+            limit: int = Query(20, ge=1, le=100),
+            category_id: int | None = None,
+            prefix: bool = True,
+    ):
+        products = await ProductORM.search_products(q, limit=limit, category_id=category_id, prefix=prefix)
+        return DTOResponse(products, list[ProductGetDTO])
+
+    @app.get("/products/top-rated", tags=["Продукты"], response_model=list[ProductGetDTO])
+    async def get_top_rated(
+            request: Request,
+            limit: int = Query(20, ge=1, le=100),
+            after_rating: Decimal | None = Query(None, description="rating_avg последнего продукта предыдущей страницы"),
+            after_id: int | None = Query(None, description="id последнего продукта предыдущей страницы"),
+    ):
+        async def build():
+            products = await ReviewORM.select_top_rated(limit=limit, after_rating=after_rating, after_id=after_id)
+            response = DTOResponse(products, list[ProductGetDTO])
+            if len(products) == limit:
+                # Курсор из двух частей: следующая страница - ?after_rating=...&after_id=...
+                response.headers["X-Next-After"] = str(products[-1].id)
+                response.headers["X-Next-After-Rating"] = f"{products[-1].rating_avg:.2f}"
+            return response
+
+        return await conditional_response(request, catalog_validator, "products", build)
+
+    @app.get("/products/{product_id}", tags=["Продукты"], response_model=ProductGetDTO)
+    async def get_product(request: Request, product_id: int):
+        async def build():
+            product = await ProductORM.select_one_products(product_id)
+            if product is None:
+                raise HTTPException(status_code=404, detail="Продукт не найден")
+            return DTOResponse(product, ProductGetDTO)
+
+        return await conditional_response(request, catalog_validator, f"product:{product_id}", build)
+
+    @app.get("/metrics/cache", tags=["Метрики"], response_model=CacheStats)
+    async def cache_metrics():
+        return DTOResponse(product_cache.stats(), CacheStats)
+
+    @app.get("/metrics/db", tags=["Метрики"], response_model=list[PoolStats])
+    async def db_metrics():
+        return DTOResponse(pool_stats(), list[PoolStats])
+
+    @app.get("/metrics/auth", tags=["Метрики"], response_model=HasherStats)
+    async def auth_metrics():
+        return DTOResponse(password_hasher.stats(), HasherStats)
+
+    @app.get("/metrics/warmup", tags=["Метрики"], response_model=WarmupReport)
+    async def warmup_metrics(request: Request):
+        return DTOResponse(request.app.state.warmup, WarmupReport)
+
+    @app.get("/metrics/limits", tags=["Метрики"], response_model=LimitStats)
+    async def limits_metrics():
+        return DTOResponse(limit_stats(limiter, shedder), LimitStats)
+
+    @app.get("/metrics/jobs", tags=["Метрики"], response_model=JobStats)
+    async def jobs_metrics():
+        return DTOResponse(job_queue.stats(), JobStats)
+
+    @app.get("/metrics/payments", tags=["Метрики"], response_model=IngestStats)
+    async def payments_metrics():
+        return DTOResponse(payment_ingestor.stats(), IngestStats)
 
-    @app.post("/addProduct")
+    @app.post("/auth/login", tags=["Пользователи"], response_model=LoginGetDTO)
+    async def login(credentials: LoginPostDTO):
+        user = await authenticate_user(credentials.email, credentials.password)
+        if user is None:
+            # Один ответ для неизвестного email и неверного пароля
+            raise HTTPException(status_code=401, detail="Неверный email или пароль")
+        return DTOResponse(LoginGetDTO.model_validate(user, from_attributes=True), LoginGetDTO)
+
+    @app.get("/jobs/{job_id}", tags=["Задачи"], response_model=JobDTO)
+    async def get_job(job_id: str):
+        job = await job_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        return DTOResponse(job, JobDTO)
+
+    @app.post("/addProduct", response_model=ProductGetDTO)
     async def add_product(product_data: ProductPostDTO):  # Используем DTO как тип параметра
         new_product = await ProductORM.insert_product(product_data)
-        return new_product
+        return DTOResponse(new_product, ProductGetDTO)
 
-    @app.delete("/deleteProduct")
+    @app.post("/products/bulk", tags=["Продукты"], response_model=list[ProductBulkResultDTO])
+    async def add_products_bulk(
+            products: list[ProductPostDTO],
+            chunk_size: int = Query(settings.BULK_CHUNK_SIZE, ge=1, le=10_000),
+    ):
+        results = await ProductORM.bulk_upsert_products(products, chunk_size=chunk_size)
+        return DTOResponse(results, list[ProductBulkResultDTO])
+
+    @app.delete("/deleteProduct", response_model=dict[str, str])
     async def delete_product(sku):
         result = await ProductORM.delete_product_by_sku(sku)
-        return result
+        return DTOResponse(result, dict[str, str])
+
+    @app.get("/categories", tags=["Категории"], response_model=list[CategoryGetDTO])
+    async def get_categories():
+        tree = await CategoryORM.ensure_tree()
+        return DTOResponse(list(tree.categories.values()), list[CategoryGetDTO])
+
+    @app.get("/categories/{category_id}/breadcrumbs", tags=["Категории"], response_model=list[CategoryGetDTO])
+    async def get_breadcrumbs(category_id: int):
+        tree = await CategoryORM.ensure_tree()
+        if category_id not in tree.categories:
+            raise HTTPException(status_code=404, detail="Категория не найдена")
+        return DTOResponse(tree.ancestors(category_id), list[CategoryGetDTO])
+
+    @app.get("/categories/{category_id}/products", tags=["Категории"], response_model=list[ProductGetDTO])
+    async def get_category_products(
+            request: Request,
+            category_id: int,
+            limit: int = Query(100, ge=1, le=1000),
+            after: int | None = Query(None, description="id последнего продукта предыдущей страницы"),
+    ):
+        tree = await CategoryORM.ensure_tree()
+        if category_id not in tree.categories:
+            raise HTTPException(status_code=404, detail="Категория не найдена")
+
+        async def build():
+            products = await CategoryORM.select_subtree_products(category_id, limit=limit, after=after)
+            response = DTOResponse(products, list[ProductGetDTO])
+            if len(products) == limit:
+                response.headers["X-Next-After"] = str(products[-1].id)
+            return response
+
+        return await conditional_response(request, catalog_validator, f"category:{category_id}", build)
+
+    @app.post("/categories", tags=["Категории"], response_model=CategoryGetDTO)
+    async def add_category(category_data: CategoryCreateDTO):
+        try:
+            category = await CategoryORM.insert_category(category_data)
+        except CategoryNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except CategoryConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return DTOResponse(category, CategoryGetDTO)
+
+    @app.put("/categories/{category_id}", tags=["Категории"], response_model=CategoryGetDTO)
+    async def update_category(category_id: int, category_data: CategoryCreateDTO):
+        try:
+            category = await CategoryORM.update_category(category_id, category_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except CategoryNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except CategoryConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if category is None:
+            raise HTTPException(status_code=404, detail="Категория не найдена")
+        return DTOResponse(category, CategoryGetDTO)
+
+    @app.delete("/categories/{category_id}", tags=["Категории"], response_model=dict[str, str])
+    async def delete_category(category_id: int):
+        result = await CategoryORM.delete_category(category_id)
+        return DTOResponse(result, dict[str, str])
+
+    @app.get("/cart/{user_id}", tags=["Корзина"], response_model=list[CartItemPostDTO])
+    async def get_cart(user_id: int):
+        try:
+            items = await cart_service.get_cart(user_id)
+        except CartUserNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return DTOResponse(cart_service.to_dtos(user_id, items), list[CartItemPostDTO])
+
+    @app.post("/cart/items", tags=["Корзина"], response_model=CartItemPostDTO)
+    async def add_cart_item(item: CartItemPostDTO):
+        # Проверка идет через кэш продуктов, чтобы клик не стоил запроса в БД
+        if await ProductORM.select_one_products(item.product_id) is None:
+            raise HTTPException(status_code=404, detail="Продукт не найден")
+        try:
+            quantity = await cart_service.add_item(item.user_id, item.product_id, item.quantity)
+        except CartUserNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return DTOResponse(item.model_copy(update={"quantity": quantity}), CartItemPostDTO)
+
+    @app.put("/cart/items", tags=["Корзина"], response_model=CartItemPostDTO)
+    async def set_cart_item(item: CartItemPostDTO):
+        if item.quantity > 0 and await ProductORM.select_one_products(item.product_id) is None:
+            raise HTTPException(status_code=404, detail="Продукт не найден")
+        try:
+            quantity = await cart_service.set_quantity(item.user_id, item.product_id, item.quantity)
+        except CartUserNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return DTOResponse(item.model_copy(update={"quantity": quantity}), CartItemPostDTO)
+
+    @app.post("/cart/{user_id}/flush", tags=["Корзина"], response_model=dict[str, str])
+    async def end_cart_session(user_id: int):
+        await cart_service.end_session(user_id)
+        return DTOResponse({"message": "Корзина сохранена"}, dict[str, str])
+
+    @app.post("/reviews", tags=["Отзывы"], response_model=ReviewPostDTO)
+    async def add_review(review_data: ReviewGetDTO):
+        try:
+            review = await ReviewORM.insert_review(review_data)
+        except ReviewTargetNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return DTOResponse(review, ReviewPostDTO)
+
+    @app.delete("/reviews/{review_id}", tags=["Отзывы"], response_model=dict[str, str])
+    async def delete_review(review_id: int):
+        result = await ReviewORM.delete_review(review_id)
+        return DTOResponse(result, dict[str, str])
+
+    @app.post("/orders/checkout", tags=["Заказы"], response_model=CheckoutGetDTO)
+    async def checkout(checkout_data: CheckoutPostDTO):
+        try:
+            order = await OrderORM.checkout(checkout_data)
+        except CheckoutError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return DTOResponse(order, CheckoutGetDTO)
+
+    @app.post("/webhooks/payments", tags=["Платежи"], response_model=PaymentWebhookAckDTO)
+    async def payment_webhook(request: Request):
+        # Тело читаем сами: подпись считается по сырым байтам
+        body = await request.body()
+        secret = settings.PAYMENT_WEBHOOK_SECRET
+        if secret is not None and not verify_signature(body, request.headers.get("x-signature"), secret):
+            raise HTTPException(status_code=401, detail="Неверная подпись")
+        try:
+            event = PaymentWebhookDTO.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        try:
+            outcome = await payment_ingestor.submit(event)
+        except Exception:
+            # Провайдер повторит колбэк
+            raise HTTPException(status_code=503, detail="Колбэк не сохранен, повторите позже")
+        if outcome == WebhookOutcome.UNKNOWN_PAYMENT:
+            raise HTTPException(status_code=404, detail="Платеж не найден")
+        return DTOResponse(PaymentWebhookAckDTO(transaction_id=event.transaction_id, outcome=outcome), PaymentWebhookAckDTO)
+
+    @app.put("/orders/{order_id}/status", tags=["Заказы"], response_model=OrderGetDTO)
+    async def set_order_status(order_id: int, status_data: OrderStatusPutDTO):
+        order = await OrderORM.set_status(order_id, status_data.status)
+        if order is None:
+            raise HTTPException(status_code=404, detail="Заказ не найден")
+        return DTOResponse(order, OrderGetDTO)
+
+    def sales_range(date_from: date | None, date_to: date | None) -> tuple[date, date]:
+        # По умолчанию последние 30 дней
+        date_to = date_to or date.today()
+        date_from = date_from or date_to - timedelta(days=29)
+        if date_from > date_to:
+            raise HTTPException(status_code=400, detail="date_from позже date_to")
+        return date_from, date_to
+
+    @app.get("/analytics/sales", tags=["Аналитика"], response_model=list[SalesDayDTO])
+    async def get_sales_by_day(
+            date_from: date | None = None,
+            date_to: date | None = None,
+            product_id: int | None = None,
+            category_id: int | None = None,
+    ):
+        days = await SalesORM.sales_by_day(*sales_range(date_from, date_to), product_id, category_id)
+        return DTOResponse(days, list[SalesDayDTO])
+
+    @app.get("/analytics/top-products", tags=["Аналитика"], response_model=list[SalesProductDTO])
+    async def get_top_sellers(
+            date_from: date | None = None,
+            date_to: date | None = None,
+            limit: int = Query(20, ge=1, le=500),
+            order_by: Literal["revenue", "units"] = "revenue",
+    ):
+        products = await SalesORM.top_products(*sales_range(date_from, date_to), limit, order_by)
+        return DTOResponse(products, list[SalesProductDTO])
+
+    @app.get("/analytics/categories", tags=["Аналитика"], response_model=list[SalesCategoryDTO])
+    async def get_sales_by_category(
+            date_from: date | None = None,
+            date_to: date | None = None,
+            limit: int = Query(50, ge=1, le=1000),
+    ):
+        categories = await SalesORM.sales_by_category(*sales_range(date_from, date_to), limit)
+        return DTOResponse(categories, list[SalesCategoryDTO])
+
+    @app.post("/analytics/rebuild", tags=["Аналитика"], response_model=JobDTO, status_code=202)
+    async def rebuild_sales(request: Request, date_from: date | None = None, date_to: date | None = None):
+        # Повтор запроса с тем же Idempotency-Key вернет уже поставленную задачу
+        job = await job_queue.enqueue(
+            "sales.rebuild",
+            {"date_from": date_from and date_from.isoformat(), "date_to": date_to and date_to.isoformat()},
+            key=request.headers.get("idempotency-key"),
+        )
+        return DTOResponse(job, JobDTO, status_code=202)
+
+    @app.post("/reviews/rebuild-ratings", tags=["Отзывы"], response_model=JobDTO, status_code=202)
+    async def rebuild_ratings(request: Request):
+        job = await job_queue.enqueue("ratings.rebuild", key=request.headers.get("idempotency-key"))
+        return DTOResponse(job, JobDTO, status_code=202)
 
     return app
 
 app = create_fastapi_app()
 
 if __name__ == '__main__':
-    asyncio.run(main())
     uvicorn.run(
         app="src.main:app",
-        reload=True,
+        reload=settings.APP_RELOAD,
     )
     # print(a[0])
     # asyncio.run(AsyncORM.insert_data())
@@ -8,7 +8,7 @@ from alembic import context
 from src.config import settings
 
 from src.database.models import UserTable # noqa
-from src.database import Base
+from src.database.database import Base
 
 config = context.config
 
@@ -0,0 +1,36 @@
+"""payment webhook events
+
+Revision ID: 0b9e4d7c1a53
+Revises: f81c3d5a2b07
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b9e4d7c1a53'
+down_revision: Union[str, None] = 'f81c3d5a2b07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'payment_events',
+        sa.Column('transaction_id', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'SUCCESS', 'FAILED', name='paymentstatus'), nullable=False),
+        sa.Column('payment_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('transaction_id', 'status'),
+    )
+    op.create_index('ix_payment_events_payment', 'payment_events', ['payment_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payment_events_payment', table_name='payment_events')
+    op.drop_table('payment_events')
@@ -0,0 +1,31 @@
+"""products fulltext index
+
+Revision ID: 3f9c2a1d7b4e
+Revises: 1d6e0a4f8c29
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a1d7b4e'
+down_revision: Union[str, None] = '1d6e0a4f8c29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_products_title_description_fulltext',
+        'products',
+        ['title', 'description'],
+        mysql_prefix='FULLTEXT',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_title_description_fulltext', table_name='products')
@@ -0,0 +1,39 @@
+"""exact product_ratings.rating_avg
+
+Revision ID: 6d2f8b4e1c07
+Revises: 0b9e4d7c1a53
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2f8b4e1c07'
+down_revision: Union[str, None] = '0b9e4d7c1a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        'product_ratings', 'rating_avg',
+        existing_type=sa.Float(), type_=sa.Numeric(3, 2),
+        existing_server_default=sa.text('0'), existing_nullable=False,
+    )
+    # Пересчитываем из точных sum/count, а не округляем старый FLOAT
+    op.execute(
+        "UPDATE product_ratings SET rating_avg = "
+        "CASE WHEN rating_count > 0 THEN ROUND(rating_sum / rating_count, 2) ELSE 0 END"
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'product_ratings', 'rating_avg',
+        existing_type=sa.Numeric(3, 2), type_=sa.Float(),
+        existing_server_default=sa.text('0'), existing_nullable=False,
+    )
@@ -0,0 +1,41 @@
+"""product ratings aggregate
+
+Revision ID: 8a1e5c3b9d20
+Revises: 3f9c2a1d7b4e
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a1e5c3b9d20'
+down_revision: Union[str, None] = '3f9c2a1d7b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'product_ratings',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('rating_sum', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('rating_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('rating_avg', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id'),
+    )
+    op.create_index('ix_product_ratings_avg_product', 'product_ratings', ['rating_avg', 'product_id'])
+    # Начальное заполнение из уже существующих отзывов
+    op.execute(
+        "INSERT INTO product_ratings (product_id, rating_sum, rating_count, rating_avg) "
+        "SELECT product_id, SUM(rating), COUNT(*), AVG(rating) FROM reviews GROUP BY product_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_product_ratings_avg_product', table_name='product_ratings')
+    op.drop_table('product_ratings')
@@ -0,0 +1,39 @@
+"""sales revenue as DECIMAL
+
+Revision ID: 9c3a7e5f2d41
+Revises: 6d2f8b4e1c07
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3a7e5f2d41'
+down_revision: Union[str, None] = '6d2f8b4e1c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('sales_daily_products', 'sales_daily_categories')
+
+
+def upgrade() -> None:
+    # Старые FLOAT-суммы округляются до копеек; накопленную ошибку убирает задача sales.rebuild
+    for table in TABLES:
+        op.alter_column(
+            table, 'revenue',
+            existing_type=sa.Float(), type_=sa.Numeric(12, 2),
+            existing_server_default=sa.text('0'), existing_nullable=False,
+        )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.alter_column(
+            table, 'revenue',
+            existing_type=sa.Numeric(12, 2), type_=sa.Float(),
+            existing_server_default=sa.text('0'), existing_nullable=False,
+        )
@@ -0,0 +1,46 @@
+"""per-order category contributions to sales rollups
+
+Revision ID: a7d4c2e9f310
+Revises: 9c3a7e5f2d41
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d4c2e9f310'
+down_revision: Union[str, None] = '9c3a7e5f2d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sales_order_categories',
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Numeric(12, 2), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('order_id', 'category_id'),
+    )
+    # Уже учтенные заказы: вклад по текущим категориям, как его и посчитала бы перестройка агрегатов
+    op.execute(
+        """
+        INSERT INTO sales_order_categories (order_id, category_id, units, revenue)
+        SELECT o.id, pc.category_id, SUM(oi.quantity), SUM(oi.quantity * CAST(oi.price_at_purchase AS DECIMAL(12, 2)))
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        JOIN product_categories pc ON pc.product_id = oi.product_id
+        WHERE o.status IN ('PAID', 'SHIPPED', 'DELIVERED')
+        GROUP BY o.id, pc.category_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sales_order_categories')
@@ -0,0 +1,48 @@
+"""indexes for hot queries
+
+Revision ID: c47d0e2f6a18
+Revises: 8a1e5c3b9d20
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d0e2f6a18'
+down_revision: Union[str, None] = '8a1e5c3b9d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_products_created_at', 'products', ['created_at'])
+    op.create_index('ix_product_categories_category_product', 'product_categories', ['category_id', 'product_id'])
+    op.create_index('ix_product_images_product_main', 'product_images', ['product_id', 'is_main'])
+    op.create_index('ix_orders_user_date', 'orders', ['user_id', 'order_date'])
+    op.create_index('ix_reviews_product_created', 'reviews', ['product_id', 'created_at'])
+
+    # Перед уникальным ключом схлопываем дубли корзины в одну строку с суммарным количеством
+    op.execute(
+        "UPDATE cart_items c JOIN ("
+        "SELECT MIN(id) AS id, SUM(quantity) AS quantity FROM cart_items "
+        "GROUP BY user_id, product_id HAVING COUNT(*) > 1"
+        ") d ON c.id = d.id SET c.quantity = d.quantity"
+    )
+    op.execute(
+        "DELETE c1 FROM cart_items c1 JOIN cart_items c2 "
+        "ON c1.user_id = c2.user_id AND c1.product_id = c2.product_id AND c1.id > c2.id"
+    )
+    op.create_unique_constraint('uq_cart_items_user_product', 'cart_items', ['user_id', 'product_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_cart_items_user_product', 'cart_items', type_='unique')
+    op.drop_index('ix_reviews_product_created', table_name='reviews')
+    op.drop_index('ix_orders_user_date', table_name='orders')
+    op.drop_index('ix_product_images_product_main', table_name='product_images')
+    op.drop_index('ix_product_categories_category_product', table_name='product_categories')
+    op.drop_index('ix_products_created_at', table_name='products')
@@ -0,0 +1,52 @@
+"""daily sales rollups
+
+Revision ID: e5b8f1a3c692
+Revises: c47d0e2f6a18
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8f1a3c692'
+down_revision: Union[str, None] = 'c47d0e2f6a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Перестройка агрегатов идет по диапазонам дат
+    op.create_index('ix_orders_order_date', 'orders', ['order_date'])
+    op.create_table(
+        'sales_daily_products',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('units', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('revenue', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.Column('orders', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'product_id'),
+    )
+    op.create_index('ix_sales_daily_products_product_day', 'sales_daily_products', ['product_id', 'day'])
+    op.create_table(
+        'sales_daily_categories',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('units', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('revenue', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.Column('orders', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'category_id'),
+    )
+    op.create_index('ix_sales_daily_categories_category_day', 'sales_daily_categories', ['category_id', 'day'])
+    # Историю заполняет python -m src.queries.analytics: по частям, без одной длинной транзакции
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sales_daily_categories_category_day', table_name='sales_daily_categories')
+    op.drop_table('sales_daily_categories')
+    op.drop_index('ix_sales_daily_products_product_day', table_name='sales_daily_products')
+    op.drop_table('sales_daily_products')
+    op.drop_index('ix_orders_order_date', table_name='orders')
@@ -0,0 +1,358 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Literal
+
+from pydantic import TypeAdapter
+from sqlalchemy import select, delete, func, literal, cast, exists, Numeric
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database.dtos import SalesDayDTO, SalesProductDTO, SalesCategoryDTO
+from src.database.enums import OrderStatus
+from src.database.models import (
+    OrderTable, OrderItemTable, ProductTable, CategoryTable, SalesDailyProductTable, SalesDailyCategoryTable,
+    SalesOrderCategoryTable, product_categories,
+)
+from src.database.routing import read_session_factory, write_session_factory
+from src.queries.cache import product_cache
+from src.queries.jobs import job_queue
+
+daily_products = SalesDailyProductTable.__table__
+daily_categories = SalesDailyCategoryTable.__table__
+order_categories = SalesOrderCategoryTable.__table__
+
+# Заказ попадает в продажи после оплаты и выпадает при отмене; отгрузка и доставка его не меняют
+COUNTED_STATUSES = frozenset({OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED})
+
+# Строки заказа, продукт которых уже удален (product_id = NULL), копятся под этим id,
+# чтобы итоги по дням сходились с заказами
+DELETED_PRODUCT_ID = 0
+
+# Выручка хранится в DECIMAL(12, 2) и считается в Decimal: сумма FLOAT по тысячам строк теряет копейки
+CENTS = Decimal("0.01")
+MONEY = Numeric(12, 2)
+
+sales_days_adapter = TypeAdapter(list[SalesDayDTO])
+sales_products_adapter = TypeAdapter(list[SalesProductDTO])
+sales_categories_adapter = TypeAdapter(list[SalesCategoryDTO])
+
+
+def sales_delta(old_status: OrderStatus, new_status: OrderStatus) -> int:
+    """+1 - заказ нужно добавить в агрегаты, -1 - вычесть, 0 - ничего не меняется"""
+    return int(new_status in COUNTED_STATUSES) - int(old_status in COUNTED_STATUSES)
+
+
+def _line_revenue(quantity, price) -> Decimal:
+    # price_at_purchase - FLOAT, через str получаем те же копейки, что были в цене
+    return quantity * Decimal(str(price)).quantize(CENTS)
+
+
+def _additive_upsert(dialect: str, table, rows: list[dict]):
+    if dialect == "sqlite":
+        stmt = sqlite_insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={
+                "units": table.c.units + stmt.excluded.units,
+                "revenue": table.c.revenue + stmt.excluded.revenue,
+                "orders": table.c.orders + stmt.excluded.orders,
+            },
+        )
+    stmt = mysql_insert(table).values(rows)
+    return stmt.on_duplicate_key_update(
+        units=table.c.units + stmt.inserted.units,
+        revenue=table.c.revenue + stmt.inserted.revenue,
+        orders=table.c.orders + stmt.inserted.orders,
+    )
+
+
+class SalesORM:
+    @staticmethod
+    async def apply_order(session: AsyncSession, order_id: int, order_date: datetime, sign: int):
+        """
+        Добавляет (sign=1) или вычитает (sign=-1) заказ из дневных агрегатов.
+        Вызывается в транзакции смены статуса, после блокировки строки заказа.
+        Вклад в категории при добавлении запоминается в sales_order_categories, а вычитается ровно он,
+        а не пересчет по текущим product_categories.
+        """
+        result = await session.execute(
+            select(OrderItemTable.product_id, OrderItemTable.quantity, OrderItemTable.price_at_purchase)
+            .where(OrderItemTable.order_id == order_id)
+        )
+        by_product: dict[int, list] = defaultdict(lambda: [0, Decimal(0)])
+        for product_id, quantity, price in result:
+            totals = by_product[product_id if product_id is not None else DELETED_PRODUCT_ID]
+            totals[0] += quantity
+            totals[1] += _line_revenue(quantity, price)
+        if not by_product:
+            return
+
+        day = order_date.date()
+        dialect = session.bind.dialect.name
+        await session.execute(_additive_upsert(dialect, daily_products, [
+            {"day": day, "product_id": product_id, "units": sign * units, "revenue": sign * revenue, "orders": sign}
+            for product_id, (units, revenue) in by_product.items()
+        ]))
+
+        by_category: dict[int, list] = defaultdict(lambda: [0, Decimal(0)])
+        if sign > 0:
+            result = await session.execute(
+                select(product_categories.c.product_id, product_categories.c.category_id)
+                .where(product_categories.c.product_id.in_(list(by_product)))
+            )
+            for product_id, category_id in result:
+                units, revenue = by_product[product_id]
+                totals = by_category[category_id]
+                totals[0] += units
+                totals[1] += revenue
+            if by_category:
+                await session.execute(order_categories.insert(), [
+                    {"order_id": order_id, "category_id": category_id, "units": units, "revenue": revenue}
+                    for category_id, (units, revenue) in by_category.items()
+                ])
+        else:
+            result = await session.execute(
+                select(order_categories.c.category_id, order_categories.c.units, order_categories.c.revenue)
+                .where(order_categories.c.order_id == order_id)
+            )
+            for category_id, units, revenue in result:
+                by_category[category_id] = [units, Decimal(revenue)]
+            await session.execute(delete(order_categories).where(order_categories.c.order_id == order_id))
+        if by_category:
+            await session.execute(_additive_upsert(dialect, daily_categories, [
+                {"day": day, "category_id": category_id, "units": sign * units, "revenue": sign * revenue, "orders": sign}
+                for category_id, (units, revenue) in by_category.items()
+            ]))
+
+    @staticmethod
+    async def rebuild(date_from: date | None = None, date_to: date | None = None, chunk_days: int | None = None):
+        """
+        Пересчет агрегатов из orders/order_items по диапазонам дней, каждая порция в своей транзакции.
+        Порция сначала ставит разделяемые блокировки на свои заказы, затем перезаписывает свои дни:
+        смена статуса заказа из этих дней ждет окончания порции и применяется уже поверх пересчета,
+        поэтому перестройка безопасна на работающей базе.
+        Категории берутся из запомненного вклада заказов; вклад считается по текущим категориям
+        только для учтенных заказов, у которых его еще нет.
+        """
+        chunk_days = chunk_days or settings.ANALYTICS_BACKFILL_DAYS
+        async with write_session_factory() as session:
+            if date_from is None or date_to is None:
+                first, last = (await session.execute(
+                    select(func.min(OrderTable.order_date), func.max(OrderTable.order_date))
+                )).one()
+                if first is None:
+                    return {"days": 0}
+                date_from = date_from or first.date()
+                date_to = date_to or last.date()
+            await session.commit()
+
+            start = date_from
+            while start <= date_to:
+                end = min(start + timedelta(days=chunk_days), date_to + timedelta(days=1))
+                await SalesORM._rebuild_range(session, start, end)
+                await session.commit()
+                start = end
+
+        await product_cache.invalidate(namespaces=["analytics"])
+        return {"days": (date_to - date_from).days + 1}
+
+    @staticmethod
+    async def _rebuild_range(session: AsyncSession, start: date, end: date):
+        in_range = (
+            OrderTable.order_date >= datetime.combine(start, datetime.min.time()),
+            OrderTable.order_date < datetime.combine(end, datetime.min.time()),
+        )
+        await session.execute(select(func.count(OrderTable.id)).where(*in_range).with_for_update(read=True))
+        await session.execute(delete(daily_products).where(daily_products.c.day >= start, daily_products.c.day < end))
+        await session.execute(delete(daily_categories).where(daily_categories.c.day >= start, daily_categories.c.day < end))
+
+        day = func.date(OrderTable.order_date)
+        counted = (*in_range, OrderTable.status.in_(COUNTED_STATUSES))
+        product_id = func.coalesce(OrderItemTable.product_id, literal(DELETED_PRODUCT_ID))
+        # Цена строки приводится к DECIMAL до умножения и суммы, как в apply_order
+        line_revenue = OrderItemTable.quantity * cast(OrderItemTable.price_at_purchase, MONEY)
+        await session.execute(
+            daily_products.insert().from_select(
+                ["day", "product_id", "units", "revenue", "orders"],
+                select(
+                    day,
+                    product_id,
+                    func.sum(OrderItemTable.quantity),
+                    func.sum(line_revenue),
+                    func.count(func.distinct(OrderTable.id)),
+                )
+                .select_from(OrderTable)
+                .join(OrderItemTable, OrderItemTable.order_id == OrderTable.id)
+                .where(*counted)
+                .group_by(day, product_id)
+            )
+        )
+        await session.execute(
+            delete(order_categories).where(order_categories.c.order_id.in_(
+                select(OrderTable.id).where(*in_range, OrderTable.status.not_in(COUNTED_STATUSES))
+            ))
+        )
+        await session.execute(
+            order_categories.insert().from_select(
+                ["order_id", "category_id", "units", "revenue"],
+                select(
+                    OrderTable.id,
+                    product_categories.c.category_id,
+                    func.sum(OrderItemTable.quantity),
+                    func.sum(line_revenue),
+                )
+                .select_from(OrderTable)
+                .join(OrderItemTable, OrderItemTable.order_id == OrderTable.id)
+                .join(product_categories, product_categories.c.product_id == OrderItemTable.product_id)
+                .where(*counted, ~exists().where(order_categories.c.order_id == OrderTable.id))
+                .group_by(OrderTable.id, product_categories.c.category_id)
+            )
+        )
+        await session.execute(
+            daily_categories.insert().from_select(
+                ["day", "category_id", "units", "revenue", "orders"],
+                select(
+                    day,
+                    order_categories.c.category_id,
+                    func.sum(order_categories.c.units),
+                    func.sum(order_categories.c.revenue),
+                    func.count(func.distinct(OrderTable.id)),
+                )
+                .select_from(OrderTable)
+                .join(order_categories, order_categories.c.order_id == OrderTable.id)
+                .where(*counted)
+                .group_by(day, order_categories.c.category_id)
+            )
+        )
+
+    @staticmethod
+    async def sales_by_day(
+            date_from: date, date_to: date, product_id: int | None = None, category_id: int | None = None
+    ) -> list[SalesDayDTO]:
+        key = f"days:{date_from}:{date_to}:{product_id}:{category_id}"
+        return await product_cache.get_or_load(
+            "analytics",
+            key,
+            lambda: SalesORM._sales_by_day(date_from, date_to, product_id, category_id),
+            sales_days_adapter,
+        )
+
+    @staticmethod
+    async def _sales_by_day(date_from: date, date_to: date, product_id: int | None, category_id: int | None):
+        # Ряд по одному продукту/категории идет по индексу (id, day), общий - по первичному ключу (day, id)
+        table = daily_categories if category_id is not None else daily_products
+        query = (
+            select(table.c.day, func.sum(table.c.units), func.sum(table.c.revenue))
+            .where(table.c.day >= date_from, table.c.day <= date_to)
+            .group_by(table.c.day)
+            .order_by(table.c.day)
+        )
+        if category_id is not None:
+            query = query.where(table.c.category_id == category_id)
+        elif product_id is not None:
+            query = query.where(table.c.product_id == product_id)
+        async with read_session_factory() as session:
+            result = await session.execute(query)
+            return [
+                SalesDayDTO(day=day, units=units, revenue=Decimal(revenue).quantize(CENTS))
+                for day, units, revenue in result
+            ]
+
+    @staticmethod
+    async def top_products(
+            date_from: date, date_to: date, limit: int = 20, order_by: Literal["revenue", "units"] = "revenue"
+    ) -> list[SalesProductDTO]:
+        key = f"top:{date_from}:{date_to}:{limit}:{order_by}"
+        return await product_cache.get_or_load(
+            "analytics",
+            key,
+            lambda: SalesORM._top_products(date_from, date_to, limit, order_by),
+            sales_products_adapter,
+        )
+
+    @staticmethod
+    async def _top_products(date_from: date, date_to: date, limit: int, order_by: str):
+        totals = (
+            select(
+                daily_products.c.product_id,
+                func.sum(daily_products.c.units).label("units"),
+                func.sum(daily_products.c.revenue).label("revenue"),
+                func.sum(daily_products.c.orders).label("orders"),
+            )
+            .where(
+                daily_products.c.day >= date_from,
+                daily_products.c.day <= date_to,
+                daily_products.c.product_id != DELETED_PRODUCT_ID,
+            )
+            .group_by(daily_products.c.product_id)
+        ).subquery()
+        query = (
+            select(totals, ProductTable.title)
+            .outerjoin(ProductTable, ProductTable.id == totals.c.product_id)
+            .order_by(totals.c[order_by].desc(), totals.c.product_id)
+            .limit(limit)
+        )
+        async with read_session_factory() as session:
+            result = await session.execute(query)
+            return [
+                SalesProductDTO(
+                    product_id=row.product_id, title=row.title, units=row.units,
+                    revenue=Decimal(row.revenue).quantize(CENTS), orders=row.orders,
+                )
+                for row in result
+            ]
+
+    @staticmethod
+    async def sales_by_category(date_from: date, date_to: date, limit: int = 50) -> list[SalesCategoryDTO]:
+        key = f"categories:{date_from}:{date_to}:{limit}"
+        return await product_cache.get_or_load(
+            "analytics",
+            key,
+            lambda: SalesORM._sales_by_category(date_from, date_to, limit),
+            sales_categories_adapter,
+        )
+
+    @staticmethod
+    async def _sales_by_category(date_from: date, date_to: date, limit: int):
+        totals = (
+            select(
+                daily_categories.c.category_id,
+                func.sum(daily_categories.c.units).label("units"),
+                func.sum(daily_categories.c.revenue).label("revenue"),
+                func.sum(daily_categories.c.orders).label("orders"),
+            )
+            .where(daily_categories.c.day >= date_from, daily_categories.c.day <= date_to)
+            .group_by(daily_categories.c.category_id)
+        ).subquery()
+        query = (
+            select(totals, CategoryTable.name)
+            .outerjoin(CategoryTable, CategoryTable.id == totals.c.category_id)
+            .order_by(totals.c.revenue.desc(), totals.c.category_id)
+            .limit(limit)
+        )
+        async with read_session_factory() as session:
+            result = await session.execute(query)
+            return [
+                SalesCategoryDTO(
+                    category_id=row.category_id, name=row.name, units=row.units,
+                    revenue=Decimal(row.revenue).quantize(CENTS), orders=row.orders,
+                )
+                for row in result
+            ]
+
+
+@job_queue.register("sales.rebuild")
+async def rebuild_sales_job(payload: dict):
+    date_from, date_to = payload.get("date_from"), payload.get("date_to")
+    await SalesORM.rebuild(
+        date.fromisoformat(date_from) if date_from else None,
+        date.fromisoformat(date_to) if date_to else None,
+    )
+
+
+if __name__ == '__main__':
+    asyncio.run(SalesORM.rebuild())
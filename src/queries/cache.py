@@ -0,0 +1,258 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from pydantic import BaseModel, TypeAdapter
+
+from src.config import settings
+from src.database.routing import primary_only
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    shared_hits: int = 0
+    shared_misses: int = 0
+    size: int = 0
+
+
+class CacheBackend(ABC):
+    """Интерфейс общего кэша между процессами (Redis, Memcached и т.п.)"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        ...
+
+
+class InMemoryBackend(CacheBackend):
+    """Замена общего кэша для тестов и локального запуска"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key, value, ttl):
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key):
+        raw = await self.get(key)
+        value = int(raw or 0) + 1
+        self._data[key] = (float("inf"), str(value).encode())
+        return value
+
+
+class LRUCache:
+    """LRU с TTL и тегами для инвалидации групп ключей"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[str, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value, tags: Iterable[str] = ()):
+        if key in self._data:
+            self._remove(key)
+        tags = tuple(tags)
+        self._data[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.max_size:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def delete(self, key: str):
+        if key in self._data:
+            self._remove(key)
+            self.stats.invalidations += 1
+
+    def invalidate_tag(self, tag: str):
+        for key in list(self._tags.get(tag, ())):
+            self.delete(key)
+
+    def clear(self):
+        self._data.clear()
+        self._tags.clear()
+
+    def _remove(self, key: str):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ProductCache:
+    """
+    Read-through кэш для ProductORM: сначала локальный LRU, затем (опционально) общий backend.
+    Ключи в общем кэше содержат поколение неймспейса, поэтому инвалидация списков - это один incr.
+    """
+
+    def __init__(
+            self,
+            max_size: int,
+            ttl: float,
+            backend: Optional[CacheBackend] = None,
+            enabled: bool = True,
+            primary_window: float = 0.0,
+    ):
+        self.local = LRUCache(max_size, ttl)
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        # Столько секунд после инвалидации промахи неймспейса читаются с primary, а не с реплик
+        self.primary_window = primary_window
+        self._primary_until: dict[str, float] = {}
+        # Локальные поколения неймспейсов и время последней инвалидации - для ETag/Last-Modified
+        self.generations: dict[str, int] = {}
+        self.last_invalidated_at = datetime.now(timezone.utc)
+
+    async def generation(self, namespace: str) -> int:
+        if self.backend is not None:
+            return int(await self.backend.get(f"gen:{namespace}") or 0)
+        return self.generations.get(namespace, 0)
+
+    def clear_local(self):
+        self.local.clear()
+        self.last_invalidated_at = datetime.now(timezone.utc)
+
+    async def get_or_load(
+            self,
+            namespace: str,
+            key: str,
+            loader: Callable[[], Awaitable[Any]],
+            adapter: TypeAdapter,
+            tags: Iterable[str] = (),
+    ):
+        if not self.enabled:
+            return await loader()
+
+        # Поколение входит и в локальный ключ: инвалидация в другом процессе (incr общего счетчика)
+        # сразу делает локальные записи недостижимыми, а не через TTL
+        generation = await self.generation(namespace)
+        local_key = f"{namespace}:v{generation}:{key}"
+        value = self.local.get(local_key)
+        if value is not None:
+            return value
+
+        tags = (namespace, *tags)
+        shared_key = None
+        if self.backend is not None:
+            shared_key = f"{namespace}:v{generation}:{key}"
+            raw = await self.backend.get(shared_key)
+            if raw is not None:
+                self.local.stats.shared_hits += 1
+                value = adapter.validate_json(raw)
+                self.local.set(local_key, value, tags)
+                return value
+            self.local.stats.shared_misses += 1
+
+        if await self.recently_written(namespace):
+            # Реплика может еще не догнать запись, после которой сбросили неймспейс:
+            # ее ответ попал бы в кэш под новым поколением
+            with primary_only():
+                value = await loader()
+        else:
+            value = await loader()
+        if value is None:
+            return None
+        if await self.generation(namespace) != generation:
+            # Неймспейс инвалидировали, пока шла загрузка: результат мог прочитать старые данные
+            return value
+        self.local.set(local_key, value, tags)
+        if shared_key is not None:
+            await self.backend.set(shared_key, adapter.dump_json(value), self.ttl)
+        return value
+
+    async def recently_written(self, namespace: str) -> bool:
+        """Неймспейс сбрасывали меньше primary_window секунд назад (в этом или, через backend, в другом процессе)"""
+        if self._primary_until.get(namespace, 0.0) > time.monotonic():
+            return True
+        if self.backend is not None:
+            return await self.backend.get(f"primary:{namespace}") is not None
+        return False
+
+    async def invalidate(self, namespaces: Iterable[str] = (), tags: Iterable[str] = ()):
+        self.last_invalidated_at = datetime.now(timezone.utc)
+        for namespace in namespaces:
+            self.local.invalidate_tag(namespace)
+            self.generations[namespace] = self.generations.get(namespace, 0) + 1
+            if self.primary_window > 0:
+                self._primary_until[namespace] = time.monotonic() + self.primary_window
+            if self.backend is not None:
+                await self.backend.incr(f"gen:{namespace}")
+                if self.primary_window > 0:
+                    await self.backend.set(f"primary:{namespace}", b"1", self.primary_window)
+        for tag in tags:
+            self.local.invalidate_tag(tag)
+
+    async def invalidate_product(self, product_id: Optional[int], category_ids: Iterable[int] = ()):
+        # Списки продуктов и выборки по категориям, в которых был продукт
+        namespaces = ["products", *(f"category:{category_id}" for category_id in category_ids)]
+        if product_id is not None:
+            namespaces.append(f"product:{product_id}")
+        await self.invalidate(namespaces)
+
+    def stats(self) -> CacheStats:
+        self.local.stats.size = len(self.local)
+        return self.local.stats
+
+
+product_cache = ProductCache(
+    max_size=settings.CACHE_MAX_SIZE,
+    ttl=settings.CACHE_TTL,
+    enabled=settings.CACHE_ENABLED,
+    primary_window=settings.DB_REPLICA_LAG_WINDOW if settings.DB_REPLICA_URLS else 0.0,
+)
@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import suppress
+from typing import Optional
+
+from sqlalchemy import delete, tuple_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from src.config import settings
+from src.database.dtos import CartItemPostDTO
+from src.database.models import CartItemTable, UserTable
+from src.database.routing import read_session_factory, write_session_factory, routing_scope
+
+logger = logging.getLogger(__name__)
+
+
+class CartUserNotFoundError(LookupError):
+    pass
+
+
+class CartStore(ABC):
+    """Где живет рабочая корзина между сбросами в БД (в памяти процесса, Redis и т.п.)"""
+
+    @abstractmethod
+    async def load(self, user_id: int) -> Optional[dict[int, int]]:
+        ...
+
+    @abstractmethod
+    async def save(self, user_id: int, items: dict[int, int]) -> None:
+        ...
+
+    @abstractmethod
+    async def drop(self, user_id: int) -> None:
+        ...
+
+
+class InMemoryCartStore(CartStore):
+    """
+    Корзины в памяти процесса. Не общие между воркерами uvicorn: при нескольких воркерах
+    пользователь должен попадать в один воркер, иначе нужен общий store (Redis и т.п.)
+    """
+
+    def __init__(self):
+        self._carts: dict[int, dict[int, int]] = {}
+
+    async def load(self, user_id):
+        return self._carts.get(user_id)
+
+    async def save(self, user_id, items):
+        self._carts[user_id] = items
+
+    async def drop(self, user_id):
+        self._carts.pop(user_id, None)
+
+
+def _upsert_cart_items(dialect: str, rows: list[dict]):
+    if dialect == "sqlite":
+        stmt = sqlite_insert(CartItemTable.__table__).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[CartItemTable.user_id, CartItemTable.product_id],
+            set_={"quantity": stmt.excluded.quantity},
+        )
+    stmt = mysql_insert(CartItemTable.__table__).values(rows)
+    return stmt.on_duplicate_key_update(quantity=stmt.inserted.quantity)
+
+
+class CartService:
+    """
+    Изменения корзины копятся в store и раз в flush_interval пишутся в cart_items одной транзакцией.
+    Частые клики по одному товару схлопываются в одну строку с итоговым количеством.
+    flush_interval - граница потерь: при падении воркера пропадают изменения не старше последнего сброса
+    (при штатной остановке stop() дописывает все).
+    Чтение-изменение-запись корзины одного пользователя идет под его замком user_lock:
+    иначе два клика по холодной корзине загрузят ее из БД каждый сам, и второй затрет товар первого.
+    """
+
+    def __init__(self, store: CartStore, flush_interval: float, idle_ttl: float):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+        self._dirty: dict[int, set[int]] = {}
+        self._last_access: dict[int, float] = {}
+        # Замок живет, пока его кто-то держит или ждет, поэтому словарь не растет с числом пользователей
+        self._locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._task: Optional[asyncio.Task] = None
+
+    def user_lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def get_cart(self, user_id: int) -> dict[int, int]:
+        async with self.user_lock(user_id):
+            return dict(await self._load(user_id))
+
+    async def _load(self, user_id: int) -> dict[int, int]:
+        self._last_access[user_id] = time.monotonic()
+        items = await self.store.load(user_id)
+        if items is None:
+            async with read_session_factory() as session:
+                # Корзина неизвестного пользователя не запишется в cart_items (FK), отказываем сразу
+                if await session.scalar(select(UserTable.id).where(UserTable.id == user_id)) is None:
+                    self._last_access.pop(user_id, None)
+                    raise CartUserNotFoundError("Пользователь не найден")
+                result = await session.execute(
+                    select(CartItemTable.product_id, CartItemTable.quantity)
+                    .where(CartItemTable.user_id == user_id)
+                )
+                items = dict(result.tuples().all())
+            await self.store.save(user_id, items)
+        return items
+
+    async def add_item(self, user_id: int, product_id: int, quantity: int) -> int:
+        async with self.user_lock(user_id):
+            items = await self._load(user_id)
+            return await self._set(user_id, items, product_id, items.get(product_id, 0) + quantity)
+
+    async def set_quantity(self, user_id: int, product_id: int, quantity: int) -> int:
+        async with self.user_lock(user_id):
+            items = await self._load(user_id)
+            return await self._set(user_id, items, product_id, quantity)
+
+    async def _set(self, user_id: int, items: dict[int, int], product_id: int, quantity: int) -> int:
+        quantity = max(quantity, 0)
+        if quantity:
+            items[product_id] = quantity
+        else:
+            items.pop(product_id, None)
+        await self.store.save(user_id, items)
+        self._dirty.setdefault(user_id, set()).add(product_id)
+        self._ensure_started()
+        return quantity
+
+    async def flush(self, user_ids: Optional[list[int]] = None):
+        """Пишет накопленные изменения: многострочный upsert по (user_id, product_id) и delete удаленных позиций"""
+        if user_ids is None:
+            dirty, self._dirty = self._dirty, {}
+        else:
+            dirty = {user_id: self._dirty.pop(user_id) for user_id in user_ids if user_id in self._dirty}
+        if not dirty:
+            return
+
+        rows = []
+        removed = []
+        for user_id, products in dirty.items():
+            items = await self.store.load(user_id) or {}
+            for product_id in products:
+                if product_id in items:
+                    rows.append({"user_id": user_id, "product_id": product_id, "quantity": items[product_id]})
+                else:
+                    removed.append((user_id, product_id))
+
+        try:
+            try:
+                await self._write(rows, removed)
+            except IntegrityError:
+                # Одна строка с удаленным продуктом или пользователем не должна держать всю пачку
+                rows = await self._write_per_user(rows, removed)
+        except BaseException:
+            # Не теряем изменения (в том числе при отмене задачи): вернем их в очередь на следующий сброс
+            for user_id, products in dirty.items():
+                self._dirty.setdefault(user_id, set()).update(products)
+            raise
+
+        self.flushes += 1
+        self.flushed_rows += len(rows)
+
+    @staticmethod
+    async def _write(rows: list[dict], removed: list[tuple[int, int]]):
+        async with write_session_factory() as session:
+            if removed:
+                await session.execute(
+                    delete(CartItemTable).where(
+                        tuple_(CartItemTable.user_id, CartItemTable.product_id).in_(removed)
+                    )
+                )
+            if rows:
+                await session.execute(_upsert_cart_items(session.bind.dialect.name, rows))
+            await session.commit()
+
+    async def _write_per_user(self, rows: list[dict], removed: list[tuple[int, int]]) -> list[dict]:
+        """Повтор пачки по пользователям, а внутри упавшего пользователя - по строкам; строки с ошибкой выбрасываются"""
+        by_user: dict[int, tuple[list[dict], list[tuple[int, int]]]] = defaultdict(lambda: ([], []))
+        for row in rows:
+            by_user[row["user_id"]][0].append(row)
+        for user_id, product_id in removed:
+            by_user[user_id][1].append((user_id, product_id))
+
+        written = []
+        for user_id, (user_rows, user_removed) in by_user.items():
+            try:
+                await self._write(user_rows, user_removed)
+                written.extend(user_rows)
+                continue
+            except IntegrityError:
+                pass
+            if user_removed:
+                await self._write([], user_removed)
+            for row in user_rows:
+                try:
+                    await self._write([row], [])
+                    written.append(row)
+                except IntegrityError as e:
+                    logger.warning(
+                        "Позиция корзины пользователя %s (продукт %s) не сохранена и удалена: %s",
+                        user_id, row["product_id"], e.orig,
+                    )
+                    self.dropped_rows += 1
+                    async with self.user_lock(user_id):
+                        items = await self.store.load(user_id)
+                        if items is not None:
+                            items.pop(row["product_id"], None)
+                            await self.store.save(user_id, items)
+        return written
+
+    async def end_session(self, user_id: int):
+        async with self.user_lock(user_id):
+            await self.flush([user_id])
+            await self.forget(user_id)
+
+    async def forget(self, user_id: int):
+        # После checkout корзина в БД уже очищена, состояние в памяти больше не нужно.
+        # Вызывающий держит user_lock: изменение, начатое до forget, не переживет его
+        self._dirty.pop(user_id, None)
+        self._last_access.pop(user_id, None)
+        await self.store.drop(user_id)
+
+    async def _evict_idle(self):
+        deadline = time.monotonic() - self.idle_ttl
+        for user_id, accessed_at in list(self._last_access.items()):
+            if accessed_at < deadline and user_id not in self._dirty:
+                async with self.user_lock(user_id):
+                    # Пока ждали замок, пользователь мог снова изменить корзину
+                    if self._last_access.get(user_id, 0.0) < deadline and user_id not in self._dirty:
+                        await self.forget(user_id)
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                with routing_scope():
+                    await self.flush()
+                    await self._evict_idle()
+            except Exception:
+                logger.exception("Не удалось сбросить корзины в БД")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            # Прерванный сброс возвращает свои изменения в _dirty, после этого дописываем все разом
+            with suppress(asyncio.CancelledError):
+                await task
+        await self.flush()
+
+    def to_dtos(self, user_id: int, items: dict[int, int]) -> list[CartItemPostDTO]:
+        return [
+            CartItemPostDTO(user_id=user_id, product_id=product_id, quantity=quantity)
+            for product_id, quantity in items.items()
+        ]
+
+
+cart_service = CartService(
+    InMemoryCartStore(),
+    flush_interval=settings.CART_FLUSH_INTERVAL,
+    idle_ttl=settings.CART_IDLE_TTL,
+)
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+from src.database.dtos import CategoryGetDTO
+
+
+class CategoryTree:
+    """
+    Индекс дерева категорий в памяти: для каждой категории хранится готовое множество потомков
+    (включая ее саму) и путь от корня, поэтому поддерево и хлебные крошки отдаются за O(1).
+    """
+
+    def __init__(self):
+        self.categories: dict[int, CategoryGetDTO] = {}
+        self.children: dict[int, set[int]] = {}
+        self._descendants: dict[int, frozenset[int]] = {}
+        self._path: dict[int, tuple[int, ...]] = {}
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def rebuild(self, categories: Iterable[CategoryGetDTO]):
+        self.categories = {category.id: category for category in categories}
+        self.children = {category_id: set() for category_id in self.categories}
+        for category in self.categories.values():
+            parent_id = category.parent_category_id
+            if parent_id is not None and parent_id in self.children:
+                self.children[parent_id].add(category.id)
+
+        self._descendants = {}
+        self._path = {}
+        for root in self._roots():
+            self._index_subtree(root, ())
+        self.loaded_at = time.monotonic()
+
+    async def ensure_loaded(self, loader: Callable[[], Awaitable[list[CategoryGetDTO]]], max_age: float):
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < max_age:
+            return
+        async with self._lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= max_age:
+                self.rebuild(await loader())
+
+    def descendants(self, category_id: int) -> frozenset[int]:
+        return self._descendants.get(category_id, frozenset())
+
+    def ancestors(self, category_id: int) -> list[CategoryGetDTO]:
+        """Путь от корня до категории включительно"""
+        return [self.categories[idx] for idx in self._path.get(category_id, ())]
+
+    def with_ancestors(self, category_ids: Iterable[int]) -> set[int]:
+        # Продукт в подкатегории виден и в выборках всех ее предков
+        result = set()
+        for category_id in category_ids:
+            result.update(self._path.get(category_id, (category_id,)))
+        return result
+
+    def upsert(self, category: CategoryGetDTO):
+        parent_id = category.parent_category_id
+        if parent_id is not None and parent_id in self.descendants(category.id):
+            raise ValueError("Категория не может быть вложена в собственного потомка")
+
+        if category.id in self.categories:
+            self._detach(category.id)
+        else:
+            # Подхватываем категории, которые ссылались на еще неизвестного родителя
+            self.children[category.id] = {
+                other.id for other in self.categories.values() if other.parent_category_id == category.id
+            }
+            self._descendants[category.id] = frozenset((category.id,))
+        self.categories[category.id] = category
+        self._attach(category.id)
+
+    def remove(self, category_id: int):
+        if category_id not in self.categories:
+            return
+        # В БД parent_category_id дочерних категорий становится NULL (ondelete='SET NULL')
+        for child_id in list(self.children[category_id]):
+            child = self.categories[child_id].model_copy(update={"parent_category_id": None})
+            self.upsert(child)
+        self._detach(category_id)
+        del self.categories[category_id]
+        del self.children[category_id]
+        del self._descendants[category_id]
+        del self._path[category_id]
+
+    def _roots(self) -> list[int]:
+        return [
+            category.id for category in self.categories.values()
+            if category.parent_category_id is None or category.parent_category_id not in self.categories
+        ]
+
+    def _index_subtree(self, root: int, parent_path: tuple[int, ...]) -> frozenset[int]:
+        # Итеративный обход в глубину, чтобы глубокие деревья не упирались в лимит рекурсии
+        order = []
+        stack = [(root, parent_path)]
+        while stack:
+            category_id, path = stack.pop()
+            path = path + (category_id,)
+            self._path[category_id] = path
+            order.append(category_id)
+            stack.extend((child_id, path) for child_id in self.children[category_id])
+        for category_id in reversed(order):
+            subtree = {category_id}
+            for child_id in self.children[category_id]:
+                subtree |= self._descendants[child_id]
+            self._descendants[category_id] = frozenset(subtree)
+        return self._descendants[root]
+
+    def _detach(self, category_id: int):
+        subtree = self._descendants[category_id]
+        path = self._path.get(category_id, (category_id,))
+        for ancestor_id in path[:-1]:
+            self._descendants[ancestor_id] = self._descendants[ancestor_id] - subtree
+        parent_id = path[-2] if len(path) > 1 else None
+        if parent_id is not None:
+            self.children[parent_id].discard(category_id)
+
+    def _attach(self, category_id: int):
+        parent_id = self.categories[category_id].parent_category_id
+        if parent_id is not None and parent_id in self.categories:
+            self.children[parent_id].add(category_id)
+            parent_path = self._path[parent_id]
+        else:
+            parent_path = ()
+        subtree = self._index_subtree(category_id, parent_path)
+        for ancestor_id in parent_path:
+            self._descendants[ancestor_id] = self._descendants[ancestor_id] | subtree
+
+
+category_tree = CategoryTree()
@@ -0,0 +1,89 @@
+import asyncio
+import sys
+
+from sqlalchemy import Select, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import (
+    ProductTable, ProductImageTable, ProductRatingTable, OrderTable, CartItemTable, ReviewOrm, product_categories
+)
+from src.database.routing import write_session_factory
+from src.queries.projection import select_product_rows
+
+# type=ALL в EXPLAIN MySQL - полный проход по таблице
+FULL_SCAN_TYPES = {"ALL"}
+# Доступы, которым индекс не нужен: таблица из одной строки
+KEYLESS_TYPES = {"system"}
+
+
+def key_queries() -> dict[str, Select]:
+    """Запросы горячих путей из src/queries в том виде, в каком их строят ORM-методы"""
+    ratings = ProductRatingTable.__table__
+    return {
+        "products_page": select_product_rows().where(ProductTable.id > 0).order_by(ProductTable.id).limit(100),
+        "product_one": select_product_rows().where(ProductTable.id == 1),
+        "products_newest": select(ProductTable.id).order_by(ProductTable.created_at.desc()).limit(20),
+        "category_subtree": select_product_rows().where(ProductTable.id.in_(
+            select(product_categories.c.product_id).where(product_categories.c.category_id.in_([1, 2]))
+        )).order_by(ProductTable.id).limit(100),
+        "top_rated": select(ratings.c.product_id)
+        .where(ratings.c.rating_count > 0)
+        .order_by(ratings.c.rating_avg.desc(), ratings.c.product_id.desc())
+        .limit(20),
+        "cart": select(CartItemTable.product_id, CartItemTable.quantity).where(CartItemTable.user_id == 1),
+        "cart_item": select(CartItemTable.id).where(CartItemTable.user_id == 1, CartItemTable.product_id == 1),
+        "user_orders": select(OrderTable.id).where(OrderTable.user_id == 1).order_by(OrderTable.order_date.desc()),
+        "product_reviews": select(ReviewOrm.id)
+        .where(ReviewOrm.product_id == 1)
+        .order_by(ReviewOrm.created_at.desc()),
+        "product_main_image": select(ProductImageTable.image_url)
+        .where(ProductImageTable.product_id == 1, ProductImageTable.is_main.is_(True)),
+    }
+
+
+async def explain(session: AsyncSession, stmt: Select) -> list[dict]:
+    sql = stmt.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    result = await session.execute(text(f"EXPLAIN {sql}"))
+    return [dict(row._mapping) for row in result]
+
+
+def full_scans(plan: list[dict], allow: tuple[str, ...] = ()) -> list[dict]:
+    """
+    Строки плана с полным сканом (type=ALL) или вовсе без индекса (key=NULL).
+    Производные и материализованные таблицы (<derived2>, <subquery2>) не в счет: их план - в своих строках.
+    """
+    problems = []
+    for row in plan:
+        table = row.get("table")
+        if table is None or table.startswith("<") or table in allow:
+            continue
+        access = row.get("type")
+        if access in FULL_SCAN_TYPES or (access not in KEYLESS_TYPES and row.get("key") is None):
+            problems.append(row)
+    return problems
+
+
+async def assert_no_full_scan(session: AsyncSession, stmt: Select, allow: tuple[str, ...] = ()):
+    """
+    Для тестов: падает, если в плане есть полный скан таблицы.
+    На почти пустых таблицах оптимизатор MySQL может сам выбрать скан, поэтому проверять стоит на засеянной БД.
+    """
+    scans = full_scans(await explain(session, stmt), allow)
+    assert not scans, f"Полный скан таблицы: {scans}\n{stmt}"
+
+
+async def check_key_queries(allow: tuple[str, ...] = ()) -> dict[str, list[dict]]:
+    problems = {}
+    async with write_session_factory() as session:
+        for name, stmt in key_queries().items():
+            scans = full_scans(await explain(session, stmt), allow)
+            if scans:
+                problems[name] = scans
+    return problems
+
+
+if __name__ == '__main__':
+    found = asyncio.run(check_key_queries())
+    for query_name, rows in found.items():
+        print(query_name, rows)
+    sys.exit(1 if found else 0)
@@ -0,0 +1,516 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+
+from src.config import settings
+from src.database.dtos import JobDTO
+from src.database.enums import JobStatus
+from src.database.models import JobTable
+from src.database.routing import write_session_factory, routing_scope
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class JobStats(BaseModel):
+    workers: int
+    local_queued: int
+    running: int
+    done: int
+    retried: int
+    failed: int
+
+
+class JobStore(ABC):
+    """Где хранятся задачи до выполнения (память процесса, таблица jobs, брокер и т.п.)"""
+
+    @abstractmethod
+    async def add(self, job: JobDTO) -> JobDTO:
+        """Если задача с тем же idempotency_key уже есть, возвращает ее, а новую не добавляет"""
+
+    @abstractmethod
+    async def claim(self, lease: float) -> Optional[JobDTO]:
+        """Забирает одну задачу, которую пора выполнять; через lease секунд ее сможет забрать другой воркер"""
+
+    @abstractmethod
+    async def extend(self, job: JobDTO, lease: float) -> bool:
+        """Продлевает аренду еще на lease секунд; False - задачу уже забрал другой воркер"""
+
+    @abstractmethod
+    async def complete(self, job: JobDTO) -> None:
+        ...
+
+    @abstractmethod
+    async def retry(self, job: JobDTO, run_at: datetime, error: str) -> None:
+        ...
+
+    @abstractmethod
+    async def fail(self, job: JobDTO, error: str) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[JobDTO]:
+        ...
+
+    @abstractmethod
+    async def pending(self) -> int:
+        ...
+
+    @abstractmethod
+    async def purge(self, before: datetime) -> int:
+        """Удаляет завершенные (DONE/FAILED) задачи, запущенные раньше before; возвращает их число"""
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Очередь в памяти процесса: задачи пропадают при остановке.
+    Ключи идемпотентности помнятся, пока задача среди последних keep_finished завершенных.
+    """
+
+    def __init__(self, keep_finished: int = 10_000):
+        self.keep_finished = keep_finished
+        self._jobs: dict[str, JobDTO] = {}
+        self._keys: dict[str, str] = {}
+        self._queue: list[tuple[datetime, int, str]] = []
+        self._finished: deque[str] = deque()
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._queue)
+
+    async def add(self, job):
+        if job.idempotency_key is not None and job.idempotency_key in self._keys:
+            return self._jobs[self._keys[job.idempotency_key]]
+        self._jobs[job.id] = job
+        if job.idempotency_key is not None:
+            self._keys[job.idempotency_key] = job.id
+        heapq.heappush(self._queue, (job.run_at, next(self._seq), job.id))
+        return job
+
+    async def claim(self, lease):
+        if not self._queue or self._queue[0][0] > datetime.now():
+            return None
+        _, _, job_id = heapq.heappop(self._queue)
+        job = self._jobs[job_id]
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        return job
+
+    async def extend(self, job, lease):
+        # Аренды в памяти нет: задачу процесса не заберет никто другой
+        return True
+
+    async def complete(self, job):
+        job.status = JobStatus.DONE
+        self._finish(job)
+
+    async def retry(self, job, run_at, error):
+        job.status = JobStatus.QUEUED
+        job.run_at = run_at
+        job.last_error = error
+        heapq.heappush(self._queue, (run_at, next(self._seq), job.id))
+
+    async def fail(self, job, error):
+        job.status = JobStatus.FAILED
+        job.last_error = error
+        self._finish(job)
+
+    async def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    async def pending(self):
+        return len(self)
+
+    async def purge(self, before):
+        purged = 0
+        while self._finished and self._jobs[self._finished[0]].run_at < before:
+            self._forget(self._finished.popleft())
+            purged += 1
+        return purged
+
+    def _finish(self, job: JobDTO):
+        self._finished.append(job.id)
+        while len(self._finished) > self.keep_finished:
+            self._forget(self._finished.popleft())
+
+    def _forget(self, job_id: str):
+        old = self._jobs.pop(job_id, None)
+        if old is not None and old.idempotency_key is not None:
+            self._keys.pop(old.idempotency_key, None)
+
+
+class DatabaseJobStore(JobStore):
+    """
+    Очередь в таблице jobs: переживает перезапуск, задачи разбирают воркеры всех процессов.
+    Задача, воркер которой умер, снова становится доступна по истечении аренды (locked_until);
+    пока обработчик работает, JobQueue продлевает аренду. Номер попытки служит токеном аренды:
+    продлить ее и записать итог может только воркер, который забрал задачу последним.
+    """
+
+    def __init__(self, purge_batch: int = 1000):
+        self.purge_batch = purge_batch
+
+    async def add(self, job):
+        async with write_session_factory() as session:
+            session.add(JobTable(**job.model_dump()))
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                existing = await session.scalar(
+                    select(JobTable).where(JobTable.idempotency_key == job.idempotency_key)
+                )
+                if existing is None:
+                    raise
+                return JobDTO.model_validate(existing)
+        return job
+
+    async def claim(self, lease):
+        now = datetime.now()
+        async with write_session_factory() as session:
+            async with session.begin():
+                # SKIP LOCKED: параллельные воркеры не ждут друг друга на одной строке
+                job = await session.scalar(
+                    select(JobTable)
+                    .where(or_(
+                        and_(JobTable.status == JobStatus.QUEUED, JobTable.run_at <= now),
+                        and_(JobTable.status == JobStatus.RUNNING, JobTable.locked_until < now),
+                    ))
+                    .order_by(JobTable.run_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                if job is None:
+                    return None
+                # Условие по attempts - на случай БД без SKIP LOCKED (SQLite): из двух воркеров,
+                # прочитавших одну строку, задачу получит только первый
+                claimed = await session.execute(
+                    update(JobTable)
+                    .where(JobTable.id == job.id, JobTable.attempts == job.attempts)
+                    .values(
+                        status=JobStatus.RUNNING,
+                        attempts=job.attempts + 1,
+                        locked_until=now + timedelta(seconds=lease),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if claimed.rowcount == 0:
+                    return None
+                return JobDTO.model_validate(job).model_copy(
+                    update={"status": JobStatus.RUNNING, "attempts": job.attempts + 1}
+                )
+
+    async def extend(self, job, lease):
+        async with write_session_factory() as session:
+            result = await session.execute(
+                update(JobTable)
+                .where(
+                    JobTable.id == job.id,
+                    JobTable.status == JobStatus.RUNNING,
+                    JobTable.attempts == job.attempts,
+                )
+                .values(locked_until=datetime.now() + timedelta(seconds=lease))
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def complete(self, job):
+        await self._update(job, status=JobStatus.DONE, locked_until=None)
+
+    async def retry(self, job, run_at, error):
+        await self._update(job, status=JobStatus.QUEUED, run_at=run_at, locked_until=None, last_error=error[:1024])
+
+    async def fail(self, job, error):
+        await self._update(job, status=JobStatus.FAILED, locked_until=None, last_error=error[:1024])
+
+    async def get(self, job_id):
+        async with write_session_factory() as session:
+            job = await session.get(JobTable, job_id)
+            return JobDTO.model_validate(job) if job is not None else None
+
+    async def pending(self):
+        async with write_session_factory() as session:
+            return await session.scalar(
+                select(func.count(JobTable.id)).where(JobTable.status == JobStatus.QUEUED)
+            )
+
+    async def purge(self, before):
+        # Порциями по индексу (status, run_at), чтобы не держать долгую транзакцию на большой таблице
+        purged = 0
+        while True:
+            async with write_session_factory() as session:
+                ids = (await session.scalars(
+                    select(JobTable.id)
+                    .where(JobTable.status.in_((JobStatus.DONE, JobStatus.FAILED)), JobTable.run_at < before)
+                    .limit(self.purge_batch)
+                )).all()
+                if not ids:
+                    return purged
+                await session.execute(delete(JobTable).where(JobTable.id.in_(ids)))
+                await session.commit()
+            purged += len(ids)
+            if len(ids) < self.purge_batch:
+                return purged
+
+    async def _update(self, job: JobDTO, **values):
+        # Итог записывается с тем же условием, что и продление аренды: если задачу после истечения
+        # аренды забрал другой воркер, результат опоздавшего отбрасывается и не затирает чужой запуск
+        async with write_session_factory() as session:
+            result = await session.execute(
+                update(JobTable)
+                .where(
+                    JobTable.id == job.id,
+                    JobTable.status == JobStatus.RUNNING,
+                    JobTable.attempts == job.attempts,
+                )
+                .values(**values)
+            )
+            await session.commit()
+        if result.rowcount == 0:
+            logger.warning(
+                "Итог задачи %s (%s), попытка %s, отброшен: аренда потеряна", job.id, job.name, job.attempts,
+            )
+
+
+class JobQueue:
+    """
+    Фоновые задачи вне пути запроса: workers воркеров разбирают задачи из двух хранилищ.
+    durable-задачи идут в store (таблица jobs или память, по настройке), локальные - всегда в память процесса:
+    так ставятся задачи, которые меняют состояние именно этого процесса (например, его поисковый индекс).
+    Упавшая задача повторяется с экспоненциальной задержкой, поэтому обработчики должны быть идемпотентны.
+    Пока обработчик работает, аренда продлевается каждые lease / 3 секунд, поэтому lease ограничивает
+    не длительность задачи, а время, через которое задачу умершего воркера заберет другой.
+    Завершенные задачи старше retention секунд удаляются не чаще раза в purge_interval (0 - хранятся всегда).
+    """
+
+    def __init__(
+            self,
+            store: JobStore,
+            workers: int,
+            max_attempts: int,
+            retry_base: float,
+            retry_max: float,
+            poll_interval: float,
+            lease: float,
+            retention: float = 0.0,
+            purge_interval: float = 3600.0,
+    ):
+        self.store = store
+        self.local = InMemoryJobStore()
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self.handlers: dict[str, Handler] = {}
+        self.running = 0
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._purge_at = 0.0
+
+    def register(self, name: str):
+        def decorator(handler: Handler) -> Handler:
+            self.handlers[name] = handler
+            return handler
+        return decorator
+
+    async def enqueue(
+            self,
+            name: str,
+            payload: Optional[dict] = None,
+            key: Optional[str] = None,
+            delay: float = 0.0,
+            durable: bool = True,
+            max_attempts: Optional[int] = None,
+    ) -> JobDTO:
+        if name not in self.handlers:
+            raise ValueError(f"Неизвестная задача: {name}")
+        job = JobDTO(
+            id=uuid.uuid4().hex,
+            name=name,
+            payload=payload or {},
+            # Ключ действует в пределах одного вида задач
+            idempotency_key=f"{name}:{key}" if key is not None else None,
+            status=JobStatus.QUEUED,
+            max_attempts=max_attempts or self.max_attempts,
+            run_at=datetime.now() + timedelta(seconds=delay),
+        )
+        job = await (self.store if durable else self.local).add(job)
+        self.start()
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[JobDTO]:
+        return await self.local.get(job_id) or await self.store.get(job_id)
+
+    def start(self):
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def drain(self, timeout: float):
+        """
+        Дорабатывает текущие и уже готовые к запуску локальные задачи и останавливает воркеры.
+        Новые durable-задачи не забираются: их доделают другие процессы или этот после перезапуска.
+        Что не успело за timeout, отменяется; в таблице jobs такие задачи вернутся в работу по аренде.
+        """
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        self._stopping = False
+        lost = await self.local.pending()
+        if pending or lost:
+            logger.warning("Очередь остановлена: прервано %s задач, потеряно локальных %s", len(pending), lost)
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempt - 1))
+        # Разброс, чтобы повторы после общего сбоя не приходили одной волной
+        return delay * random.uniform(0.5, 1.0)
+
+    def stats(self) -> JobStats:
+        return JobStats(
+            workers=sum(not task.done() for task in self._tasks),
+            local_queued=len(self.local),
+            running=self.running,
+            done=self.done,
+            retried=self.retried,
+            failed=self.failed,
+        )
+
+    async def _claim(self) -> Optional[tuple[JobStore, JobDTO]]:
+        stores = (self.local,) if self._stopping else (self.local, self.store)
+        for store in stores:
+            job = await store.claim(self.lease)
+            if job is not None:
+                return store, job
+        return None
+
+    async def _worker(self):
+        while True:
+            # Сбрасываем событие до выборки: enqueue между выборкой и ожиданием не потеряется
+            self._wakeup.clear()
+            try:
+                claimed = await self._claim()
+            except Exception:
+                logger.exception("Не удалось получить задачу из очереди")
+                claimed = None
+            if claimed is None:
+                if self._stopping:
+                    return
+                await self._purge_if_due()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(*claimed)
+
+    async def _execute(self, store: JobStore, job: JobDTO):
+        if job.attempts > job.max_attempts:
+            # Аренда истекала уже больше max_attempts раз: воркер падает на этой задаче, больше не запускаем
+            self.failed += 1
+            await self._record(store.fail(job, "Истекла аренда"))
+            return
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(store, job))
+        try:
+            handler = self.handlers.get(job.name)
+            if handler is None:
+                raise LookupError(f"Нет обработчика для задачи {job.name}")
+            # Своя область read-your-writes на задачу: запись одной задачи не прилепит воркер к primary навсегда
+            with routing_scope():
+                await handler(job.payload)
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+            if job.attempts >= job.max_attempts:
+                self.failed += 1
+                logger.error("Задача %s (%s) не выполнена за %s попыток: %s", job.id, job.name, job.attempts, error)
+                await self._record(store.fail(job, error))
+            else:
+                self.retried += 1
+                run_at = datetime.now() + timedelta(seconds=self.backoff(job.attempts))
+                await self._record(store.retry(job, run_at, error))
+        else:
+            self.done += 1
+            await self._record(store.complete(job))
+        finally:
+            self.running -= 1
+            heartbeat.cancel()
+
+    async def _heartbeat(self, store: JobStore, job: JobDTO):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                if not await store.extend(job, self.lease):
+                    logger.warning("Аренда задачи %s (%s) потеряна, ее выполняет другой воркер", job.id, job.name)
+                    return
+            except Exception:
+                logger.exception("Не удалось продлить аренду задачи %s", job.id)
+
+    async def _purge_if_due(self):
+        if self.retention <= 0 or time.monotonic() < self._purge_at:
+            return
+        # Срок ставится до удаления: остальные воркеры процесса не запустят его параллельно
+        self._purge_at = time.monotonic() + self.purge_interval
+        before = datetime.now() - timedelta(seconds=self.retention)
+        for store in (self.local, self.store):
+            try:
+                purged = await store.purge(before)
+            except Exception:
+                logger.exception("Не удалось удалить завершенные задачи")
+                continue
+            if purged:
+                logger.info("Удалено завершенных задач: %s", purged)
+
+    @staticmethod
+    async def _record(coro):
+        # Если статус не записался, задача в таблице jobs вернется в работу по истечении аренды
+        try:
+            await coro
+        except Exception:
+            logger.exception("Не удалось сохранить статус задачи")
+
+
+def create_job_store() -> JobStore:
+    if settings.JOBS_BACKEND == "database":
+        return DatabaseJobStore()
+    return InMemoryJobStore()
+
+
+job_queue = JobQueue(
+    create_job_store(),
+    workers=settings.JOBS_WORKERS,
+    max_attempts=settings.JOBS_MAX_ATTEMPTS,
+    retry_base=settings.JOBS_RETRY_BASE,
+    retry_max=settings.JOBS_RETRY_MAX,
+    poll_interval=settings.JOBS_POLL_INTERVAL,
+    lease=settings.JOBS_LEASE,
+    retention=settings.JOBS_RETENTION,
+    purge_interval=settings.JOBS_PURGE_INTERVAL,
+)
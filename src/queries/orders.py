@@ -0,0 +1,136 @@
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import OperationalError
+
+from src.database.dtos import CheckoutPostDTO, CheckoutGetDTO, CheckoutItemDTO, OrderGetDTO
+from src.database.enums import OrderStatus, PaymentStatus
+from src.database.models import UserTable, ProductTable, CartItemTable, OrderTable, OrderItemTable, PaymentTable
+from src.database.routing import write_session_factory
+from src.queries.analytics import SalesORM, sales_delta
+from src.queries.cache import product_cache
+from src.queries.cart import cart_service
+
+# Коды MySQL: 1213 - deadlock, 1205 - lock wait timeout. Такую транзакцию можно просто повторить
+RETRYABLE_ERRORS = (1213, 1205)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def is_retryable(error: OperationalError) -> bool:
+    code = error.orig.args[0] if error.orig is not None and error.orig.args else None
+    return code in RETRYABLE_ERRORS
+
+
+class OrderORM:
+    checkout_attempts = 3
+
+    @staticmethod
+    async def checkout(checkout_data: CheckoutPostDTO) -> CheckoutGetDTO:
+        # Под замком корзины: клик между commit и forget иначе пропал бы вместе с оформленной корзиной,
+        # а так он дождется checkout и ляжет в новую, уже пустую корзину
+        async with cart_service.user_lock(checkout_data.user_id):
+            # Несброшенные изменения корзины должны попасть в БД до оформления заказа
+            await cart_service.flush([checkout_data.user_id])
+            for attempt in range(OrderORM.checkout_attempts):
+                try:
+                    order = await OrderORM._checkout(checkout_data)
+                    await cart_service.forget(checkout_data.user_id)
+                    return order
+                except OperationalError as e:
+                    if not is_retryable(e) or attempt == OrderORM.checkout_attempts - 1:
+                        raise
+
+    @staticmethod
+    async def _checkout(checkout_data: CheckoutPostDTO) -> CheckoutGetDTO:
+        """
+        Корзина -> заказ в одной транзакции.
+        Блокировки берутся всегда в одном порядке: строка пользователя, затем его cart_items по id.
+        Параллельные checkout одного пользователя выстраиваются в очередь на строке users,
+        разные пользователи не пересекаются по блокировкам, поэтому взаимных блокировок нет.
+        """
+        async with write_session_factory() as session:
+            async with session.begin():
+                user_id = await session.scalar(
+                    select(UserTable.id).where(UserTable.id == checkout_data.user_id).with_for_update()
+                )
+                if user_id is None:
+                    raise CheckoutError("Пользователь не найден")
+
+                # Позиции корзины вместе с текущими ценами одним запросом
+                result = await session.execute(
+                    select(CartItemTable.id, CartItemTable.product_id, CartItemTable.quantity, ProductTable.price)
+                    .join(ProductTable, ProductTable.id == CartItemTable.product_id)
+                    .where(CartItemTable.user_id == user_id)
+                    .order_by(CartItemTable.id)
+                    .with_for_update(of=CartItemTable)
+                )
+                rows = result.all()
+                if not rows:
+                    raise CheckoutError("Корзина пуста")
+
+                items = [
+                    CheckoutItemDTO(product_id=product_id, quantity=quantity, price_at_purchase=price)
+                    for _, product_id, quantity, price in rows
+                ]
+                total_amount = round(sum(item.quantity * item.price_at_purchase for item in items), 2)
+
+                order = OrderTable(user_id=user_id, status=OrderStatus.PENDING, total_amount=total_amount)
+                session.add(order)
+                await session.flush()
+
+                await session.execute(
+                    insert(OrderItemTable),
+                    [{"order_id": order.id, **item.model_dump()} for item in items],
+                )
+
+                payment = PaymentTable(
+                    order_id=order.id,
+                    amount=total_amount,
+                    status=PaymentStatus.PENDING,
+                    payment_method=checkout_data.payment_method,
+                )
+                session.add(payment)
+                await session.flush()
+
+                await session.execute(
+                    delete(CartItemTable).where(CartItemTable.id.in_([row[0] for row in rows]))
+                )
+
+                return CheckoutGetDTO(
+                    order_id=order.id,
+                    payment_id=payment.id,
+                    status=OrderStatus.PENDING,
+                    total_amount=total_amount,
+                    items=items,
+                )
+
+    @staticmethod
+    async def set_status(order_id: int, status: OrderStatus) -> OrderGetDTO | None:
+        for attempt in range(OrderORM.checkout_attempts):
+            try:
+                order, delta = await OrderORM._set_status(order_id, status)
+                break
+            except OperationalError as e:
+                if not is_retryable(e) or attempt == OrderORM.checkout_attempts - 1:
+                    raise
+        if delta:
+            await product_cache.invalidate(namespaces=["analytics"])
+        return order
+
+    @staticmethod
+    async def _set_status(order_id: int, status: OrderStatus) -> tuple[OrderGetDTO | None, int]:
+        """Статус и агрегаты продаж меняются в одной транзакции под блокировкой строки заказа"""
+        async with write_session_factory() as session:
+            async with session.begin():
+                order = await session.scalar(
+                    select(OrderTable).where(OrderTable.id == order_id).with_for_update()
+                )
+                if order is None:
+                    return None, 0
+                delta = sales_delta(order.status, status)
+                order.status = status
+                if delta:
+                    await SalesORM.apply_order(session, order.id, order.order_date, delta)
+                await session.flush()
+                return OrderGetDTO.model_validate(order), delta
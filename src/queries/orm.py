@@ -1,10 +1,26 @@
 
 
-from sqlalchemy import select
+from pydantic import TypeAdapter
+from sqlalchemy import select, delete, insert, or_, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert, match
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from src.config import settings
 from src.database.database import async_engine, async_session_factory
-from src.database.dtos import ProductGetDTO, ProductPostDTO, CategoryGetDTO
-from src.database.models import Base, UserTable, ProductTable, CategoryTable
+from src.database.routing import read_session_factory, write_session_factory, primary_only
+from src.database.dtos import ProductGetDTO, ProductPostDTO, CategoryGetDTO, CategoryCreateDTO, ProductBulkResultDTO
+from src.database.enums import BulkItemStatus
+from src.database.models import Base, UserTable, ProductTable, CategoryTable, product_categories
 from sqlalchemy.orm import selectinload, joinedload
+from src.queries.cache import product_cache
+from src.queries.category_tree import category_tree
+from src.queries.jobs import job_queue
+from src.queries.search import search_index, tokenize
+from src.queries.projection import select_product_rows, product_rows_to_dtos, select_dto, rows_to_dtos
+
+
+product_adapter = TypeAdapter(ProductGetDTO)
+product_list_adapter = TypeAdapter(list[ProductGetDTO])
 
 
 class AsyncORM:
@@ -30,10 +46,47 @@ class AsyncORM:
 
 
 
+class CategoryNotFoundError(Exception):
+    pass
+
+
+class CategoryConflictError(Exception):
+    pass
+
+
+def _upsert_products(dialect: str, rows: list[dict]):
+    """Многострочный upsert по sku: ON DUPLICATE KEY UPDATE в MySQL, ON CONFLICT в SQLite (тесты, бенчмарки)"""
+    if dialect == "sqlite":
+        stmt = sqlite_insert(ProductTable.__table__).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[ProductTable.sku],
+            set_={"title": stmt.excluded.title, "description": stmt.excluded.description, "price": stmt.excluded.price},
+        )
+    stmt = mysql_insert(ProductTable.__table__).values(rows)
+    return stmt.on_duplicate_key_update(
+        title=stmt.inserted.title,
+        description=stmt.inserted.description,
+        price=stmt.inserted.price,
+    )
+
+
 class ProductORM:
+    @staticmethod
+    def _to_dto(product: ProductTable) -> ProductGetDTO:
+        return ProductGetDTO(
+            id=product.id,
+            title=product.title,
+            description=product.description,
+            price=float(product.price),  # Конвертация
+            sku=product.sku,
+            categories=[c.id for c in product.categories],
+            created_at=product.created_at,
+            updated_at=product.updated_at
+        )
+
     @staticmethod
     async def select_all_products():
-        async with async_session_factory() as session:
+        async with read_session_factory() as session:
             # Явно загружаем категории
             query = select(ProductTable).options(
                 selectinload(ProductTable.categories))
@@ -41,32 +94,114 @@ class ProductORM:
             result = await session.execute(query)
             products = result.scalars().all()
 
-            return [
-                ProductGetDTO(
-                    id=product.id,
-                    title=product.title,
-                    description=product.description,
-                    price=float(product.price),  # Конвертация
-                    sku=product.sku,
-                    categories=[
-                        CategoryGetDTO(id=c.id, name=c.name)
-                        for c in product.categories
-                    ],
-                    created_at=product.created_at,
-                    updated_at=product.updated_at
-                ) for product in products
-            ]
+            return [ProductORM._to_dto(product) for product in products]
+
+    @staticmethod
+    async def select_catalog_state():
+        """Дешевый валидатор каталога для ETag/Last-Modified: последнее изменение и количество строк"""
+        async with read_session_factory() as session:
+            result = await session.execute(select(func.max(ProductTable.updated_at), func.count(ProductTable.id)))
+            return tuple(result.one())
+
+    @staticmethod
+    async def select_products_page(limit: int = 100, after: int | None = None):
+        """Keyset-пагинация по ProductTable.id: следующая страница начинается после id `after`"""
+        return await product_cache.get_or_load(
+            "products",
+            f"page:{limit}:{after}",
+            lambda: ProductORM._select_products_page(limit, after),
+            product_list_adapter,
+        )
+
+    @staticmethod
+    async def _select_products_page(limit: int, after: int | None):
+        async with read_session_factory() as session:
+            query = select_product_rows().order_by(ProductTable.id).limit(limit)
+            if after is not None:
+                query = query.where(ProductTable.id > after)
+
+            result = await session.execute(query)
+            return product_rows_to_dtos(result)
+
+    @staticmethod
+    async def stream_products(chunk_size: int = 500):
+        """Отдает продукты чанками через серверный курсор, не загружая весь каталог в память"""
+        async with read_session_factory() as session:
+            query = (
+                select_product_rows()
+                .order_by(ProductTable.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            result = await session.stream(query)
+            async for partition in result.partitions(chunk_size):
+                yield product_rows_to_dtos(partition)
 
     @staticmethod
     async def select_one_products(id:int):
-        async with async_session_factory() as session:
-            result = await session.get(ProductTable, id)
-            product = result.scalars()
-            return product
+        return await product_cache.get_or_load(
+            f"product:{id}",
+            "one",
+            lambda: ProductORM._select_one_product(id),
+            product_adapter,
+        )
+
+    @staticmethod
+    async def _select_one_product(id: int):
+        async with read_session_factory() as session:
+            result = await session.execute(select_product_rows().where(ProductTable.id == id))
+            products = product_rows_to_dtos(result)
+            return products[0] if products else None
+
+    @staticmethod
+    async def search_products(query: str, limit: int = 20, category_id: int | None = None, prefix: bool = True):
+        categories = None
+        if category_id is not None:
+            tree = await CategoryORM.ensure_tree()
+            categories = tree.descendants(category_id)
+
+        if settings.SEARCH_BACKEND == "mysql":
+            return await ProductORM._search_fulltext(query, limit, categories, prefix)
+
+        await search_index.ensure_loaded(ProductORM.stream_products)
+        ranked = search_index.search(query, limit=limit, categories=categories, prefix=prefix)
+        if not ranked:
+            return []
+
+        ids = [product_id for product_id, _ in ranked]
+        async with read_session_factory() as session:
+            result = await session.execute(select_product_rows().where(ProductTable.id.in_(ids)))
+            by_id = {product.id: product for product in product_rows_to_dtos(result)}
+        # Сохраняем порядок релевантности; удаленные за это время продукты пропускаем
+        return [by_id[product_id] for product_id in ids if product_id in by_id]
+
+    @staticmethod
+    async def _search_fulltext(query: str, limit: int, categories: frozenset[int] | None, prefix: bool):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        if prefix:
+            tokens[-1] += "*"
+        relevance = match(ProductTable.title, ProductTable.description, against=" ".join(
+            f"+{token}" for token in tokens
+        )).in_boolean_mode()
+
+        async with read_session_factory() as session:
+            stmt = (
+                select_product_rows()
+                .where(or_(relevance, ProductTable.sku == query))
+                .order_by(relevance.desc(), ProductTable.id)
+                .limit(limit)
+            )
+            if categories is not None:
+                stmt = stmt.where(ProductTable.id.in_(
+                    select(product_categories.c.product_id).where(product_categories.c.category_id.in_(categories))
+                ))
+            result = await session.execute(stmt)
+            return product_rows_to_dtos(result)
 
     @staticmethod
     async def insert_product(product_data: ProductPostDTO):
-        async with async_session_factory() as session:
+        async with write_session_factory() as session:
             # Создаем объект продукта
             product = ProductTable(
                 title=product_data.title,
@@ -76,34 +211,333 @@ class ProductORM:
             )
 
             # Добавляем категории, если они указаны
+            category_ids = []
             if product_data.categories:
                 result = await session.execute(
                     select(CategoryTable).where(CategoryTable.id.in_(product_data.categories))
                 )
                 categories = result.scalars().all()
                 product.categories.extend(categories)
+                category_ids = [c.id for c in categories]
 
             # Сохраняем продукт в базу данных
             session.add(product)
             await session.commit()
             await session.refresh(product)
+            await product_cache.invalidate_product(product.id, category_tree.with_ancestors(product_data.categories))
+            if search_index.loaded:
+                await job_queue.enqueue("search.reindex", {"ids": [product.id]}, durable=False)
+
+            # После commit связи протухают, поэтому категории берем из уже загруженного списка
+            return ProductGetDTO(
+                **product_data.model_dump(exclude={"categories"}),
+                id=product.id,
+                categories=category_ids,
+                created_at=product.created_at,
+                updated_at=product.updated_at,
+            )
+
+    @staticmethod
+    async def bulk_upsert_products(products: list[ProductPostDTO], chunk_size: int = settings.BULK_CHUNK_SIZE):
+        """
+        Импорт пачки продуктов многострочными upsert по sku.
+        Каждый чанк коммитится отдельно, ошибка в чанке не откатывает уже загруженные.
+        """
+        # Если sku повторяется в пачке, побеждает последняя запись
+        latest = {product.sku: idx for idx, product in enumerate(products)}
+        unique = [product for idx, product in enumerate(products) if latest[product.sku] == idx]
+        by_sku: dict[str, ProductBulkResultDTO] = {}
+        touched_categories: set[int] = set()
+        touched_products: list[int] = []
+
+        async with write_session_factory() as session:
+            # Категории проверяем один раз на всю пачку
+            requested = {c for product in unique for c in product.categories}
+            known_categories = set()
+            if requested:
+                result = await session.execute(
+                    select(CategoryTable.id).where(CategoryTable.id.in_(requested))
+                )
+                known_categories = set(result.scalars())
+
+            # Продукт с несуществующей категорией не пишем: молча отброшенная связь выглядела бы успехом
+            valid = []
+            for product in unique:
+                unknown = sorted(set(product.categories) - known_categories)
+                if unknown:
+                    by_sku[product.sku] = ProductBulkResultDTO(
+                        sku=product.sku,
+                        status=BulkItemStatus.ERROR,
+                        error=f"Категории не найдены: {', '.join(map(str, unknown))}",
+                    )
+                else:
+                    valid.append(product)
+
+            for start in range(0, len(valid), chunk_size):
+                chunk = valid[start:start + chunk_size]
+                skus = [product.sku for product in chunk]
+                try:
+                    result = await session.execute(
+                        select(ProductTable.sku).where(ProductTable.sku.in_(skus))
+                    )
+                    existing = set(result.scalars())
+
+                    await session.execute(_upsert_products(session.bind.dialect.name, [
+                        {
+                            "title": product.title,
+                            "description": product.description,
+                            "price": product.price,
+                            "sku": product.sku,
+                        } for product in chunk
+                    ]))
 
-            return product
+                    # MySQL не возвращает id для многострочного INSERT, добираем их одним запросом
+                    result = await session.execute(
+                        select(ProductTable.sku, ProductTable.id).where(ProductTable.sku.in_(skus))
+                    )
+                    ids = dict(result.tuples().all())
+
+                    # При upsert набор категорий продукта заменяется целиком: старые категории
+                    # тоже инвалидируем, иначе в их кэше останется продукт, который из них ушел
+                    result = await session.execute(
+                        select(product_categories.c.category_id)
+                        .where(product_categories.c.product_id.in_(ids.values()))
+                        .distinct()
+                    )
+                    previous_categories = set(result.scalars())
+                    await session.execute(
+                        delete(product_categories).where(product_categories.c.product_id.in_(ids.values()))
+                    )
+                    links = [
+                        {"product_id": ids[product.sku], "category_id": category_id}
+                        for product in chunk
+                        for category_id in set(product.categories)
+                    ]
+                    if links:
+                        await session.execute(insert(product_categories), links)
+
+                    await session.commit()
+                except SQLAlchemyError as e:
+                    await session.rollback()
+                    for product in chunk:
+                        by_sku[product.sku] = ProductBulkResultDTO(
+                            sku=product.sku, status=BulkItemStatus.ERROR, error=e.__class__.__name__
+                        )
+                    continue
+
+                for product in chunk:
+                    by_sku[product.sku] = ProductBulkResultDTO(
+                        sku=product.sku,
+                        id=ids[product.sku],
+                        status=BulkItemStatus.UPDATED if product.sku in existing else BulkItemStatus.CREATED,
+                    )
+                    touched_categories.update(product.categories)
+                touched_categories.update(previous_categories)
+                touched_products.extend(ids.values())
+                if search_index.loaded:
+                    await job_queue.enqueue("search.reindex", {"ids": list(ids.values())}, durable=False)
+
+        if touched_products:
+            await product_cache.invalidate(
+                namespaces=[
+                    "products",
+                    *(f"product:{product_id}" for product_id in touched_products),
+                    *(f"category:{category_id}" for category_id in category_tree.with_ancestors(touched_categories)),
+                ]
+            )
+
+        return [
+            by_sku[product.sku] if latest[product.sku] == idx
+            else ProductBulkResultDTO(sku=product.sku, status=BulkItemStatus.DUPLICATE)
+            for idx, product in enumerate(products)
+        ]
+
+    @staticmethod
+    async def reindex_search(product_ids: list[int]):
+        """Перечитывает продукты и обновляет поисковый индекс процесса; удаленные из БД убираются из индекса"""
+        if not search_index.loaded:
+            # Индекс еще не построен и при загрузке прочитает актуальные строки
+            return
+        # Задача ставится сразу после commit, реплика может еще не догнать primary
+        with primary_only():
+            async with read_session_factory() as session:
+                result = await session.execute(select_product_rows().where(ProductTable.id.in_(product_ids)))
+                products = {product.id: product for product in product_rows_to_dtos(result)}
+        for product_id in product_ids:
+            if product_id in products:
+                search_index.add(product_id, products[product_id])
+            else:
+                search_index.remove(product_id)
 
     @staticmethod
     async def delete_product_by_sku(sku: str):
-        async with async_session_factory() as session:
+        async with write_session_factory() as session:
             # Находим продукт по SKU
             result = await session.execute(
-                select(ProductTable).where(ProductTable.sku == sku)
+                select(ProductTable)
+                .options(selectinload(ProductTable.categories))
+                .where(ProductTable.sku == sku)
             )
             product = result.scalars().first()
 
             # Проверяем, найден ли продукт
             if product:
+                # Категории нужны для инвалидации кэша, после удаления связи исчезнут
+                product_id = product.id
+                category_ids = [c.id for c in product.categories]
                 # Удаляем продукт
                 await session.delete(product)
                 await session.commit()
+                await product_cache.invalidate_product(product_id, category_tree.with_ancestors(category_ids))
+                search_index.remove(product_id)
                 return {"message": "Продукт успешно удален"}
             else:
                 return {"message": "Продукт с указанным SKU не найден"}
+
+
+class CategoryORM:
+    @staticmethod
+    async def select_categories():
+        async with read_session_factory() as session:
+            result = await session.execute(select_dto(CategoryGetDTO, CategoryTable))
+            return rows_to_dtos(CategoryGetDTO, result)
+
+    @staticmethod
+    async def ensure_tree():
+        await category_tree.ensure_loaded(CategoryORM.select_categories, settings.CATEGORY_TREE_MAX_AGE)
+        return category_tree
+
+    @staticmethod
+    async def select_subtree_products(category_id: int, limit: int = 100, after: int | None = None):
+        """Продукты категории и всех ее подкатегорий одним запросом, с keyset-пагинацией"""
+        tree = await CategoryORM.ensure_tree()
+        return await product_cache.get_or_load(
+            f"category:{category_id}",
+            f"subtree:{limit}:{after}",
+            lambda: CategoryORM._select_subtree_products(tree.descendants(category_id), limit, after),
+            product_list_adapter,
+        )
+
+    @staticmethod
+    async def _select_subtree_products(category_ids: frozenset[int], limit: int, after: int | None):
+        async with read_session_factory() as session:
+            in_subtree = select(product_categories.c.product_id).where(
+                product_categories.c.category_id.in_(category_ids)
+            )
+            query = (
+                select_product_rows()
+                .where(ProductTable.id.in_(in_subtree))
+                .order_by(ProductTable.id)
+                .limit(limit)
+            )
+            if after is not None:
+                query = query.where(ProductTable.id > after)
+
+            result = await session.execute(query)
+            return product_rows_to_dtos(result)
+
+    @staticmethod
+    async def _check_parent(session, category_id: int | None, parent_id: int | None):
+        """
+        Родитель существует и не лежит в поддереве category_id. Цепочку предков читаем из БД
+        с блокировкой: дерево в памяти может отставать, а два встречных переноса иначе замкнут цикл.
+        """
+        current, seen = parent_id, set()
+        while current is not None and current not in seen:
+            if current == category_id:
+                raise ValueError("Категория не может быть вложена в собственного потомка")
+            seen.add(current)
+            row = (await session.execute(
+                select(CategoryTable.parent_category_id).where(CategoryTable.id == current).with_for_update()
+            )).first()
+            if row is None:
+                if current == parent_id:
+                    raise CategoryNotFoundError("Родительская категория не найдена")
+                break
+            current = row.parent_category_id
+
+    @staticmethod
+    async def insert_category(category_data: CategoryCreateDTO):
+        await CategoryORM.ensure_tree()
+        async with write_session_factory() as session:
+            await CategoryORM._check_parent(session, None, category_data.parent_category_id)
+            category = CategoryTable(
+                name=category_data.name,
+                parent_category_id=category_data.parent_category_id,
+            )
+            session.add(category)
+            try:
+                await session.flush()
+                category_id = category.id
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                raise CategoryConflictError("Категория с таким названием уже существует")
+
+            dto = CategoryGetDTO(
+                id=category_id,
+                name=category_data.name,
+                parent_category_id=category_data.parent_category_id,
+            )
+            category_tree.upsert(dto)
+            return dto
+
+    @staticmethod
+    async def update_category(category_id: int, category_data: CategoryCreateDTO):
+        tree = await CategoryORM.ensure_tree()
+        async with write_session_factory() as session:
+            category = await session.get(CategoryTable, category_id, with_for_update=True)
+            if category is None:
+                return None
+            await CategoryORM._check_parent(session, category_id, category_data.parent_category_id)
+            category.name = category_data.name
+            category.parent_category_id = category_data.parent_category_id
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                raise CategoryConflictError("Категория с таким названием уже существует")
+
+        # Поддерево переехало: меняются выборки и старых, и новых предков
+        affected = tree.with_ancestors([category_id])
+        dto = CategoryGetDTO(id=category_id, **category_data.model_dump())
+        tree.upsert(dto)
+        affected |= tree.with_ancestors([category_id])
+        await product_cache.invalidate(namespaces=[f"category:{idx}" for idx in affected])
+        return dto
+
+    @staticmethod
+    async def delete_category(category_id: int):
+        tree = await CategoryORM.ensure_tree()
+        async with write_session_factory() as session:
+            category = await session.get(CategoryTable, category_id)
+            if category is None:
+                return {"message": "Категория не найдена"}
+
+            # Связи product_categories удалятся каскадно, у этих продуктов поменяется список категорий
+            result = await session.execute(
+                select(product_categories.c.product_id).where(product_categories.c.category_id == category_id)
+            )
+            product_ids = list(result.scalars())
+
+            await session.delete(category)
+            await session.commit()
+
+        affected = tree.with_ancestors([category_id])
+        tree.remove(category_id)
+        if product_ids and search_index.loaded:
+            # У продуктов поменялся список категорий, по которому фильтрует поиск
+            await job_queue.enqueue("search.reindex", {"ids": product_ids}, durable=False)
+        await product_cache.invalidate(
+            namespaces=[
+                "products",
+                *(f"product:{product_id}" for product_id in product_ids),
+                *(f"category:{idx}" for idx in affected),
+            ]
+        )
+        return {"message": "Категория успешно удалена"}
+
+
+@job_queue.register("search.reindex")
+async def reindex_search_job(payload: dict):
+    await ProductORM.reindex_search(payload["ids"])
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy import select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+from src.config import settings
+from src.database.dtos import PaymentWebhookDTO
+from src.database.enums import PaymentStatus, OrderStatus, WebhookOutcome
+from src.database.models import PaymentTable, PaymentEventTable, OrderTable
+from src.database.routing import write_session_factory
+from src.queries.analytics import SalesORM, sales_delta
+from src.queries.cache import product_cache
+from src.queries.orders import is_retryable
+
+logger = logging.getLogger(__name__)
+
+# Статус платежа только растет: FAILED можно перекрыть поздним SUCCESS, SUCCESS окончательный
+STATUS_RANK = {PaymentStatus.PENDING: 0, PaymentStatus.FAILED: 1, PaymentStatus.SUCCESS: 2}
+
+
+def sign(body: bytes, secret: str) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    return signature is not None and hmac.compare_digest(sign(body, secret), signature)
+
+
+def _insert_new_events(dialect: str):
+    # Уже записанные (transaction_id, статус) пропускаются
+    if dialect == "sqlite":
+        return sqlite_insert(PaymentEventTable.__table__).on_conflict_do_nothing()
+    return mysql_insert(PaymentEventTable.__table__).prefix_with("IGNORE")
+
+
+class IngestStats(BaseModel):
+    received: int
+    batches: int
+    avg_batch: float
+    pending: int
+    batch_max_ms: float
+    outcomes: dict[str, int]
+
+
+class PaymentIngestor:
+    """
+    Колбэки провайдера копятся до max_batch штук или max_delay секунд и применяются одной транзакцией.
+    Ответ провайдеру уходит после commit своей пачки: подтвержденный колбэк уже сохранен.
+    Повторы одного события схлопываются внутри пачки и отбрасываются INSERT IGNORE в payment_events,
+    запоздавшие события с меньшим статусом не откатывают платеж назад.
+    Если пачка не применилась, ее события применяются по одному: ошибку (503, провайдер повторит)
+    получают только те колбэки, которые не проходят и поодиночке.
+    """
+
+    attempts = 3
+
+    def __init__(self, max_batch: int, max_delay: float):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.received = 0
+        self.batches = 0
+        self.batch_max = 0.0
+        self.outcomes = {outcome.value: 0 for outcome in WebhookOutcome}
+        self._pending: list[tuple[PaymentWebhookDTO, asyncio.Future]] = []
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, event: PaymentWebhookDTO) -> WebhookOutcome:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((event, future))
+        self.received += 1
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def stop(self):
+        # Дожидаемся уже принятых колбэков: провайдер ждет ответа на каждый
+        if self._task is not None:
+            self._full.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> IngestStats:
+        return IngestStats(
+            received=self.received,
+            batches=self.batches,
+            avg_batch=round((self.received - len(self._pending)) / self.batches, 2) if self.batches else 0.0,
+            pending=len(self._pending),
+            batch_max_ms=round(self.batch_max * 1000, 3),
+            outcomes=dict(self.outcomes),
+        )
+
+    async def _run(self):
+        # Задача завершается, когда очередь пуста; следующий submit запустит новую
+        while self._pending:
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            await self._process(batch)
+
+    async def _process(self, batch: list[tuple[PaymentWebhookDTO, asyncio.Future]]):
+        events = [event for event, _ in batch]
+        start = time.perf_counter()
+        try:
+            outcomes = await self._apply_with_retry(events)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.exception("Не удалось применить колбэк платежа %s", events[0].transaction_id)
+                self._resolve(batch[0][1], exception=e)
+                return
+            # Одно плохое событие не должно валить всю пачку: применяем по одному, у каждого свой итог
+            logger.exception("Не удалось применить пачку колбэков платежей, применяем по одному")
+            for item in batch:
+                await self._process([item])
+            return
+        finally:
+            self.batches += 1
+            self.batch_max = max(self.batch_max, time.perf_counter() - start)
+
+        for (_, future), outcome in zip(batch, outcomes):
+            self.outcomes[outcome.value] += 1
+            self._resolve(future, outcome)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, outcome: Optional[WebhookOutcome] = None, exception: Optional[Exception] = None):
+        # Провайдер мог уже оборвать соединение
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(outcome)
+
+    async def _apply_with_retry(self, events: list[PaymentWebhookDTO]) -> list[WebhookOutcome]:
+        for attempt in range(self.attempts):
+            try:
+                return await self._apply(events)
+            except OperationalError as e:
+                if not is_retryable(e) or attempt == self.attempts - 1:
+                    raise
+
+    async def _apply(self, events: list[PaymentWebhookDTO]) -> list[WebhookOutcome]:
+        # От каждой транзакции в пачке нужно только событие с самым старшим статусом
+        best: dict[str, PaymentWebhookDTO] = {}
+        for event in events:
+            current = best.get(event.transaction_id)
+            if current is None or STATUS_RANK[event.status] > STATUS_RANK[current.status]:
+                best[event.transaction_id] = event
+
+        results: dict[str, WebhookOutcome] = {}
+        paid_orders: list[int] = []
+        async with write_session_factory() as session:
+            async with session.begin():
+                unique = {(event.transaction_id, event.status): event for event in events}
+                await session.execute(
+                    _insert_new_events(session.bind.dialect.name),
+                    [
+                        {"transaction_id": tx, "status": status, "payment_id": event.payment_id, "amount": event.amount}
+                        for (tx, status), event in unique.items()
+                    ],
+                )
+
+                # Блокируем платежи в порядке id, чтобы параллельные пачки не взаимоблокировались
+                result = await session.execute(
+                    select(PaymentTable.id, PaymentTable.order_id, PaymentTable.amount,
+                           PaymentTable.status, PaymentTable.transaction_id)
+                    .where(PaymentTable.id.in_(list({event.payment_id for event in best.values()})))
+                    .order_by(PaymentTable.id)
+                    .with_for_update()
+                )
+                payments = {row.id: row for row in result}
+                # transaction_id уникален: тот же id у другого платежа - ошибка провайдера
+                result = await session.execute(
+                    select(PaymentTable.transaction_id, PaymentTable.id)
+                    .where(PaymentTable.transaction_id.in_(list(best)))
+                )
+                owners = dict(result.tuples().all())
+
+                state = {
+                    payment_id: [payment.status, payment.transaction_id]
+                    for payment_id, payment in payments.items()
+                }
+                changed: set[int] = set()
+                for tx, event in sorted(best.items(), key=lambda item: STATUS_RANK[item[1].status]):
+                    payment = payments.get(event.payment_id)
+                    if payment is None:
+                        results[tx] = WebhookOutcome.UNKNOWN_PAYMENT
+                        continue
+                    status, transaction_id = state[payment.id]
+                    if (
+                        owners.get(tx, payment.id) != payment.id
+                        or transaction_id not in (None, tx)
+                        or abs(payment.amount - event.amount) > 0.005
+                    ):
+                        results[tx] = WebhookOutcome.REJECTED
+                        continue
+                    if STATUS_RANK[event.status] <= STATUS_RANK[status]:
+                        results[tx] = WebhookOutcome.DUPLICATE if event.status == status else WebhookOutcome.STALE
+                        continue
+                    state[payment.id] = [event.status, tx]
+                    changed.add(payment.id)
+                    results[tx] = WebhookOutcome.APPLIED
+
+                if changed:
+                    await session.execute(update(PaymentTable), [
+                        {"id": payment_id, "status": state[payment_id][0], "transaction_id": state[payment_id][1]}
+                        for payment_id in sorted(changed)
+                    ])
+                    paid_orders = await self._mark_orders_paid(session, [
+                        payments[payment_id].order_id
+                        for payment_id in changed if state[payment_id][0] == PaymentStatus.SUCCESS
+                    ])
+
+        if paid_orders:
+            await product_cache.invalidate(namespaces=["analytics"])
+
+        outcomes = []
+        for event in events:
+            outcome = results[event.transaction_id]
+            if event is not best[event.transaction_id] and outcome not in (
+                    WebhookOutcome.UNKNOWN_PAYMENT, WebhookOutcome.REJECTED
+            ):
+                # Повтор внутри пачки или событие, которое обогнал более поздний статус
+                outcome = WebhookOutcome.DUPLICATE if event.status == best[event.transaction_id].status \
+                    else WebhookOutcome.STALE
+            outcomes.append(outcome)
+        return outcomes
+
+    @staticmethod
+    async def _mark_orders_paid(session, order_ids: list[int]) -> list[int]:
+        if not order_ids:
+            return []
+        result = await session.execute(
+            select(OrderTable.id, OrderTable.status, OrderTable.order_date)
+            .where(OrderTable.id.in_(order_ids))
+            .order_by(OrderTable.id)
+            .with_for_update()
+        )
+        orders = result.all()
+        pending = [order for order in orders if order.status == OrderStatus.PENDING]
+        for order in orders:
+            if order.status == OrderStatus.CANCELLED:
+                logger.warning("Оплачен отмененный заказ %s", order.id)
+        if not pending:
+            return []
+
+        await session.execute(
+            update(OrderTable)
+            .where(OrderTable.id.in_([order.id for order in pending]))
+            .values(status=OrderStatus.PAID)
+        )
+        # Оплаченный заказ попадает в агрегаты продаж в той же транзакции, что и при OrderORM.set_status
+        delta = sales_delta(OrderStatus.PENDING, OrderStatus.PAID)
+        for order in pending:
+            await SalesORM.apply_order(session, order.id, order.order_date, delta)
+        return [order.id for order in pending]
+
+
+payment_ingestor = PaymentIngestor(settings.PAYMENT_BATCH_SIZE, settings.PAYMENT_BATCH_DELAY)
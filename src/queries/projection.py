@@ -0,0 +1,61 @@
+from typing import Iterable, TypeVar
+
+from pydantic import BaseModel
+from sqlalchemy import Float, Select, func, select, type_coerce
+from sqlalchemy.engine import Row
+
+from src.database.dtos import ProductGetDTO
+from src.instrumentation import timed
+from src.database.models import Base, ProductTable, ProductRatingTable, product_categories
+
+# Read-only режим: выбираем только нужные колонки и собираем DTO прямо из строк,
+# минуя ORM-объекты и identity map. Данные из БД уже валидны, поэтому model_construct.
+
+DTO = TypeVar("DTO", bound=BaseModel)
+
+
+def dto_columns(dto: type[BaseModel], table: type[Base]) -> list:
+    columns = table.__table__.c
+    return [columns[name] for name in dto.model_fields if name in columns]
+
+
+def select_dto(dto: type[BaseModel], table: type[Base]) -> Select:
+    """select() колонок таблицы, совпадающих с полями DTO (например, CategoryGetDTO / CategoryTable)"""
+    return select(*dto_columns(dto, table))
+
+
+def rows_to_dtos(dto: type[DTO], rows: Iterable[Row]) -> list[DTO]:
+    construct = dto.model_construct
+    with timed("dto"):
+        return [construct(**row._mapping) for row in rows]
+
+
+def select_product_rows() -> Select:
+    # Категории агрегируются в одну строку id через запятую: одна строка на продукт
+    return (
+        select(
+            *dto_columns(ProductGetDTO, ProductTable),
+            func.group_concat(product_categories.c.category_id).label("categories"),
+            # В таблице DECIMAL, в DTO - float
+            type_coerce(func.coalesce(func.max(ProductRatingTable.rating_avg), 0), Float).label("rating_avg"),
+            func.coalesce(func.max(ProductRatingTable.rating_count), 0).label("rating_count"),
+        )
+        .outerjoin(product_categories, product_categories.c.product_id == ProductTable.id)
+        .outerjoin(ProductRatingTable, ProductRatingTable.product_id == ProductTable.id)
+        .group_by(ProductTable.id)
+    )
+
+
+def _split_ids(raw: str | None) -> list[int]:
+    return [int(value) for value in raw.split(",")] if raw else []
+
+
+def product_rows_to_dtos(rows: Iterable[Row]) -> list[ProductGetDTO]:
+    construct = ProductGetDTO.model_construct
+    products = []
+    with timed("dto"):
+        for row in rows:
+            values = dict(row._mapping)
+            values["categories"] = _split_ids(values["categories"])
+            products.append(construct(**values))
+    return products
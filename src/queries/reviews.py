@@ -0,0 +1,197 @@
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import select, update, delete, func, case, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from src.database.dtos import ReviewGetDTO, ReviewPostDTO, ProductGetDTO
+from src.database.models import ProductTable, ProductRatingTable, ReviewOrm, product_categories
+from src.database.routing import read_session_factory, write_session_factory
+from src.queries.cache import product_cache
+from src.queries.category_tree import category_tree
+from src.queries.jobs import job_queue
+from src.queries.orm import product_list_adapter
+from src.queries.projection import select_product_rows, product_rows_to_dtos
+
+ratings = ProductRatingTable.__table__
+CENTS = Decimal("0.01")
+
+
+class ReviewTargetNotFoundError(LookupError):
+    pass
+
+
+def _average(total, count):
+    # * 1.0: в SQLite деление целых было бы целочисленным
+    return func.round(total * 1.0 / count, 2)
+
+
+def _add_rating(dialect: str, product_id: int, rating: int):
+    """
+    Upsert агрегата. rating_avg стоит первым и считается от старых sum/count:
+    MySQL применяет присваивания слева направо, SQLite - все от старых значений, так верно в обоих.
+    """
+    insert = sqlite_insert if dialect == "sqlite" else mysql_insert
+    stmt = insert(ratings).values(product_id=product_id, rating_sum=rating, rating_count=1, rating_avg=rating)
+    values = [
+        ("rating_avg", _average(ratings.c.rating_sum + rating, ratings.c.rating_count + 1)),
+        ("rating_sum", ratings.c.rating_sum + rating),
+        ("rating_count", ratings.c.rating_count + 1),
+    ]
+    if dialect == "sqlite":
+        return stmt.on_conflict_do_update(index_elements=[ratings.c.product_id], set_=dict(values))
+    return stmt.on_duplicate_key_update(values)
+
+
+def _replace_ratings(dialect: str, totals):
+    """INSERT ... SELECT агрегатов с заменой существующих строк"""
+    insert = sqlite_insert if dialect == "sqlite" else mysql_insert
+    stmt = insert(ratings).from_select(["product_id", "rating_sum", "rating_count", "rating_avg"], totals)
+    if dialect == "sqlite":
+        # WHERE в totals обязателен: без него SQLite принял бы ON CONFLICT за условие соединения
+        return stmt.on_conflict_do_update(
+            index_elements=[ratings.c.product_id],
+            set_={name: stmt.excluded[name] for name in ("rating_sum", "rating_count", "rating_avg")},
+        )
+    return stmt.on_duplicate_key_update(
+        rating_sum=stmt.inserted.rating_sum,
+        rating_count=stmt.inserted.rating_count,
+        rating_avg=stmt.inserted.rating_avg,
+    )
+
+
+class ReviewORM:
+    @staticmethod
+    async def insert_review(review_data: ReviewGetDTO) -> ReviewPostDTO:
+        async with write_session_factory() as session:
+            review = ReviewOrm(**review_data.model_dump())
+            session.add(review)
+            try:
+                await session.flush()
+            except IntegrityError:
+                await session.rollback()
+                raise ReviewTargetNotFoundError("Продукт или пользователь не найден")
+
+            # Агрегат обновляется в той же транзакции
+            await session.execute(_add_rating(session.bind.dialect.name, review_data.product_id, review_data.rating))
+            await session.commit()
+            await session.refresh(review)
+            result = ReviewPostDTO.model_validate(review)
+
+        await ReviewORM._invalidate(review_data.product_id)
+        return result
+
+    @staticmethod
+    async def delete_review(review_id: int):
+        async with write_session_factory() as session:
+            review = await session.get(ReviewOrm, review_id)
+            if review is None:
+                return {"message": "Отзыв не найден"}
+            product_id, rating = review.product_id, review.rating
+
+            await session.delete(review)
+            await session.execute(
+                update(ratings)
+                .where(ratings.c.product_id == product_id)
+                # rating_avg первым и от старых значений - как в _add_rating
+                .ordered_values(
+                    (ratings.c.rating_avg, case(
+                        (ratings.c.rating_count > 1, _average(ratings.c.rating_sum - rating, ratings.c.rating_count - 1)),
+                        else_=0,
+                    )),
+                    (ratings.c.rating_sum, ratings.c.rating_sum - rating),
+                    (ratings.c.rating_count, ratings.c.rating_count - 1),
+                )
+            )
+            await session.commit()
+
+        await ReviewORM._invalidate(product_id)
+        return {"message": "Отзыв успешно удален"}
+
+    @staticmethod
+    async def _invalidate(product_id: int):
+        async with read_session_factory() as session:
+            result = await session.execute(
+                select(product_categories.c.category_id).where(product_categories.c.product_id == product_id)
+            )
+            category_ids = list(result.scalars())
+        await product_cache.invalidate_product(product_id, category_tree.with_ancestors(category_ids))
+
+    @staticmethod
+    async def select_top_rated(limit: int = 20, after_rating: Decimal | None = None, after_id: int | None = None):
+        """
+        Сортировка по рейтингу идет по индексу (rating_avg, product_id), без агрегации reviews.
+        rating_avg хранится с двумя знаками, курсор сравнивается с ним точно, как Decimal
+        """
+        if after_rating is not None:
+            after_rating = Decimal(after_rating).quantize(CENTS)
+        key = f"top:{limit}:{after_rating}:{after_id}"
+        return await product_cache.get_or_load(
+            "products",
+            key,
+            lambda: ReviewORM._select_top_rated(limit, after_rating, after_id),
+            product_list_adapter,
+        )
+
+    @staticmethod
+    async def _select_top_rated(limit: int, after_rating: Decimal | None, after_id: int | None) -> list[ProductGetDTO]:
+        async with read_session_factory() as session:
+            top = (
+                select(ratings.c.product_id)
+                .where(ratings.c.rating_count > 0)
+                .order_by(ratings.c.rating_avg.desc(), ratings.c.product_id.desc())
+                .limit(limit)
+            )
+            if after_rating is not None and after_id is not None:
+                top = top.where(tuple_(ratings.c.rating_avg, ratings.c.product_id) < (after_rating, after_id))
+            ids = list((await session.execute(top)).scalars())
+            if not ids:
+                return []
+
+            result = await session.execute(select_product_rows().where(ProductTable.id.in_(ids)))
+            by_id = {product.id: product for product in product_rows_to_dtos(result)}
+            return [by_id[product_id] for product_id in ids if product_id in by_id]
+
+    @staticmethod
+    async def rebuild_ratings(chunk_size: int = 10_000):
+        """Пересчет агрегатов из reviews по диапазонам product_id, чтобы не держать долгих блокировок"""
+        async with write_session_factory() as session:
+            max_id = await session.scalar(select(func.max(ProductTable.id))) or 0
+            for start in range(0, max_id + 1, chunk_size):
+                end = start + chunk_size
+                totals = (
+                    select(
+                        ReviewOrm.product_id,
+                        func.sum(ReviewOrm.rating),
+                        func.count(),
+                        func.round(func.avg(ReviewOrm.rating), 2),
+                    )
+                    .where(ReviewOrm.product_id >= start, ReviewOrm.product_id < end)
+                    .group_by(ReviewOrm.product_id)
+                )
+                await session.execute(_replace_ratings(session.bind.dialect.name, totals))
+                # Продукты, у которых отзывов больше нет
+                await session.execute(
+                    delete(ratings).where(
+                        ratings.c.product_id >= start,
+                        ratings.c.product_id < end,
+                        ratings.c.product_id.not_in(
+                            select(ReviewOrm.product_id)
+                            .where(ReviewOrm.product_id >= start, ReviewOrm.product_id < end)
+                        ),
+                    )
+                )
+                await session.commit()
+
+        await product_cache.invalidate(namespaces=["products"])
+
+
+@job_queue.register("ratings.rebuild")
+async def rebuild_ratings_job(payload: dict):
+    await ReviewORM.rebuild_ratings()
+
+
+if __name__ == '__main__':
+    asyncio.run(ReviewORM.rebuild_ratings())
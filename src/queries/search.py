@@ -0,0 +1,181 @@
+import asyncio
+import bisect
+import heapq
+import math
+import re
+import time
+from collections import Counter
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+from src.config import settings
+from src.database.dtos import ProductGetDTO, ProductPostDTO
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _token_re.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс по title/description/sku с ранжированием BM25.
+    Последний токен запроса ищется по префиксу (автодополнение) через отсортированный словарь терминов.
+
+    Индекс живет в памяти процесса. Изменения, сделанные этим процессом, применяются сразу (reindex_search),
+    остальные воркеры видят их только после перестройки своего индекса: не позже max_age секунд после
+    предыдущей загрузки плюс время самой перестройки. При max_age=None индекс строится один раз за жизнь процесса.
+    """
+
+    # Вес поля = сколько раз токен засчитывается в tf
+    field_weights = {"sku": 5, "title": 3, "description": 1}
+    k1 = 1.2
+    b = 0.75
+    max_prefix_expansions = 50
+
+    def __init__(self, max_age: Optional[float] = None):
+        self.max_age = max_age
+        self.postings: dict[str, dict[int, int]] = {}
+        self.terms: list[str] = []  # отсортированный словарь для поиска по префиксу, см. sorted_terms
+        # insort каждого нового термина стоит O(V), при массовой загрузке это квадрат.
+        # Изменения словаря копятся здесь и вливаются в terms одной сортировкой при следующем поиске по префиксу
+        self._new_terms: list[str] = []
+        self._dropped_terms: set[str] = set()
+        self.doc_terms: dict[int, Counter] = {}
+        self.doc_length: dict[int, int] = {}
+        self.doc_categories: dict[int, frozenset[int]] = {}
+        self.total_length = 0
+        self.loaded = False
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.doc_length)
+
+    def expired(self) -> bool:
+        return self.max_age is not None and time.monotonic() - self.loaded_at > self.max_age
+
+    async def ensure_loaded(self, loader: Callable[[], AsyncIterator[list[ProductGetDTO]]]):
+        if self.loaded and (not self.expired() or self._lock.locked()):
+            # Перестройка уже идет в другой задаче, до ее окончания отвечаем по старым данным
+            return
+        async with self._lock:
+            if self.loaded and not self.expired():
+                return
+            # Новый индекс строится рядом и подменяет данные целиком, поиск не видит наполовину загруженный.
+            # Правка этого процесса, пришедшая во время перестройки, может не попасть в него до следующей
+            fresh = SearchIndex()
+            async for chunk in loader():
+                for product in chunk:
+                    fresh.add(product.id, product)
+            self._replace(fresh)
+
+    def _replace(self, fresh: "SearchIndex"):
+        self.postings = fresh.postings
+        self.terms = fresh.terms
+        self._new_terms = fresh._new_terms
+        self._dropped_terms = fresh._dropped_terms
+        self.doc_terms = fresh.doc_terms
+        self.doc_length = fresh.doc_length
+        self.doc_categories = fresh.doc_categories
+        self.total_length = fresh.total_length
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def add(self, product_id: int, product: ProductPostDTO):
+        if product_id in self.doc_terms:
+            self.remove(product_id)
+
+        terms = Counter()
+        for field, weight in self.field_weights.items():
+            for token in tokenize(getattr(product, field)):
+                terms[token] += weight
+
+        for term, tf in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                if term in self._dropped_terms:
+                    # Термин еще лежит в terms, достаточно отменить удаление
+                    self._dropped_terms.discard(term)
+                else:
+                    self._new_terms.append(term)
+            postings[product_id] = tf
+
+        length = sum(terms.values())
+        self.doc_terms[product_id] = terms
+        self.doc_length[product_id] = length
+        self.doc_categories[product_id] = frozenset(product.categories)
+        self.total_length += length
+
+    def remove(self, product_id: int):
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+                self._dropped_terms.add(term)
+        self.total_length -= self.doc_length.pop(product_id)
+        del self.doc_categories[product_id]
+
+    def sorted_terms(self) -> list[str]:
+        if self._new_terms or self._dropped_terms:
+            terms = [term for term in self.terms if term in self.postings] if self._dropped_terms else self.terms
+            # Новые термины, добавленные и удаленные до слияния, в postings уже нет
+            terms.extend(sorted(term for term in self._new_terms if term in self.postings))
+            # Два отсортированных отрезка: timsort сливает их за O(V + k log k)
+            terms.sort()
+            self.terms = terms
+            self._new_terms = []
+            self._dropped_terms = set()
+        return self.terms
+
+    def expand_prefix(self, prefix: str) -> list[str]:
+        terms = self.sorted_terms()
+        start = bisect.bisect_left(terms, prefix)
+        result = []
+        for term in terms[start:start + self.max_prefix_expansions]:
+            if not term.startswith(prefix):
+                break
+            result.append(term)
+        return result
+
+    def search(
+            self,
+            query: str,
+            limit: int = 20,
+            categories: Optional[Iterable[int]] = None,
+            prefix: bool = True,
+    ) -> list[tuple[int, float]]:
+        tokens = tokenize(query)
+        if not tokens or not self.doc_length:
+            return []
+
+        # Каждый токен запроса - группа терминов; последний может быть недописанным словом
+        groups = [[token] for token in tokens]
+        if prefix:
+            groups[-1] = self.expand_prefix(tokens[-1]) or [tokens[-1]]
+
+        allowed = frozenset(categories) if categories is not None else None
+        doc_count = len(self.doc_length)
+        avg_length = self.total_length / doc_count
+        scores: dict[int, float] = {}
+        for group in groups:
+            for term in group:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed is not None and not (self.doc_categories[doc_id] & allowed):
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.doc_length[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+search_index = SearchIndex(max_age=settings.SEARCH_INDEX_MAX_AGE)
@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import logging
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Iterable, Literal, Optional, Sequence
+
+from pydantic import BaseModel
+
+from src.config import settings
+from src.database.dtos import ProductGetDTO
+from src.database.models import ProductTable
+from src.database.routing import read_session_factory, primary_only, routing_scope
+from src.queries.cache import product_cache
+from src.queries.projection import select_product_rows
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+SortOrder = Literal["id", "price", "-price", "newest", "rating"]
+
+
+def _micros(value: datetime) -> int:
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def intersect_sorted(a: Sequence[int], b: Sequence[int]) -> array:
+    """Пересечение двух отсортированных массивов: идем по короткому, в длинном ищем бинарным поиском"""
+    if len(a) > len(b):
+        a, b = b, a
+    result = array("l")
+    lo, size = 0, len(b)
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == size:
+            break
+        if b[lo] == value:
+            result.append(value)
+    return result
+
+
+class SnapshotStats(BaseModel):
+    products: int
+    categories: int
+    age_seconds: float
+    build_ms: float
+    bytes: int
+    bytes_per_product: float
+
+
+class CatalogSnapshot:
+    """
+    Неизменяемый колоночный снимок каталога. Продукт - номер строки, строки отсортированы по id.
+    Числа лежат в typed arrays, строки интернированы, категория - отсортированный массив номеров строк.
+    Перестановки by_price / by_newest / by_rating построены заранее, поэтому диапазон цен - это срез,
+    а сортировка страницы - готовый порядок или top-k по колонке.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.prices = array("d")
+        self.created_at = array("q")  # микросекунды от EPOCH
+        self.updated_at = array("q")
+        self.rating_avg = array("d")
+        self.rating_count = array("l")
+        self.titles: list[str] = []
+        self.descriptions: list[str] = []
+        self.skus: list[str] = []
+        # Категории продукта в CSR-виде: category_values[category_offsets[row]:category_offsets[row + 1]]
+        self.category_offsets = array("l", [0])
+        self.category_values = array("l")
+        self.members: dict[int, array] = {}
+        self.by_price = array("l")
+        self.sorted_prices = array("d")
+        self.by_newest = array("l")
+        self.by_rating = array("l")
+        self.generation = 0
+        self.built_at = time.monotonic()
+        self.build_time = 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, row):
+        """Строка select_product_rows(): категории приходят строкой id через запятую"""
+        position = len(self.ids)
+        self.ids.append(row.id)
+        self.prices.append(row.price)
+        self.created_at.append(_micros(row.created_at))
+        self.updated_at.append(_micros(row.updated_at))
+        self.rating_avg.append(row.rating_avg)
+        self.rating_count.append(row.rating_count)
+        self.titles.append(sys.intern(row.title))
+        self.descriptions.append(sys.intern(row.description))
+        self.skus.append(sys.intern(row.sku))
+        if row.categories:
+            for category_id in map(int, row.categories.split(",")):
+                self.category_values.append(category_id)
+                self.members.setdefault(category_id, array("l")).append(position)
+        self.category_offsets.append(len(self.category_values))
+
+    def finish(self):
+        rows = range(len(self.ids))
+        self.by_price = array("l", sorted(rows, key=self.prices.__getitem__))
+        self.sorted_prices = array("d", map(self.prices.__getitem__, self.by_price))
+        self.by_newest = array("l", sorted(rows, key=self.created_at.__getitem__, reverse=True))
+        self.by_rating = array("l", sorted(rows, key=self.rating_avg.__getitem__, reverse=True))
+        return self
+
+    def rows_in_categories(self, category_sets: Iterable[Iterable[int]]) -> Optional[array]:
+        """
+        Каждый элемент category_sets - группа категорий (обычно поддерево), продукт должен попасть
+        хотя бы в одну категорию каждой группы. None - фильтра по категориям нет.
+        """
+        result = None
+        for group in category_sets:
+            arrays = [self.members[category_id] for category_id in group if category_id in self.members]
+            if len(arrays) == 1:
+                rows = arrays[0]
+            else:
+                rows = array("l", sorted(set().union(*arrays)))
+            result = rows if result is None else intersect_sorted(result, rows)
+            if not result:
+                break
+        return result
+
+    def select(
+            self,
+            min_price: Optional[float] = None,
+            max_price: Optional[float] = None,
+            category_sets: Iterable[Iterable[int]] = (),
+            sort: SortOrder = "id",
+            limit: int = 100,
+            offset: int = 0,
+    ) -> list[int]:
+        """Номера строк страницы результата"""
+        lo = bisect_left(self.sorted_prices, min_price) if min_price is not None else 0
+        hi = bisect_right(self.sorted_prices, max_price) if max_price is not None else len(self)
+        price_filtered = lo > 0 or hi < len(self)
+
+        rows = self.rows_in_categories(category_sets)
+        if rows is None:
+            # Без фильтра по категориям порядок по цене - срез готовой перестановки
+            if sort == "price":
+                start = lo + offset
+                return self.by_price[start:max(min(start + limit, hi), start)].tolist()
+            if sort == "-price":
+                end = hi - offset
+                return self.by_price[max(end - limit, lo):max(end, lo)][::-1].tolist()
+            if not price_filtered:
+                order = {"id": range(len(self)), "newest": self.by_newest, "rating": self.by_rating}[sort]
+                return list(order[offset:offset + limit])
+            rows = array("l", sorted(self.by_price[lo:hi])) if sort == "id" else self.by_price[lo:hi]
+        elif price_filtered:
+            if hi - lo < len(rows):
+                rows = intersect_sorted(array("l", sorted(self.by_price[lo:hi])), rows)
+            else:
+                prices = self.prices
+                low = self.sorted_prices[lo] if lo < len(self) else float("inf")
+                high = self.sorted_prices[hi - 1] if hi > 0 else float("-inf")
+                rows = array("l", [row for row in rows if low <= prices[row] <= high])
+
+        if sort == "id":
+            return rows[offset:offset + limit].tolist()
+        key, largest = {
+            "price": (self.prices.__getitem__, False),
+            "-price": (self.prices.__getitem__, True),
+            "newest": (self.created_at.__getitem__, True),
+            "rating": (self.rating_avg.__getitem__, True),
+        }[sort]
+        # Нужна только первая страница: top-k вместо полной сортировки
+        pick = heapq.nlargest if largest else heapq.nsmallest
+        return pick(offset + limit, rows, key=key)[offset:]
+
+    def to_dtos(self, rows: Iterable[int]) -> list[ProductGetDTO]:
+        construct = ProductGetDTO.model_construct
+        offsets, values = self.category_offsets, self.category_values
+        return [
+            construct(
+                id=self.ids[row],
+                title=self.titles[row],
+                description=self.descriptions[row],
+                price=self.prices[row],
+                sku=self.skus[row],
+                categories=values[offsets[row]:offsets[row + 1]].tolist(),
+                created_at=EPOCH + timedelta(microseconds=self.created_at[row]),
+                updated_at=EPOCH + timedelta(microseconds=self.updated_at[row]),
+                rating_avg=self.rating_avg[row],
+                rating_count=self.rating_count[row],
+            )
+            for row in rows
+        ]
+
+    def footprint(self) -> int:
+        """Байты, занятые снимком: буферы массивов, списки и уникальные строки"""
+        arrays = [
+            self.ids, self.prices, self.created_at, self.updated_at, self.rating_avg, self.rating_count,
+            self.category_offsets, self.category_values, self.by_price, self.sorted_prices,
+            self.by_newest, self.by_rating, *self.members.values(),
+        ]
+        total = sum(sys.getsizeof(values) for values in arrays)
+        total += sys.getsizeof(self.members)
+        strings = {}
+        for column in (self.titles, self.descriptions, self.skus):
+            total += sys.getsizeof(column)
+            for value in column:
+                strings[id(value)] = value
+        total += sum(sys.getsizeof(value) for value in strings.values())
+        return total
+
+    def stats(self) -> SnapshotStats:
+        size = self.footprint()
+        return SnapshotStats(
+            products=len(self),
+            categories=len(self.members),
+            age_seconds=round(time.monotonic() - self.built_at, 3),
+            build_ms=round(self.build_time * 1000, 3),
+            bytes=size,
+            bytes_per_product=round(size / len(self), 1) if len(self) else 0.0,
+        )
+
+
+class CatalogSnapshotStore:
+    """
+    Держит текущий снимок и подменяет его целиком одним присваиванием: запрос, который уже взял
+    снимок, дочитывает его без блокировок. Снимок перестраивается в фоне, если каталог менялся
+    в этом процессе (поколение "products" в кэше) или он старше max_age (изменения из других процессов).
+    """
+
+    def __init__(self, max_age: float, chunk_size: int = 5000):
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.current: Optional[CatalogSnapshot] = None
+        self._refresh: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def build(self) -> CatalogSnapshot:
+        start = time.perf_counter()
+        snapshot = CatalogSnapshot()
+        # Поколение берем до чтения: запись во время построения сделает снимок устаревшим
+        snapshot.generation = await product_cache.generation("products")
+        # Сразу после записи в каталог реплика может отставать, тогда читаем с primary
+        with primary_only() if await product_cache.recently_written("products") else nullcontext():
+            async with read_session_factory() as session:
+                query = (
+                    select_product_rows()
+                    .order_by(ProductTable.id)
+                    .execution_options(yield_per=self.chunk_size)
+                )
+                result = await session.stream(query)
+                async for partition in result.partitions(self.chunk_size):
+                    for row in partition:
+                        snapshot.append(row)
+        snapshot.finish()
+        snapshot.build_time = time.perf_counter() - start
+        snapshot.built_at = time.monotonic()
+        return snapshot
+
+    async def refresh(self) -> CatalogSnapshot:
+        async with self._lock:
+            self.current = await self.build()
+        return self.current
+
+    async def _refresh_in_background(self):
+        try:
+            # Задача наследует контекст запроса, который мог уже писать в primary
+            with routing_scope():
+                await self.refresh()
+        except Exception:
+            # Остаемся на старом снимке, следующий запрос попробует снова
+            logger.exception("Не удалось перестроить снимок каталога")
+
+    async def get(self) -> CatalogSnapshot:
+        """Текущий снимок; устаревший отдается как есть, а новый строится в фоне"""
+        snapshot = self.current
+        if snapshot is None:
+            async with self._lock:
+                if self.current is None:
+                    self.current = await self.build()
+            return self.current
+        stale = (
+            time.monotonic() - snapshot.built_at > self.max_age
+            or await product_cache.generation("products") != snapshot.generation
+        )
+        if stale and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self._refresh_in_background())
+        return snapshot
+
+
+catalog_snapshot = CatalogSnapshotStore(settings.CATALOG_SNAPSHOT_MAX_AGE)
@@ -1,7 +1,24 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from passlib.context import CryptContext
+from pydantic import BaseModel
+from sqlalchemy import select, update
+
+from src.config import settings
+from src.database.dtos import UserGetDTO
+from src.database.models import UserTable
+from src.database.routing import read_session_factory, write_session_factory
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Хэши со стоимостью ниже BCRYPT_ROUNDS считаются устаревшими: needs_update() вернет True
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
 
 
 def get_password_hash(password: str) -> str:
@@ -9,4 +26,131 @@ def get_password_hash(password: str) -> str:
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class HasherStats(BaseModel):
+    workers: int
+    max_pending: int
+    queued: int
+    in_flight: int
+    completed: int
+    rehashed: int
+    wait_max_ms: float
+
+
+class PasswordHasher:
+    """
+    bcrypt на ограниченном пуле потоков (bcrypt отпускает GIL), чтобы не блокировать event loop.
+    Одновременно в очереди и в работе не больше max_pending вызовов, остальные ждут на семафоре.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rehashed = 0
+        self.wait_max = 0.0
+        self._executor: ThreadPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.wait_max = max(self.wait_max, time.perf_counter() - start)
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Второй элемент - новый хэш, если старый нужно пересчитать с текущей стоимостью"""
+        return await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def stats(self) -> HasherStats:
+        return HasherStats(
+            workers=self.workers,
+            max_pending=self.max_pending,
+            queued=self.queued,
+            in_flight=self.in_flight,
+            completed=self.completed,
+            rehashed=self.rehashed,
+            wait_max_ms=self.wait_max * 1000,
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._semaphore = None
+
+
+password_hasher = PasswordHasher(settings.HASH_WORKERS, settings.HASH_MAX_PENDING)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+# Хэш для несуществующего email: проверка занимает столько же, сколько для настоящего пользователя,
+# и время ответа не выдает, зарегистрирован ли адрес. Считается при первом неудачном логине, не при импорте
+_dummy_hash: str | None = None
+
+
+async def _verify_dummy(password: str):
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await password_hasher.hash("dummy-password-for-timing")
+    await password_hasher.verify(password, _dummy_hash)
+
+
+async def authenticate_user(email: str, password: str) -> UserGetDTO | None:
+    """
+    Проверка пароля при логине; устаревший хэш прозрачно пересчитывается и сохраняется.
+    Пользователь читается с реплики, primary нужен только для UPDATE пересчитанного хэша.
+    """
+    # Соединение не держим во время bcrypt: иначе всплеск логинов выберет весь пул
+    async with read_session_factory() as session:
+        user = await session.scalar(select(UserTable).where(UserTable.email == email))
+    if user is None:
+        await _verify_dummy(password)
+        return None
+
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not valid:
+        return None
+    if new_hash is not None:
+        async with write_session_factory() as session:
+            # Сравниваем со старым хэшем: пароль могли сменить, пока шла проверка
+            await session.execute(
+                update(UserTable)
+                .where(UserTable.id == user.id, UserTable.password_hash == user.password_hash)
+                .values(password_hash=new_hash)
+            )
+            await session.commit()
+        password_hasher.rehashed += 1
+    return UserGetDTO.model_validate(user)
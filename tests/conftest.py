@@ -0,0 +1,136 @@
+"""
+Тесты идут на временной SQLite (aiosqlite) или на MySQL из TEST_DATABASE_URL.
+Настройки читаются при импорте src, поэтому окружение задается до него.
+"""
+import itertools
+import os
+import tempfile
+
+_test_dir = tempfile.mkdtemp(prefix="shop-tests-")
+os.environ["DATABASE_URL_OVERRIDE"] = (
+    os.environ.get("TEST_DATABASE_URL") or f"sqlite+aiosqlite:///{_test_dir}/primary.db"
+)
+for name, value in {
+    "DB_HOST": "localhost", "DB_PORT": "3306", "DB_NAME": "shop", "DB_USER": "shop", "DB_PASS": "shop",
+    "WARMUP_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "SHED_ENABLED": "false",
+    "BCRYPT_ROUNDS": "4",
+    "CART_FLUSH_INTERVAL": "3600",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from src.database.database import async_engine, async_session_factory, metadata_for
+from src.database.dtos import ProductPostDTO
+from src.database.enums import UserRole
+from src.database.models import UserTable
+from src.database import routing
+from src.database.routing import router, create_replica_engine
+from src.main import create_fastapi_app
+from src.queries.cache import product_cache
+from src.queries.cart import cart_service, InMemoryCartStore
+from src.queries.category_tree import category_tree
+from src.queries.orm import ProductORM
+from src.queries.snapshot import catalog_snapshot
+
+pytest_plugins = ["src.database.pytest_plugin"]
+
+DIALECT = async_engine.dialect.name
+metadata = metadata_for(DIALECT)
+
+if DIALECT == "sqlite":
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        # Без этого SQLite не проверяет внешние ключи, и ошибки целостности не воспроизводятся
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+def pytest_collection_modifyitems(config, items):
+    if DIALECT == "mysql":
+        return
+    skip = pytest.mark.skip(reason="нужен MySQL: TEST_DATABASE_URL=mysql+asyncmy://...")
+    for item in items:
+        if "mysql" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+async def schema():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(metadata.drop_all)
+        await conn.run_sync(metadata.create_all)
+    yield
+    await router.dispose()
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def db(schema):
+    """Пустые таблицы и холодные кэши процесса на каждый тест"""
+    async with async_engine.begin() as conn:
+        for table in reversed(metadata.sorted_tables):
+            await conn.execute(table.delete())
+    product_cache.local.clear()
+    product_cache._primary_until.clear()
+    catalog_snapshot.current = None
+    category_tree.loaded_at = None
+    cart_service.store = InMemoryCartStore()
+    cart_service._dirty.clear()
+    cart_service._last_access.clear()
+    yield
+
+
+@pytest.fixture
+async def replicas(db, tmp_path, monkeypatch):
+    """Две пустые SQLite-реплики, которые "не догнали" primary: по их ответу видно, откуда шло чтение"""
+    engines = [create_replica_engine(f"sqlite+aiosqlite:///{tmp_path}/replica{idx}.db", f"replica{idx}") for idx in range(2)]
+    for engine in engines:
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata_for("sqlite").create_all)
+    monkeypatch.setattr(router, "replicas", engines)
+    monkeypatch.setattr(router, "_cycle", itertools.cycle(engines))
+    monkeypatch.setattr(router, "_factories", {engine: routing.async_sessionmaker(engine) for engine in engines})
+    yield engines
+    for engine in engines:
+        await engine.dispose()
+
+
+@pytest.fixture
+async def client(db):
+    app = create_fastapi_app(warmup=False)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+async def user(db) -> int:
+    async with async_session_factory() as session:
+        # Роль явно: server_default роли - значение enum, а SQLite хранит имена
+        user = UserTable(email="user@example.com", password_hash="-", role=UserRole.USER)
+        session.add(user)
+        await session.flush()
+        user_id = user.id
+        await session.commit()
+        return user_id
+
+
+@pytest.fixture
+def make_product(db):
+    """`await make_product(price=10.0, categories=[1])` - продукт через ProductORM, с инвалидацией кэшей"""
+    numbers = itertools.count(1)
+
+    async def make(price: float = 10.0, categories: list[int] = ()):
+        number = next(numbers)
+        return await ProductORM.insert_product(ProductPostDTO(
+            title=f"Product {number}",
+            description=f"Description {number}",
+            price=price,
+            sku=f"SKU-{number}",
+            categories=list(categories),
+        ))
+
+    return make
@@ -0,0 +1,65 @@
+from datetime import datetime, date
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from src.database.database import async_session_factory
+from src.database.enums import OrderStatus
+from src.database.models import OrderTable, OrderItemTable, product_categories
+from src.queries.analytics import SalesORM
+from src.queries.cache import product_cache
+from src.queries.orders import OrderORM
+
+DAY = datetime(2026, 3, 1, 12)
+
+
+async def test_revenue_is_exact_decimal(user, make_product):
+    product = await make_product(price=0.1)
+    async with async_session_factory() as session:
+        for order_id in range(1, 11):
+            session.add(OrderTable(id=order_id, user_id=user, status=OrderStatus.PAID, total_amount=0.3, order_date=DAY))
+            session.add(OrderItemTable(order_id=order_id, product_id=product.id, quantity=3, price_at_purchase=0.1))
+        await session.commit()
+
+    await SalesORM.rebuild()
+    days = await SalesORM.sales_by_day(date(2026, 3, 1), date(2026, 3, 1))
+    assert [(day.units, day.revenue) for day in days] == [(30, Decimal("3.00"))]
+
+    # Инкрементальное обновление при смене статуса дает тот же результат, что и перестройка
+    async with async_session_factory() as session:
+        await SalesORM.apply_order(session, 1, DAY, -1)
+        await session.commit()
+    await product_cache.invalidate(namespaces=["analytics"])
+    top = await SalesORM.top_products(date(2026, 3, 1), date(2026, 3, 1))
+    assert [(row.product_id, row.units, row.revenue, row.orders) for row in top] == [
+        (product.id, 27, Decimal("2.70"), 9),
+    ]
+
+
+async def test_cancel_subtracts_categories_credited_at_payment(client, user, make_product):
+    old, new = [(await client.post("/categories", json={"name": name})).json()["id"] for name in ("old", "new")]
+    product = await make_product(price=2.5, categories=[old])
+    async with async_session_factory() as session:
+        session.add(OrderTable(id=1, user_id=user, status=OrderStatus.PENDING, total_amount=5.0, order_date=DAY))
+        session.add(OrderItemTable(order_id=1, product_id=product.id, quantity=2, price_at_purchase=2.5))
+        await session.commit()
+
+    async def by_category():
+        rows = await SalesORM.sales_by_category(date(2026, 3, 1), date(2026, 3, 1))
+        return {row.category_id: (row.units, row.revenue, row.orders) for row in rows}
+
+    await OrderORM.set_status(1, OrderStatus.PAID)
+    assert await by_category() == {old: (2, Decimal("5.00"), 1)}
+
+    # Продукт перенесли в другую категорию уже после оплаты
+    async with async_session_factory() as session:
+        await session.execute(update(product_categories).values(category_id=new))
+        await session.commit()
+    # Перестройка сохраняет категории, в которые заказ попал при оплате
+    await SalesORM.rebuild()
+    assert await by_category() == {old: (2, Decimal("5.00"), 1)}
+
+    await OrderORM.set_status(1, OrderStatus.CANCELLED)
+    assert await by_category() == {old: (0, Decimal("0.00"), 0)}
+    await SalesORM.rebuild()
+    assert await by_category() == {}
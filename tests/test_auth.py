@@ -0,0 +1,45 @@
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+from src.database.database import async_session_factory
+from src.database.enums import UserRole
+from src.database.models import UserTable
+from src.users import auth
+from src.users.auth import password_hasher
+
+
+async def add_user(email: str, password: str):
+    async with async_session_factory() as session:
+        session.add(UserTable(email=email, password_hash=auth.pwd_context.hash(password), role=UserRole.USER))
+        await session.commit()
+
+
+async def test_login_upgrades_legacy_hash(client, monkeypatch):
+    await add_user("old@example.com", "secret")
+    # Стоимость подняли после регистрации: хэш с 4 раундами (BCRYPT_ROUNDS тестов) стал устаревшим
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5, bcrypt__min_rounds=5,
+    ))
+
+    rehashed = password_hasher.rehashed
+    response = await client.post("/auth/login", json={"email": "old@example.com", "password": "secret"})
+    assert response.status_code == 200
+    assert (response.json()["email"], response.json()["role"]) == ("old@example.com", UserRole.USER.value)
+    assert "password_hash" not in response.json()
+    assert password_hasher.rehashed == rehashed + 1
+
+    async with async_session_factory() as session:
+        stored = await session.scalar(select(UserTable.password_hash).where(UserTable.email == "old@example.com"))
+    assert stored.startswith("$2b$05$")
+    assert auth.pwd_context.verify("secret", stored)
+
+    # Пересчитанный хэш уже актуален: второй логин его не трогает
+    assert (await client.post("/auth/login", json={"email": "old@example.com", "password": "secret"})).status_code == 200
+    assert password_hasher.rehashed == rehashed + 1
+
+
+async def test_login_rejects_bad_credentials(client):
+    await add_user("user@example.com", "secret")
+    for email, password in (("old@example.com", "secret"), ("user@example.com", "wrong")):
+        response = await client.post("/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 401
@@ -0,0 +1,53 @@
+import asyncio
+
+from pydantic import TypeAdapter
+
+from src.queries.cache import InMemoryBackend, ProductCache
+
+ints = TypeAdapter(list[int])
+
+
+def worker_cache(backend: InMemoryBackend) -> ProductCache:
+    return ProductCache(max_size=100, ttl=60.0, backend=backend, primary_window=5.0)
+
+
+async def test_invalidation_in_other_process_hides_local_entries():
+    backend = InMemoryBackend()
+    first, second = worker_cache(backend), worker_cache(backend)
+    rows = [1, 2]
+
+    async def load():
+        return list(rows)
+
+    assert await second.get_or_load("products", "page", load, ints) == [1, 2]
+    rows.append(3)
+    await first.invalidate(namespaces=["products"])
+    # Локальная запись второго процесса лежит под старым поколением и больше не находится
+    assert await second.get_or_load("products", "page", load, ints) == [1, 2, 3]
+    assert await second.recently_written("products")
+
+
+async def test_load_racing_with_invalidation_is_not_cached():
+    cache = ProductCache(max_size=100, ttl=60.0)
+    loading = asyncio.Event()
+    release = asyncio.Event()
+    rows = [1]
+
+    async def slow_load():
+        snapshot = list(rows)
+        loading.set()
+        await release.wait()
+        return snapshot
+
+    stale = asyncio.create_task(cache.get_or_load("products", "page", slow_load, ints))
+    await loading.wait()
+    rows.append(2)
+    await cache.invalidate(namespaces=["products"])
+    release.set()
+    assert await stale == [1]
+
+    async def load():
+        return list(rows)
+
+    # Устаревший результат не попал в кэш под новым поколением
+    assert await cache.get_or_load("products", "page", load, ints) == [1, 2]
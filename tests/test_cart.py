@@ -0,0 +1,77 @@
+import asyncio
+
+from sqlalchemy import select, delete
+
+from src.database.database import async_session_factory
+from src.database.models import CartItemTable, ProductTable
+from src.queries.cart import cart_service
+
+
+async def cart_rows(user_id: int) -> list[tuple[int, int]]:
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(CartItemTable.product_id, CartItemTable.quantity)
+            .where(CartItemTable.user_id == user_id)
+            .order_by(CartItemTable.product_id)
+        )
+        return list(result.tuples())
+
+
+async def test_unknown_user_and_product(client, user, make_product):
+    product = await make_product()
+    assert (await client.get("/cart/999")).status_code == 404
+    response = await client.post("/cart/items", json={"user_id": 999, "product_id": product.id, "quantity": 1})
+    assert response.status_code == 404
+    response = await client.post("/cart/items", json={"user_id": user, "product_id": 999, "quantity": 1})
+    assert response.status_code == 404
+
+
+async def test_clicks_are_coalesced_into_one_row(client, user, make_product):
+    product = await make_product()
+    for _ in range(3):
+        response = await client.post("/cart/items", json={"user_id": user, "product_id": product.id, "quantity": 2})
+        assert response.status_code == 200
+    assert await cart_rows(user) == []
+
+    await cart_service.flush()
+    assert await cart_rows(user) == [(product.id, 6)]
+
+
+async def test_flush_drops_only_failing_rows(user, make_product):
+    kept = await make_product()
+    gone = await make_product()
+    await cart_service.add_item(user, kept.id, 1)
+    await cart_service.add_item(user, gone.id, 1)
+    # Продукт удален между кликом и сбросом: его строка нарушает внешний ключ
+    async with async_session_factory() as session:
+        await session.execute(delete(ProductTable).where(ProductTable.id == gone.id))
+        await session.commit()
+
+    dropped = cart_service.dropped_rows
+    await cart_service.flush()
+    assert await cart_rows(user) == [(kept.id, 1)]
+    assert cart_service.dropped_rows == dropped + 1
+    assert await cart_service.get_cart(user) == {kept.id: 1}
+
+
+async def test_stop_flushes_and_waits_for_task(user, make_product):
+    product = await make_product()
+    await cart_service.add_item(user, product.id, 3)
+    task = cart_service._task
+    assert task is not None
+
+    await cart_service.stop()
+    assert task.done()
+    assert cart_service._task is None
+    assert await cart_rows(user) == [(product.id, 3)]
+
+
+async def test_concurrent_clicks_on_cold_cart(user, make_product):
+    products = [await make_product() for _ in range(5)]
+    # Все клики приходят, пока корзины еще нет в store: каждый сам грузил бы ее из БД
+    await asyncio.gather(*(cart_service.add_item(user, product.id, 1) for product in products * 2))
+    expected = {product.id: 2 for product in products}
+    assert await cart_service.get_cart(user) == expected
+
+    await cart_service.flush()
+    assert dict(await cart_rows(user)) == expected
@@ -0,0 +1,27 @@
+async def test_parent_cycle_is_rejected(client):
+    root = (await client.post("/categories", json={"name": "root"})).json()
+    child = (await client.post("/categories", json={"name": "child", "parent_category_id": root["id"]})).json()
+    grandchild = (await client.post("/categories", json={"name": "grandchild", "parent_category_id": child["id"]})).json()
+
+    response = await client.put(f"/categories/{root['id']}", json={"name": "root", "parent_category_id": grandchild["id"]})
+    assert response.status_code == 400
+    response = await client.put(f"/categories/{root['id']}", json={"name": "root", "parent_category_id": root["id"]})
+    assert response.status_code == 400
+
+    breadcrumbs = (await client.get(f"/categories/{grandchild['id']}/breadcrumbs")).json()
+    assert [category["name"] for category in breadcrumbs] == ["root", "child", "grandchild"]
+
+
+async def test_missing_parent_and_duplicate_name(client):
+    response = await client.post("/categories", json={"name": "orphan", "parent_category_id": 999})
+    assert response.status_code == 404
+
+    category = (await client.post("/categories", json={"name": "books"})).json()
+    assert (await client.post("/categories", json={"name": "books"})).status_code == 409
+    response = await client.put(f"/categories/{category['id']}", json={"name": "books", "parent_category_id": 999})
+    assert response.status_code == 404
+
+    other = (await client.post("/categories", json={"name": "music"})).json()
+    response = await client.put(f"/categories/{other['id']}", json={"name": "books"})
+    assert response.status_code == 409
+    assert (await client.put("/categories/999", json={"name": "nothing"})).status_code == 404
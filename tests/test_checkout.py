@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, func
+
+from src.database.database import async_session_factory
+from src.database.dtos import CheckoutPostDTO
+from src.database.enums import UserRole, PaymentMethod
+from src.database.models import UserTable, CartItemTable, OrderTable, OrderItemTable, PaymentTable
+from src.queries.cart import cart_service
+from src.queries.orders import OrderORM, CheckoutError
+
+USERS = 20
+PER_USER = 5
+PRICES = [10.0, 2.5, 7.25]
+
+
+@pytest.fixture
+async def carts(db, make_product) -> dict[int, float]:
+    """USERS пользователей с тремя позициями в корзине; user_id -> ожидаемая сумма заказа"""
+    products = [await make_product(price=price) for price in PRICES]
+    async with async_session_factory() as session:
+        users = [
+            UserTable(email=f"user{idx}@example.com", password_hash="-", role=UserRole.USER)
+            for idx in range(USERS)
+        ]
+        session.add_all(users)
+        await session.flush()
+        user_ids = [user.id for user in users]
+        await session.execute(CartItemTable.__table__.insert(), [
+            {"user_id": user_id, "product_id": product.id, "quantity": quantity}
+            for user_id in user_ids for quantity, product in enumerate(products, start=1)
+        ])
+        await session.commit()
+    total = round(sum(quantity * price for quantity, price in enumerate(PRICES, start=1)), 2)
+    return {user_id: total for user_id in user_ids}
+
+
+async def checkout(user_id: int):
+    return await OrderORM.checkout(CheckoutPostDTO(user_id=user_id, payment_method=PaymentMethod.CARD))
+
+
+async def test_checkout_moves_cart_to_order(carts):
+    user_id, total = next(iter(carts.items()))
+    order = await checkout(user_id)
+    assert order.total_amount == total
+    assert len(order.items) == len(PRICES)
+    with pytest.raises(CheckoutError, match="Корзина пуста"):
+        await checkout(user_id)
+    with pytest.raises(CheckoutError, match="Пользователь не найден"):
+        await checkout(max(carts) + 1000)
+
+
+async def test_click_during_checkout_is_kept(carts, make_product, monkeypatch):
+    user_id = next(iter(carts))
+    extra = await make_product(price=1.0)
+    started = asyncio.Event()
+    checkout_once = OrderORM._checkout
+
+    async def slow_checkout(checkout_data):
+        order = await checkout_once(checkout_data)
+        started.set()
+        await asyncio.sleep(0.05)
+        return order
+
+    monkeypatch.setattr(OrderORM, "_checkout", slow_checkout)
+    order = asyncio.create_task(checkout(user_id))
+    await started.wait()
+    # Клик после commit заказа, но до того, как checkout забыл корзину в памяти
+    await cart_service.add_item(user_id, extra.id, 1)
+
+    assert len((await order).items) == len(PRICES)
+    assert await cart_service.get_cart(user_id) == {extra.id: 1}
+
+
+@pytest.mark.mysql
+async def test_concurrent_checkouts_create_one_order_per_user(carts):
+    # Сценарий checkout_stress из benchmarks.micro: несколько одновременных checkout на каждого пользователя
+    calls = [user_id for user_id in carts for _ in range(PER_USER)]
+    results = await asyncio.gather(*(checkout(user_id) for user_id in calls), return_exceptions=True)
+
+    errors = [result for result in results if isinstance(result, Exception) and not isinstance(result, CheckoutError)]
+    assert not errors
+    assert all(str(result) == "Корзина пуста" for result in results if isinstance(result, CheckoutError))
+    succeeded = [user_id for user_id, result in zip(calls, results) if not isinstance(result, Exception)]
+    assert sorted(succeeded) == sorted(carts)
+
+    async with async_session_factory() as session:
+        orders = dict((await session.execute(select(OrderTable.user_id, OrderTable.total_amount))).tuples().all())
+        assert orders == carts
+        assert await session.scalar(select(func.count()).select_from(OrderTable)) == USERS
+
+        items = (await session.execute(
+            select(
+                OrderItemTable.order_id,
+                func.count(),
+                func.sum(OrderItemTable.quantity * OrderItemTable.price_at_purchase),
+            )
+            .group_by(OrderItemTable.order_id)
+        )).tuples().all()
+        assert len(items) == USERS
+        assert all(count == len(PRICES) for _, count, _ in items)
+        amounts = dict((await session.execute(select(OrderTable.id, OrderTable.total_amount))).tuples().all())
+        assert {order_id: round(total, 2) for order_id, _, total in items} == amounts
+
+        payments = dict((await session.execute(select(PaymentTable.order_id, PaymentTable.amount))).tuples().all())
+        assert payments == amounts
+        assert await session.scalar(select(func.count()).select_from(CartItemTable)) == 0
@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+async def test_vary_on_every_compressible_response(client, make_product, accept_encoding):
+    headers = {"Accept-Encoding": accept_encoding}
+    for _ in range(20):
+        await make_product()
+    large = await client.get("/products", headers=headers)
+    assert large.headers.get("content-encoding") == (accept_encoding if accept_encoding == "gzip" else None)
+    assert large.headers["vary"] == "Accept-Encoding"
+
+    # Меньше COMPRESSION_MIN_SIZE - отдается как есть
+    small = await client.get("/products", params={"limit": 1}, headers=headers)
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+
+    not_modified = await client.get("/products", headers={**headers, "If-None-Match": large.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["vary"] == "Accept-Encoding"
@@ -0,0 +1,57 @@
+import httpx
+import pytest
+from sqlalchemy import event
+
+from src.config import settings
+from src.database.database import async_engine
+from src.instrumentation import _after_cursor_execute
+from src.main import create_fastapi_app
+
+
+@pytest.fixture
+def instrumented(db, monkeypatch):
+    monkeypatch.setattr(settings, "INSTRUMENTATION_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "secret")
+
+    async def make():
+        app = create_fastapi_app(warmup=False)
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    return make
+
+
+def metric(text: str, name: str, route: str) -> float:
+    prefix = f'{name}{{method="GET",route="{route}"}} '
+    return next(float(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix))
+
+
+async def test_rows_are_counted_from_the_result(instrumented, make_product):
+    for _ in range(3):
+        await make_product()
+    # Второе приложение в том же процессе не должно удваивать слушатели общего engine
+    create_fastapi_app(warmup=False)
+    async with await instrumented() as client:
+        assert len((await client.get("/products")).json()) == 3
+        text = (await client.get("/metrics")).text
+    assert metric(text, "db_rows_total", "/products") >= 3
+    listeners = list(async_engine.sync_engine.dispatch.after_cursor_execute)
+    assert listeners.count(_after_cursor_execute) == 1
+
+
+async def test_replica_queries_are_counted(instrumented, replicas):
+    async with await instrumented() as client:
+        await client.get("/products")
+        text = (await client.get("/metrics")).text
+    for engine in replicas:
+        assert event.contains(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    # Чтение ушло на пустую реплику: запросы учтены, хотя primary их не видел
+    assert metric(text, "db_queries_total", "/products") > 0
+
+
+async def test_profiler_requires_admin_key(instrumented):
+    async with await instrumented() as client:
+        assert (await client.post("/debug/profiler", params={"enabled": "true"})).status_code == 403
+        response = await client.post(
+            "/debug/profiler", params={"enabled": "false"}, headers={"X-Admin-Key": "secret"},
+        )
+        assert response.json() == {"enabled": False}
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime
+
+from src.database.dtos import JobDTO
+from src.database.enums import JobStatus
+from src.queries.jobs import JobQueue, DatabaseJobStore, InMemoryJobStore
+
+
+def queue(store, lease: float = 0.3, **options) -> JobQueue:
+    return JobQueue(
+        store, workers=3, max_attempts=3, retry_base=0.01, retry_max=0.05, poll_interval=0.05, lease=lease, **options,
+    )
+
+
+async def test_lease_is_renewed_while_handler_runs(db):
+    jobs = queue(DatabaseJobStore())
+    runs = []
+
+    @jobs.register("slow")
+    async def slow(payload):
+        runs.append(payload)
+        # В несколько раз дольше аренды: без продления задачу забрал бы второй воркер
+        await asyncio.sleep(1.0)
+
+    job = await jobs.enqueue("slow", {"n": 1})
+    for _ in range(40):
+        await asyncio.sleep(0.05)
+        if (await jobs.store.get(job.id)).status == JobStatus.DONE:
+            break
+    await jobs.drain(1.0)
+
+    stored = await jobs.store.get(job.id)
+    assert (stored.status, stored.attempts) == (JobStatus.DONE, 1)
+    assert runs == [{"n": 1}]
+
+
+async def test_lost_lease_is_not_extended(db):
+    store = DatabaseJobStore()
+    await store.add(JobDTO(
+        id="job", name="noop", payload={}, status=JobStatus.QUEUED, max_attempts=3, run_at=datetime.now(),
+    ))
+
+    job = await store.claim(lease=-1)
+    assert await store.extend(job, -1)
+    # Истекшую аренду забрал другой воркер: номер попытки вырос, старый воркер ее не продлит
+    taken = await store.claim(lease=60)
+    assert taken.attempts == job.attempts + 1
+    assert not await store.extend(job, 60)
+    assert await store.extend(taken, 60)
+    assert await store.claim(lease=60) is None
+
+
+async def test_late_result_of_lost_lease_is_dropped(db):
+    store = DatabaseJobStore()
+    await store.add(JobDTO(
+        id="job", name="noop", payload={}, status=JobStatus.QUEUED, max_attempts=3, run_at=datetime.now(),
+    ))
+
+    stale = await store.claim(lease=-1)
+    taken = await store.claim(lease=60)
+    # Опоздавший воркер не может ни завершить, ни вернуть в очередь, ни провалить чужой запуск
+    await store.complete(stale)
+    await store.retry(stale, datetime.now(), "late")
+    await store.fail(stale, "late")
+    stored = await store.get("job")
+    assert (stored.status, stored.attempts, stored.last_error) == (JobStatus.RUNNING, taken.attempts, None)
+
+    await store.complete(taken)
+    assert (await store.get("job")).status == JobStatus.DONE
+
+
+async def test_finished_jobs_are_purged(db):
+    for store in (DatabaseJobStore(), InMemoryJobStore()):
+        jobs = queue(store, retention=60.0, purge_interval=0.0)
+        jobs.register("noop")(lambda payload: asyncio.sleep(0))
+        old = await jobs.enqueue("noop", key="old", delay=-3600)
+        fresh = await jobs.enqueue("noop", key="fresh")
+        await asyncio.sleep(0.3)
+        await jobs.drain(1.0)
+
+        assert await store.get(old.id) is None
+        assert (await store.get(fresh.id)).status == JobStatus.DONE
+        # Ключ идемпотентности удаленной задачи снова свободен
+        again = await jobs.enqueue("noop", key="old")
+        assert again.id != old.id
+        await jobs.drain(1.0)
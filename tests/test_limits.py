@@ -0,0 +1,59 @@
+import pytest
+
+from src.api import limits
+from src.api.limits import (
+    Client, InMemoryRateLimitBackend, RateLimiter, RateLimitMiddleware, create_rate_limit_backend, parse_route_limits,
+)
+from src.database.enums import UserRole
+
+
+def middleware(proxy_hops: int) -> RateLimitMiddleware:
+    return RateLimitMiddleware(
+        None, limiter=None, shedder=None, exempt=[], admin_key="secret", proxy_hops=proxy_hops, retry_after=1.0,
+    )
+
+
+def scope(forwarded: str | None = None, admin_key: str | None = None) -> dict:
+    headers = []
+    if forwarded is not None:
+        headers.append((b"x-forwarded-for", forwarded.encode()))
+    if admin_key is not None:
+        headers.append((b"x-admin-key", admin_key.encode()))
+    return {"type": "http", "headers": headers, "client": ("10.0.0.1", 5000)}
+
+
+async def test_route_refusal_does_not_charge_global_bucket():
+    limiter = RateLimiter(
+        InMemoryRateLimitBackend(), rate=0.001, burst=3,
+        routes=parse_route_limits({"GET /products/stream": (0.001, 1)}),
+    )
+    client = Client("ip:1.2.3.4", UserRole.USER)
+    assert [await limiter.check(client, "GET", "/products/stream") > 0 for _ in range(3)] == [False, True, True]
+    # Два отказа по маршруту не списали общие токены: из трех остались два
+    assert [await limiter.check(client, "GET", "/products") > 0 for _ in range(3)] == [False, False, True]
+    assert limiter.limited == {"GET /products/stream": 2, "*": 1}
+
+
+def test_forwarded_for_uses_rightmost_untrusted_entry():
+    assert middleware(0).identify(scope("6.6.6.6")).key == "ip:10.0.0.1"
+    assert middleware(1).identify(scope("6.6.6.6, 1.2.3.4")).key == "ip:1.2.3.4"
+    assert middleware(2).identify(scope("6.6.6.6, 1.2.3.4, 10.0.0.2")).key == "ip:1.2.3.4"
+    assert middleware(2).identify(scope("1.2.3.4")).key == "ip:1.2.3.4"
+    assert middleware(1).identify(scope()).key == "ip:10.0.0.1"
+
+
+def test_admin_key():
+    assert middleware(0).identify(scope(admin_key="secret")).role == UserRole.ADMIN
+    assert middleware(0).identify(scope(admin_key="wrong")).role == UserRole.USER
+
+
+def test_misconfigured_backend_fails_loudly(monkeypatch):
+    monkeypatch.setattr(limits.settings, "RATE_LIMIT_BACKEND", "redis")
+    with pytest.raises(ValueError):
+        create_rate_limit_backend()
+    monkeypatch.setattr(limits.settings, "RATE_LIMIT_BACKEND", "cache")
+    monkeypatch.setattr(limits.product_cache, "backend", None)
+    with pytest.raises(ValueError):
+        create_rate_limit_backend()
+    monkeypatch.setattr(limits.settings, "RATE_LIMIT_BACKEND", "memory")
+    assert isinstance(create_rate_limit_backend(), InMemoryRateLimitBackend)
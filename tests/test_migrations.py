@@ -0,0 +1,18 @@
+import io
+import re
+
+from alembic import command
+from alembic.config import Config
+
+from src.database.database import Base
+
+
+def test_migrations_create_every_table_from_empty_database():
+    # Offline-режим: цепочка ревизий от пустой БД до head рендерится в SQL для MySQL без подключения
+    output = io.StringIO()
+    config = Config(output_buffer=output)
+    config.set_main_option("script_location", "src/migrations")
+    command.upgrade(config, "head", sql=True)
+
+    created = set(re.findall(r"^CREATE TABLE (\w+)", output.getvalue(), re.MULTILINE))
+    assert created == set(Base.metadata.tables) | {"alembic_version"}
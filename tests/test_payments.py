@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from benchmarks.fake_provider import FakePaymentProvider
+from src.database.database import async_session_factory
+from src.database.dtos import PaymentWebhookDTO
+from src.database.enums import OrderStatus, PaymentStatus, PaymentMethod, WebhookOutcome
+from src.database.models import OrderTable, PaymentTable
+from src.queries.payments import PaymentIngestor
+
+
+@pytest.fixture
+async def payments(user) -> list[int]:
+    ids = list(range(1, 21))
+    async with async_session_factory() as session:
+        await session.execute(OrderTable.__table__.insert(), [
+            {"id": idx, "user_id": user, "status": OrderStatus.PENDING, "total_amount": 100.0} for idx in ids
+        ])
+        await session.execute(PaymentTable.__table__.insert(), [
+            {"id": idx, "order_id": idx, "amount": 100.0, "status": PaymentStatus.PENDING,
+             "payment_method": PaymentMethod.CARD} for idx in ids
+        ])
+        await session.commit()
+    return ids
+
+
+class FlakyIngestor(PaymentIngestor):
+    """Любая транзакция с событием "broken" падает"""
+
+    async def _apply(self, events):
+        if any(event.transaction_id == "broken" for event in events):
+            raise RuntimeError("broken event")
+        return await super()._apply(events)
+
+
+def webhook(transaction_id: str, payment_id: int, status=PaymentStatus.SUCCESS) -> PaymentWebhookDTO:
+    return PaymentWebhookDTO(transaction_id=transaction_id, payment_id=payment_id, status=status, amount=100.0)
+
+
+async def test_failed_batch_is_applied_per_event(payments):
+    ingestor = FlakyIngestor(max_batch=10, max_delay=0.05)
+    results = await asyncio.gather(
+        ingestor.submit(webhook("tx-1", 1)),
+        ingestor.submit(webhook("broken", 2)),
+        ingestor.submit(webhook("tx-1", 1)),
+        ingestor.submit(webhook("tx-404", 404)),
+        return_exceptions=True,
+    )
+    assert results[0] == WebhookOutcome.APPLIED
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == WebhookOutcome.DUPLICATE
+    assert results[3] == WebhookOutcome.UNKNOWN_PAYMENT
+
+    async with async_session_factory() as session:
+        statuses = dict((await session.execute(
+            select(PaymentTable.id, PaymentTable.status).where(PaymentTable.id.in_([1, 2]))
+        )).tuples().all())
+    assert statuses == {1: PaymentStatus.SUCCESS, 2: PaymentStatus.PENDING}
+
+
+async def test_webhook_flood_is_applied_exactly_once(client, payments):
+    provider = FakePaymentProvider(client, duplicates=3, fail_ratio=0.3, retry_ratio=0.5, seed=7)
+    deliveries, expected = provider.plan([(idx, 100.0) for idx in payments])
+    codes, _, undelivered = await provider.deliver(deliveries, concurrency=8)
+    assert not undelivered
+    assert set(codes) == {200}
+
+    async with async_session_factory() as session:
+        statuses = dict((await session.execute(select(PaymentTable.id, PaymentTable.status))).tuples().all())
+        paid = set(await session.scalars(select(OrderTable.id).where(OrderTable.status == OrderStatus.PAID)))
+    assert statuses == expected
+    assert paid == {idx for idx, status in expected.items() if status == PaymentStatus.SUCCESS}
+
+
+async def test_webhook_validation(client, payments):
+    body = {"transaction_id": "x" * 256, "payment_id": 1, "status": "success", "amount": 100.0}
+    assert (await client.post("/webhooks/payments", json=body)).status_code == 422
+    body["transaction_id"] = "tx-1"
+    assert (await client.post("/webhooks/payments", json=body)).status_code == 200
+    body["payment_id"] = 404
+    assert (await client.post("/webhooks/payments", json=body)).status_code == 404
@@ -0,0 +1,72 @@
+from src.database.dtos import CategoryCreateDTO, ProductPostDTO
+from src.database.enums import BulkItemStatus
+from src.queries.cache import product_cache
+from src.queries.orm import ProductORM, CategoryORM
+
+
+async def test_products_page_query_budget(make_product, query_budget):
+    for _ in range(5):
+        await make_product()
+    product_cache.local.clear()
+
+    # Продукты и их категории - одним запросом, без догрузки по строке
+    with query_budget(1):
+        page = await ProductORM.select_products_page(limit=10)
+    assert [product.title for product in page] == [f"Product {number}" for number in range(1, 6)]
+
+    with query_budget(0):
+        assert await ProductORM.select_products_page(limit=10) == page
+
+
+async def test_products_page_keyset(make_product):
+    products = [await make_product() for _ in range(5)]
+    first = await ProductORM.select_products_page(limit=2)
+    second = await ProductORM.select_products_page(limit=2, after=first[-1].id)
+    assert [product.id for product in first + second] == [product.id for product in products[:4]]
+
+
+async def test_subtree_products_without_n_plus_one(make_product, query_counter):
+    root = await CategoryORM.insert_category(CategoryCreateDTO(name="root"))
+    child = await CategoryORM.insert_category(CategoryCreateDTO(name="child", parent_category_id=root.id))
+    in_root = await make_product(categories=[root.id])
+    in_child = await make_product(categories=[child.id])
+    await make_product()
+
+    products = await CategoryORM.select_subtree_products(root.id)
+    assert [product.id for product in products] == [in_root.id, in_child.id]
+    assert [product.id for product in await CategoryORM.select_subtree_products(child.id)] == [in_child.id]
+    assert query_counter.count > 0
+
+
+async def test_conditional_get(client, make_product):
+    await make_product()
+    response = await client.get("/products")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "last-modified" in response.headers
+
+    response = await client.get("/products", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Запись сбрасывает поколение products, поэтому старый ETag больше не подходит
+    await make_product()
+    response = await client.get("/products", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
+
+
+async def test_bulk_upsert_reports_unknown_categories(db):
+    category = await CategoryORM.insert_category(CategoryCreateDTO(name="root"))
+    missing = category.id + 100
+    results = await ProductORM.bulk_upsert_products([
+        ProductPostDTO(title="Lamp", description="", price=1.0, sku="LAMP", categories=[category.id]),
+        ProductPostDTO(title="Desk", description="", price=1.0, sku="DESK", categories=[category.id, missing]),
+    ])
+
+    assert [(result.sku, result.status) for result in results] == [
+        ("LAMP", BulkItemStatus.CREATED), ("DESK", BulkItemStatus.ERROR),
+    ]
+    assert results[1].error == f"Категории не найдены: {missing}"
+    assert [product.sku for product in await CategoryORM.select_subtree_products(category.id)] == ["LAMP"]
+    assert [product.sku for product in await ProductORM.select_products_page(limit=10)] == ["LAMP"]
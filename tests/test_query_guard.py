@@ -0,0 +1,56 @@
+import httpx
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from src.database.database import async_engine
+from src.database.query_guard import (
+    QueryGuardMiddleware, current_counter, install_query_guard, enable_raise_on_sql, count_queries,
+    _count_statement, _add_raiseload,
+)
+from src.database.routing import write_session_factory
+
+
+def endpoint(queries: int, chunks: int = 1):
+    async def app(scope, receive, send):
+        for _ in range(queries):
+            current_counter.get().record("SELECT * FROM reviews WHERE product_id = 1")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for idx in range(chunks):
+            await send({"type": "http.response.body", "body": b"ok", "more_body": idx < chunks - 1})
+    return app
+
+
+async def call(app) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get("/")
+
+
+async def test_strict_guard_fails_the_response():
+    assert (await call(QueryGuardMiddleware(endpoint(2), threshold=5, strict=True))).status_code == 200
+    response = await call(QueryGuardMiddleware(endpoint(5), threshold=5, strict=True))
+    assert response.status_code == 500
+    assert "N+1" in response.json()["detail"]
+    # Без strict нарушение только в логе, ответ не меняется
+    assert (await call(QueryGuardMiddleware(endpoint(5), threshold=5, strict=False))).status_code == 200
+
+
+async def test_strict_guard_aborts_started_stream():
+    with pytest.raises(Exception, match="N\\+1"):
+        await call(QueryGuardMiddleware(endpoint(5, chunks=3), threshold=5, strict=True))
+
+
+async def test_listeners_are_installed_once(db):
+    # Как при создании приложения в каждом тесте
+    for _ in range(3):
+        install_query_guard(async_engine.sync_engine)
+        enable_raise_on_sql()
+    try:
+        with count_queries() as counter:
+            async with write_session_factory() as session:
+                await session.execute(text("SELECT 1"))
+        assert counter.count == 1
+    finally:
+        # raiseload на всех сессиях не должен протечь в остальные тесты
+        event.remove(Session, "do_orm_execute", _add_raiseload)
+    assert event.contains(async_engine.sync_engine, "before_cursor_execute", _count_statement)
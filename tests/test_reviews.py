@@ -0,0 +1,102 @@
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from src.database.database import async_session_factory
+from src.database.dtos import ReviewGetDTO
+from src.database.enums import JobStatus
+from src.database.models import ReviewOrm
+from src.queries.jobs import job_queue
+from src.queries.reviews import ReviewORM, ratings
+
+
+async def test_rating_avg_is_exact(client, user, make_product):
+    product = await make_product()
+    review_ids = []
+    for rating in (5, 4, 4):
+        response = await client.post("/reviews", json={"user_id": user, "product_id": product.id, "rating": rating})
+        assert response.status_code == 200
+        review_ids.append(response.json()["id"])
+
+    rated = (await client.get(f"/products/{product.id}")).json()
+    assert (rated["rating_avg"], rated["rating_count"]) == (4.33, 3)
+
+    await client.delete(f"/reviews/{review_ids[0]}")
+    rated = (await client.get(f"/products/{product.id}")).json()
+    assert (rated["rating_avg"], rated["rating_count"]) == (4.0, 2)
+
+
+async def test_bad_reviews(client, user, make_product):
+    product = await make_product()
+    response = await client.post("/reviews", json={"user_id": user, "product_id": 999, "rating": 5})
+    assert response.status_code == 404
+    response = await client.post("/reviews", json={"user_id": 999, "product_id": product.id, "rating": 5})
+    assert response.status_code == 404
+    for rating in (0, 6):
+        response = await client.post("/reviews", json={"user_id": user, "product_id": product.id, "rating": rating})
+        assert response.status_code == 422
+
+
+async def test_top_rated_cursor_through_ties(user, make_product):
+    products = [await make_product() for _ in range(4)]
+    for product, ratings in zip(products, ([5, 4, 4], [5, 4, 4], [5], [3])):
+        for rating in ratings:
+            await ReviewORM.insert_review(ReviewGetDTO(user_id=user, product_id=product.id, rating=rating))
+
+    seen = []
+    after_rating = after_id = None
+    while page := await ReviewORM.select_top_rated(limit=1, after_rating=after_rating, after_id=after_id):
+        seen.append(page[0].id)
+        # Курсор приходит из JSON как float: 4.33 должен совпасть с DECIMAL(3, 2) точно
+        after_rating, after_id = Decimal(str(page[0].rating_avg)), page[0].id
+    assert seen == [products[2].id, products[1].id, products[0].id, products[3].id]
+
+
+async def test_top_rated_next_cursor_header(client, user, make_product):
+    products = [await make_product() for _ in range(3)]
+    for product, rating in zip(products, (4, 5, 4)):
+        await ReviewORM.insert_review(ReviewGetDTO(user_id=user, product_id=product.id, rating=rating))
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = await client.get("/products/top-rated", params=params)
+        seen.extend(product["id"] for product in response.json())
+        if "X-Next-After" not in response.headers:
+            break
+        params = {
+            "limit": 2,
+            "after_rating": response.headers["X-Next-After-Rating"],
+            "after_id": response.headers["X-Next-After"],
+        }
+    assert seen == [products[1].id, products[2].id, products[0].id]
+
+
+async def test_rebuild_ratings_job(client, user, make_product):
+    rated, orphan = await make_product(), await make_product()
+    for rating in (5, 4, 4):
+        await ReviewORM.insert_review(ReviewGetDTO(user_id=user, product_id=rated.id, rating=rating))
+    await ReviewORM.insert_review(ReviewGetDTO(user_id=user, product_id=orphan.id, rating=1))
+    # Агрегаты разошлись с reviews: у одного продукта неверные суммы, у другого отзывов уже нет
+    async with async_session_factory() as session:
+        await session.execute(update(ratings).where(ratings.c.product_id == rated.id).values(
+            rating_sum=1, rating_count=1, rating_avg=1,
+        ))
+        await session.execute(ReviewOrm.__table__.delete().where(ReviewOrm.product_id == orphan.id))
+        await session.commit()
+
+    response = await client.post("/reviews/rebuild-ratings")
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    for _ in range(40):
+        if (await job_queue.get(job_id)).status == JobStatus.DONE:
+            break
+        await asyncio.sleep(0.05)
+    await job_queue.drain(1.0)
+    assert (await job_queue.get(job_id)).status == JobStatus.DONE
+
+    product = (await client.get(f"/products/{rated.id}")).json()
+    assert (product["rating_avg"], product["rating_count"]) == (4.33, 3)
+    product = (await client.get(f"/products/{orphan.id}")).json()
+    assert product["rating_count"] == 0
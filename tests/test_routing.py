@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.database.database import async_engine
+from src.database.routing import ReplicaRouter, primary_only, router, routing_scope, stick_to_primary
+from src.queries.cache import product_cache
+from src.queries.jobs import JobQueue, InMemoryJobStore
+from src.queries.orm import ProductORM
+
+
+async def in_new_context(coro_factory):
+    # Задача получает копию контекста: stick_to_primary внутри нее не влияет на тест
+    return await asyncio.create_task(coro_factory())
+
+
+def pick(balancer: ReplicaRouter = router):
+    async def picked():
+        return balancer.pick()
+    return picked
+
+
+async def test_reads_go_to_replicas_round_robin(replicas):
+    picks = [await in_new_context(pick()) for _ in range(4)]
+    assert picks == [replicas[0], replicas[1], replicas[0], replicas[1]]
+
+
+async def test_primary_only_and_write_stickiness(replicas):
+    async def inside_primary_only():
+        with primary_only():
+            return router.pick()
+
+    async def after_write():
+        before = router.pick()
+        async with router.write_session():
+            pass
+        return before, router.pick()
+
+    assert await in_new_context(inside_primary_only) is async_engine
+    assert await in_new_context(after_write) == (replicas[0], async_engine)
+    # Прилипание к primary не протекает в другие запросы
+    assert await in_new_context(pick()) is replicas[1]
+
+
+async def test_least_connections_and_unknown_strategy(replicas):
+    balancer = ReplicaRouter(async_engine, replicas, strategy="least_connections")
+    async with replicas[0].connect():
+        assert await in_new_context(pick(balancer)) is replicas[1]
+    with pytest.raises(ValueError):
+        ReplicaRouter(async_engine, replicas, strategy="random")
+
+
+async def test_least_connections_without_pool_counters(tmp_path):
+    # У NullPool нет checkedout(): балансировщик уходит на круг, а не падает
+    engines = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/n{idx}.db", poolclass=NullPool) for idx in range(2)]
+    balancer = ReplicaRouter(async_engine, engines, strategy="least_connections")
+    assert [await in_new_context(pick(balancer)) for _ in range(3)] == [engines[0], engines[1], engines[0]]
+
+
+async def test_write_stickiness_ends_with_request(client, replicas):
+    # ASGITransport выполняет приложение в контексте теста: без области на запрос флаг остался бы здесь
+    assert (await client.post("/categories", json={"name": "books"})).status_code == 200
+    assert router.pick() in replicas
+
+
+async def test_background_task_does_not_inherit_stickiness(replicas):
+    jobs = JobQueue(InMemoryJobStore(), workers=1, max_attempts=1, retry_base=0.01, retry_max=0.01,
+                    poll_interval=0.05, lease=1.0)
+    picked = []
+    jobs.register("read")(lambda payload: asyncio.sleep(0, picked.append(router.pick())))
+
+    async def enqueue_after_write():
+        # Воркер создается здесь и наследует контекст, в котором уже была запись
+        stick_to_primary()
+        await jobs.enqueue("read", durable=False)
+        with routing_scope():
+            assert router.pick() in replicas
+        assert router.pick() is async_engine
+
+    await in_new_context(enqueue_after_write)
+    await asyncio.sleep(0.1)
+    await jobs.drain(1.0)
+    assert picked and picked[0] in replicas
+
+
+async def test_cache_miss_after_write_reads_primary(replicas, make_product, monkeypatch):
+    monkeypatch.setattr(product_cache, "primary_window", 0.0)
+    await in_new_context(make_product)
+    # Без окна промах кэша читает отставшую реплику и кэширует ее пустой ответ под новым поколением
+    assert await in_new_context(ProductORM.select_products_page) == []
+
+    monkeypatch.setattr(product_cache, "primary_window", 5.0)
+    product = await in_new_context(make_product)
+    page = await in_new_context(ProductORM.select_products_page)
+    assert product.id in [item.id for item in page]
+    assert await product_cache.recently_written("products")
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from src.database.dtos import ProductGetDTO, ProductPostDTO
+from src.queries.search import SearchIndex
+
+
+def product(title: str, sku: str = "SKU") -> ProductPostDTO:
+    return ProductPostDTO(title=title, description="", price=1.0, sku=sku)
+
+
+def test_prefix_terms_follow_bulk_changes():
+    index = SearchIndex()
+    for product_id, title in enumerate(["lamp", "laptop", "ladder", "table"], start=1):
+        index.add(product_id, product(title))
+    assert index.expand_prefix("la") == ["ladder", "lamp", "laptop"]
+
+    index.remove(2)
+    index.add(5, product("label"))
+    index.add(6, product("laser"))
+    index.remove(6)
+    index.add(1, product("lantern"))
+    assert index.expand_prefix("la") == ["label", "ladder", "lantern"]
+
+    # Термин удален и вернулся до слияния - не дублируется
+    index.remove(5)
+    index.add(7, product("label"))
+    assert index.expand_prefix("lab") == ["label"]
+    assert index.sorted_terms() == sorted(index.postings)
+    assert [doc_id for doc_id, _ in index.search("lab")] == [7]
+
+
+async def test_expired_index_is_rebuilt():
+    now = datetime.now()
+    catalog = {1: "lamp"}
+
+    async def loader():
+        yield [
+            ProductGetDTO(id=product_id, created_at=now, updated_at=now, **product(title).model_dump())
+            for product_id, title in catalog.items()
+        ]
+
+    index = SearchIndex(max_age=0)
+    await index.ensure_loaded(loader)
+    # Другой воркер поменял каталог: после истечения max_age индекс читает его заново
+    catalog[2] = "ladder"
+    await index.ensure_loaded(loader)
+    assert index.expand_prefix("la") == ["ladder", "lamp"]